@@ -23,6 +23,18 @@ def get_order_params(data, *args, **kwargs):
     return signal, params
 
 
+def get_batch_order_params(data, params, names, *args):
+    """ Return signals and parameters of a family of strategies.
+
+    `params` has a row of keyword parameters `names` per strategy.
+
+    """
+    n = params.shape[0]
+    signals = np.random.choice([-1, 0, 1], size=n)
+
+    return signals, [{} for _ in range(n)]
+
+
 def get_signal(*args, **kwargs):
     """ Call example strategy and return signal. """
     return example_random_strat(**kwargs)
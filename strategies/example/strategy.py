@@ -11,11 +11,19 @@ import fynance as fy
 
 # Import internal packages
 from trading_bot.data_requests import DataRequests
+from trading_bot.indicators import IsoVol
 
 __all__ = ['get_signal']
 
 
-def get_order_params(data, *args, **kwargs):
+def set_indicators(*args, target_vol=0.20, leverage=1., period=252,
+                   half_life=11, **kwargs):
+    """ Return the streaming indicators of the strategy. """
+    return {'iso_vol': IsoVol(target_vol=target_vol, leverage=leverage,
+                              period=period, half_life=half_life)}
+
+
+def get_order_params(data, *args, indicators=None, **kwargs):
     """ Return signal, price and volume. """
     # Get parameters
     params = {}
@@ -27,6 +35,10 @@ def get_order_params(data, *args, **kwargs):
     params['price'] = get_price(data, signal, *args, **kwargs)
     # params['volume'] *= 1.5 + signal
 
+    # Update the streaming iso-volatility once per bar, volume is unchanged
+    if indicators is not None:
+        get_coef_volume(data, *args, indicators=indicators, **kwargs)
+
     return signal, params
 
 
@@ -35,7 +47,7 @@ def get_signal(data, *args, **kwargs):
     return int(np.random.choice(args))
 
 
-def get_coef_volume(data, *args, **kwargs):
+def get_coef_volume(data, *args, indicators=None, **kwargs):
     """ Compute volume. """
     if 'c' in data.columns:
         series = data.loc[:, 'c']
@@ -46,9 +58,16 @@ def get_coef_volume(data, *args, **kwargs):
     else:
         series = data.iloc[:, 0]
 
-    iv = set_iso_vol(series.values, *args, **kwargs)
+    if indicators is None:
+
+        return set_iso_vol(series.values, *args, **kwargs)
+
+    # Update the iso-volatility with the last price only
+    iso_vol = indicators['iso_vol']
+    if iso_vol.n == 0:
+        iso_vol.extend(series.values[:-1])
 
-    return iv
+    return iso_vol.update(series.values[-1])
 
 
 def get_price(data, signal, *args, **kwargs):
@@ -19,12 +19,24 @@ autonomous trading bot adapted to your algorithmic financial strategies.
 
 Modules
 -------
-bot_manager      --- Set the bot server and run order and strategy clients
-data_requests    --- Request data needed for strategy computations
-order_manager    --- Manage every orders
-result_manager   --- Display results of strategies and portfolio
-strategy_manager --- Set a strategy client and send orders to execute
-order            --- Object to execute orders.
+async_data_requests --- Asynchronous requests of data needed for strategies
+backfill            --- Backfill the data base with the history of an exchange
+bot_manager         --- Set the bot server and run order and strategy clients
+data_requests       --- Request data needed for strategy computations
+database            --- Columnar memory-mapped storage of OHLCV data
+id_allocator        --- Allocator of order IDs with a crash-safe counter
+indicators          --- Streaming indicators updated at each bar
+market_data         --- Market data requested once and shared by strategy bots
+order_book          --- L2 order books shared in memory between processes
+order_manager       --- Manage every orders
+prefetch            --- Prefetch the data of the next bar
+result_manager      --- Display results of strategies and portfolio
+scheduler           --- Event-driven scheduler of the bars of a strategy
+strategy_host       --- Run several strategy bots in a single process
+strategy_manager    --- Set a strategy client and send orders to execute
+trades_tape         --- Record the trades and build bars of any frequency
+websocket_feed      --- Market data feed from the Kraken WebSocket API
+order               --- Object to execute orders.
 
 Utility tools
 -------------
@@ -46,23 +58,47 @@ tools       --- Time, IO, setting, and configuration tools
 # Local packages
 # from .API_bfx import *
 # from .API_kraken import *
+from .async_data_requests import *
+from .backfill import *
 from .bot_manager import *
 # from .call_counters import *
 from .data_requests import *
+from .database import *
 from .exchanges import *
+from .id_allocator import *
+from .indicators import *
+from .market_data import *
+from .order_book import *
 from .orders_manager import *
+from .prefetch import *
 # from .results_manager import *
+from .scheduler import *
+from .strategy_host import *
 from .strategy_manager import *
 from .tools import *
+from .trades_tape import *
+from .websocket_feed import *
 
 
 # __all__ = API_bfx.__all__
 # __all__ += API_kraken.__all__
-__all__ = bot_manager.__all__
+__all__ = async_data_requests.__all__
+__all__ += backfill.__all__
+__all__ += bot_manager.__all__
 # __all__ += call_counters.__all__
 __all__ += data_requests.__all__
+__all__ += database.__all__
 __all__ += exchanges.__all__
+__all__ += id_allocator.__all__
+__all__ += indicators.__all__
+__all__ += market_data.__all__
+__all__ += order_book.__all__
 __all__ += orders_manager.__all__
+__all__ += prefetch.__all__
 # __all__ += results_manager.__all__
+__all__ += scheduler.__all__
+__all__ += strategy_host.__all__
 __all__ += strategy_manager.__all__
 __all__ += tools.__all__
+__all__ += trades_tape.__all__
+__all__ += websocket_feed.__all__
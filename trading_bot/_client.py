@@ -18,7 +18,25 @@ import os
 from trading_bot._connection import ConnTradingBotManager
 # from trading_bot._containers import OrderDict
 from trading_bot._server import TradingBotServer as TBS
-from trading_bot.data_requests import DataBaseManager, DataExchangeManager
+from trading_bot.data_requests import (DataBaseManager, DataExchangeManager,
+                                       HybridDataManager)
+from trading_bot.market_data import HubDataManager
+
+
+def connect_server(address=('', 50000), authkey=b'tradingbot'):
+    """ Connect to the TradingBotServer and return the manager. """
+    # register methods
+    TBS.register('get_queue_orders')
+    TBS.register('get_queue_sb_to_tpm')
+    TBS.register('get_queue_cli_to_tbm')
+    TBS.register('get_state')
+    TBS.register('get_reader_tbm')
+    TBS.register('get_writer_tbm')
+    # authentication and ConnectionTradingBotManager to server
+    m = TBS(address=address, authkey=authkey)
+    m.connect()
+
+    return m
 
 
 class _ClientBot:
@@ -29,23 +47,22 @@ class _ClientBot:
         'limit': 'fees_maker',
     }
 
-    def __init__(self, address=('', 50000), authkey=b'tradingbot'):
-        """ Initialize a client object and connect to the TradingBotServer. """
+    def __init__(self, address=('', 50000), authkey=b'tradingbot',
+                 manager=None):
+        """ Initialize a client object and connect to the TradingBotServer.
+
+        If `manager` is given, its connection to the server is shared (e.g.
+        by the strategy bots of a `StrategyHost`).
+
+        """
         self.logger = logging.getLogger(__name__)
         self.logger.info(
             'PID: {} | PPID: {}'.format(os.getpid(), os.getppid())
         )
+        if manager is None:
+            manager = connect_server(address, authkey)
 
-        # register methods
-        TBS.register('get_queue_orders')
-        TBS.register('get_queue_sb_to_tpm')
-        TBS.register('get_queue_cli_to_tbm')
-        TBS.register('get_state')
-        TBS.register('get_reader_tbm')
-        TBS.register('get_writer_tbm')
-        # authentication and ConnectionTradingBotManager to server
-        self.m = TBS(address=address, authkey=authkey)
-        self.m.connect()
+        self.m = manager
 
     def __enter__(self):
         # setup ConnectionTradingBotManager to TBM
@@ -80,11 +97,15 @@ class _ClientStrategyBot(_ClientBot):
         **_ClientBot._handler,
         'exchange': DataExchangeManager,
         'database': DataBaseManager,
+        'hub': HubDataManager,
+        'hybrid': HybridDataManager,
     }
 
-    def __init__(self, address=('', 50000), authkey=b'tradingbot'):
+    def __init__(self, address=('', 50000), authkey=b'tradingbot',
+                 manager=None):
         """ Initialize a client object and connect to TradingBotServer. """
-        _ClientBot.__init__(self, address=address, authkey=authkey)
+        _ClientBot.__init__(self, address=address, authkey=authkey,
+                            manager=manager)
 
     def __enter__(self):
         self.conn_tbm = ConnTradingBotManager(self.id)
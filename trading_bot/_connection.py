@@ -10,6 +10,7 @@
 
 # Built-in packages
 import logging
+from threading import Lock
 import time
 
 # Third party packages
@@ -35,6 +36,8 @@ class _BasisConnection:
         self.detail_logger = logging.getLogger('conn.' + _name)
         self.id = _id
         self.name = name
+        # Several threads can send to the same pipe
+        self._lock = Lock()
 
     def __iter__(self):
         return self
@@ -75,7 +78,7 @@ class _BasisConnection:
 
     def recv(self):
         k, a = self.r.recv()
-        if k == "fees" or k == "balance":
+        if k in ["fees", "balance", "market_data"]:
             log_msg = "recv ------ {}: {}".format(k.upper(), type(a))
 
         else:
@@ -88,7 +91,7 @@ class _BasisConnection:
     def send(self, msg):
         if isinstance(msg, tuple):
             k, a = msg[0].upper(), msg[1]
-            if k == "FEES" or k == "BALANCE":
+            if k in ["FEES", "BALANCE", "MARKET_DATA"]:
                 log_msg = "send ------ {}: {}".format(k, type(a))
 
             else:
@@ -98,7 +101,8 @@ class _BasisConnection:
             log_msg = "send ------ {}".format(msg)
 
         self.detail_logger.debug(log_msg)
-        self.w.send(msg)
+        with self._lock:
+            self.w.send(msg)
 
     def poll(self):
         return self.r.poll()
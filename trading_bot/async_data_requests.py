@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Asynchronous counterparts of the objects requesting exchange data.
+
+`AsyncDataRequests` and `AsyncDataExchangeManager` have the same parameters
+and return the same types as `DataRequests` and `DataExchangeManager`, but
+their methods are coroutines to run on an `asyncio` event loop. Requests go
+through the `ThreadedAsyncSession` shared by the process, blocking requests
+run in a pool of threads such that up to `limit` requests can be in flight
+without blocking the loop. A request can be cancelled (as any `asyncio`
+task) and can have a deadline, the attempt in flight ends in its thread.
+
+"""
+
+# Built-in packages
+import asyncio
+from functools import partial
+import time
+
+# Third party packages
+
+# Local packages
+from trading_bot.data_requests import (DataExchangeManager, DataRequests,
+                                       NotLatestDataError)
+from trading_bot.tools.sessions import async_session
+
+__all__ = ['AsyncDataRequests', 'AsyncDataExchangeManager']
+
+
+class AsyncDataRequests(DataRequests):
+    """ Class to request data from an exchange with REST public API on an
+    `asyncio` event loop.
+
+    Methods
+    -------
+    get_data(*args, deadline=None, **kwargs)
+        Coroutine returning data in list or dict.
+
+    Attributes
+    ----------
+    url : str
+        Url of an exchange public API REST.
+    stop_step : int
+        Max number of request.
+    last_ts : int
+        Timestamp of last observation if exist else `0`.
+    t : int
+        The `t` th request.
+    session : trading_bot.tools.sessions.ThreadedAsyncSession
+        Pooled HTTP session awaited by the coroutines to request the API.
+
+    """
+
+    def __init__(self, public_api_url, stop_step=1, last_ts=0, session=None):
+        """ Set kind of request, time step in second between two requests,
+        and if necessary from when (timestamp).
+
+        Parameters
+        ----------
+        public_api_url : str
+            Url of an exchange public API REST.
+        stop_step : int, optional
+            Max number of request, default is `1`.
+        last_ts : int, optional
+            Timestamp of last observation if exist else `0`. Default is `0`.
+        session : trading_bot.tools.sessions.ThreadedAsyncSession, optional
+            HTTP session, default is the asynchronous session shared by the
+            process (see `trading_bot.tools.sessions`).
+
+        """
+        super(AsyncDataRequests, self).__init__(
+            public_api_url, stop_step=stop_step, last_ts=last_ts,
+            session=async_session if session is None else session,
+        )
+
+    async def get_data(self, *args, deadline=None, **kwargs):
+        """ Request data to public REST API from an Exchange.
+
+        Parameters
+        ----------
+        args : tuple
+            Each element of the tuple is added to the url separated with `/`.
+        deadline : float, optional
+            Time (`time.monotonic`) after which the request is aborted,
+            default is no deadline.
+        kwargs : dict
+            Each key words is append to parameters at the requests.
+            Cf documentation of the exchange API for more details.
+
+        Returns
+        -------
+        data : dict of dict
+            Requested data.
+
+        Raises
+        ------
+        requests.exceptions.RequestException or ValueError
+            If the request failed after the retries of the session or if the
+            deadline is exceeded.
+
+        """
+        # Set timestamp of the observation
+        self.last_ts = int(time.time())
+        url = self.url
+
+        for arg in args:
+            url += '/' + arg
+
+        return await self.session.get(url, kwargs, deadline=deadline)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        # Stop iteration
+        if self.t >= self.stop_step:
+
+            raise StopAsyncIteration
+
+        # Sleep
+        elif self.last_ts + self.time_step > time.time():
+            await asyncio.sleep(self.last_ts + self.time_step - time.time())
+
+        # Run
+        self.t += 1
+
+        return await self.get_data(**self.kwargs)
+
+
+class AsyncDataExchangeManager(DataExchangeManager):
+    """ Object to request and manage data from an exchange on an `asyncio`
+    event loop.
+
+    /! CURRENTLY WORK ONLY WITH KRAKEN EXCHANGE /!
+
+    Same as `DataExchangeManager` (WebSocket feed, incremental mode and
+    several assets requested concurrently) with coroutines. If `timeout` is
+    set, `get_data` raises `requests.exceptions.Timeout` when the requests
+    (and their retries) take more than `timeout` seconds.
+
+    Decoding and cleaning of the answers run in the default executor of the
+    loop, such that the fallback on the Ticker endpoint (when the current
+    candle is not yet available) doesn't block the loop.
+
+    """
+
+    def __init__(self, assets, path="https://api.kraken.com/0/public",
+                 frequency=None, n_min_obs=1, ohlcv='ohlcv', websocket=False,
+                 incremental=False, timeout=None, session=None):
+        self.timeout = timeout
+        self.session = session
+        super(AsyncDataExchangeManager, self).__init__(
+            assets, path=path, frequency=frequency, n_min_obs=n_min_obs,
+            ohlcv=ohlcv, websocket=websocket, incremental=incremental,
+        )
+        self.req = AsyncDataRequests(path, stop_step=1, session=session)
+
+    def _new_manager(self, asset, **kwargs):
+        return AsyncDataExchangeManager(
+            [asset], timeout=self.timeout, session=self.session, **kwargs
+        )
+
+    async def get_data(self, *args, **kwargs):
+        """ Request and clean the last data.
+
+        Returns
+        -------
+        np.array
+            Last `n_min_obs` observations of the `ohlcv` fields, of shape
+            `(n_min_obs, n_fields)`, or `(n_min_obs, n_assets, n_fields)` if
+            there are several assets.
+
+        """
+        if self.managers and args[:1] == ('OHLC',):
+
+            return (await self.get_panel(*args, **kwargs))[1]
+
+        return (await self._fetch(*args, **kwargs))[1]
+
+    async def get_panel(self, *args, **kwargs):
+        """ Request concurrently and align the last data of all the assets.
+
+        Returns
+        -------
+        index : np.ndarray[dtype=np.int64, ndim=1]
+            Union of the timestamps of the assets, last `n_min_obs` ones.
+        array : np.ndarray[dtype=np.float64, ndim=3]
+            Data of shape `(n_rows, n_assets, n_fields)`, missing
+            observations are `NaN`.
+
+        """
+        managers = self.managers or {self.assets[0]: self}
+        results = await asyncio.gather(*[
+            m._fetch(*args, **{**kwargs, 'pair': a})
+            for a, m in managers.items()
+        ])
+
+        return self._align(results)
+
+    async def _fetch(self, *args, **kwargs):
+        interval, kwargs = self._set_interval(kwargs)
+        data = await self._get_data(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+
+        try:
+
+            return await loop.run_in_executor(
+                None, partial(self._clean, data, interval)
+            )
+
+        except NotLatestDataError as e:
+            self.logger.error(
+                'Get not the most recent data {}, wait 1 sec'.format(e.args)
+            )
+            await asyncio.sleep(1)
+
+            return await self._fetch(*args, **kwargs)
+
+    async def _get_data(self, *args, **kwargs):
+        data = self._read_feed(args, kwargs)
+        if data is None:
+            data = await self._request_data(*args, **kwargs)
+            self._seed_feed(args, kwargs, data)
+
+        return data
+
+    async def _request_data(self, *args, wait=1, **kwargs):
+        # Same retries as `DataExchangeManager`, all before the deadline
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+
+        for k in range(self.req.session.max_retries + 1):
+            data = await self.req.get_data(*args, deadline=deadline, **kwargs)
+            if not self._is_retried(data, k, wait):
+
+                break
+
+            await asyncio.sleep(wait)
+            wait *= 2
+
+        return self._result(data, args, kwargs)
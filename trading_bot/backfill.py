@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Backfill the minutely data base with the history of an exchange.
+
+The OHLC or Trades endpoints of the Kraken public API are paged with their
+`since` cursor, several pairs at once in a pool of workers sharing the same
+rate limiter. Each page is written straight into its day partitions of the
+data base, also before the stored observations (see `write_data`), and a
+checkpoint is saved, such that an interrupted backfill
+resumes where it stopped.
+
+Run it from the command line::
+
+    $ python -m trading_bot.backfill XXBTZUSD XETHZUSD --endpoint Trades
+
+"""
+
+# Built-in packages
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import time
+
+# Third party packages
+import numpy as np
+import pandas as pd
+
+# Local packages
+from trading_bot.data_requests import DataRequests, write_data
+from trading_bot.database import FIELDS, resample, update_rollups
+from trading_bot.tools.call_counters import RateLimiter
+from trading_bot.tools.decoders import decode_ohlc, to_frame
+from trading_bot.tools.time_tools import now
+
+__all__ = ['Backfill', 'ohlc_to_frame', 'trades_to_frame']
+
+KRAKEN_URL = "https://api.kraken.com/0/public"
+CHECKPOINT = 'checkpoint.json'
+RATE_LIMIT_ERRORS = ('EAPI:Rate limit exceeded', 'EGeneral:Too many requests')
+
+
+def ohlc_to_frame(rows):
+    """ Set OHLC rows of Kraken as a minutely OHLCV dataframe.
+
+    Parameters
+    ----------
+    rows : list of list
+        Rows `[time, open, high, low, close, vwap, volume, count]`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        OHLCV data indexed by timestamp.
+
+    Examples
+    --------
+    >>> ohlc_to_frame([[60, '1.', '3.', '0.5', '2.', '1.5', '10.', 3]])
+          o    h    l    c     v
+    60  1.0  3.0  0.5  2.0  10.0
+
+    """
+    return to_frame(*decode_ohlc(rows, FIELDS), FIELDS)
+
+
+def trades_to_frame(rows, timestep=60):
+    """ Aggregate trades of Kraken into an OHLCV dataframe.
+
+    Parameters
+    ----------
+    rows : list of list
+        Rows `[price, volume, time, side, type, misc, ...]`.
+    timestep : int, optional
+        Number of seconds of a bar, default is 60.
+
+    Returns
+    -------
+    pandas.DataFrame
+        OHLCV data indexed by the open timestamp of the bars.
+
+    Examples
+    --------
+    >>> trades_to_frame([['2.', '1.', 61.5, 'b', 'l', ''],
+    ...                  ['3.', '2.', 62.1, 's', 'm', ''],
+    ...                  ['1.', '1.', 125.2, 'b', 'l', '']])
+           o    h    l    c    v
+    60   2.0  3.0  2.0  3.0  3.0
+    120  1.0  1.0  1.0  1.0  1.0
+
+    """
+    array = np.array([r[:3] for r in rows], dtype=np.float64).reshape([-1, 3])
+    price, volume = array[:, 0], array[:, 1]
+    index, array = resample(
+        array[:, 2].astype(np.int64),
+        np.stack([price, price, price, price, volume], axis=1),
+        timestep,
+    )
+
+    return pd.DataFrame(array, index=index, columns=list(FIELDS))
+
+
+def load_checkpoint(path, pair):
+    """ Load the checkpoint of a pair.
+
+    Parameters
+    ----------
+    path : str
+        Path of the data base.
+    pair : str
+        Name of the pair.
+
+    Returns
+    -------
+    dict
+        Values saved for the pair, empty if there is no checkpoint.
+
+    """
+    try:
+        with open(os.path.join(path, pair, CHECKPOINT), 'r') as f:
+
+            return json.load(f)
+
+    except FileNotFoundError:
+
+        return {}
+
+
+def save_checkpoint(path, pair, **values):
+    """ Update atomically the checkpoint of a pair.
+
+    Parameters
+    ----------
+    path : str
+        Path of the data base.
+    pair : str
+        Name of the pair.
+    **values
+        Values to save, other values of the checkpoint are kept.
+
+    """
+    name = os.path.join(path, pair, CHECKPOINT)
+    checkpoint = load_checkpoint(path, pair)
+    checkpoint.update(values)
+    with open(name + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+
+    os.replace(name + '.tmp', name)
+
+
+class Backfill:
+    """ Object to backfill the data base of several pairs from Kraken.
+
+    Methods
+    -------
+    run(since=0, until=None)
+        Backfill all pairs and return a throughput report.
+    load_checkpoint(pair)
+        Return the cursor saved for a pair, None if there is no checkpoint.
+    save_checkpoint(pair, cursor)
+        Save the cursor of a pair.
+
+    Attributes
+    ----------
+    pairs : list of str
+        Name of the pairs, also used as asset names in the data base.
+    path : str
+        Path of the data base.
+    endpoint : {'OHLC', 'Trades'}
+        Endpoint of the public API to page through.
+    url : str
+        Url of the public API.
+    n_jobs : int
+        Number of workers.
+    limiter : trading_bot.tools.call_counters.RateLimiter
+        Rate limiter shared between workers.
+    report : dict
+        Throughput of the last run for each pair.
+
+    """
+
+    def __init__(self, pairs, path='data_base/', endpoint='OHLC',
+                 url=KRAKEN_URL, n_jobs=4, limiter=None, max_retries=5,
+                 backoff=2.):
+        """ Initialize the backfill object.
+
+        Parameters
+        ----------
+        pairs : str or list of str
+            Name of the pairs on Kraken, e.g. 'XXBTZUSD'.
+        path : str, optional
+            Path of the data base, default is 'data_base/'.
+        endpoint : {'OHLC', 'Trades'}, optional
+            Endpoint to page through, default is 'OHLC'. The OHLC endpoint
+            serves only the last 720 minutes, the full history is available
+            with the Trades endpoint.
+        url : str, optional
+            Url of the public API, default is Kraken.
+        n_jobs : int, optional
+            Number of workers, default is 4.
+        limiter : RateLimiter, optional
+            Rate limiter shared between workers, default allows one request
+            per second.
+        max_retries : int, optional
+            Max number of retries when the rate limit of the exchange is
+            exceeded, default is 5.
+        backoff : float, optional
+            Seconds waited before the first retry, doubled at each retry.
+
+        """
+        if endpoint not in ('OHLC', 'Trades'):
+
+            raise ValueError('Unknown endpoint {}'.format(endpoint))
+
+        self.logger = logging.getLogger(__name__)
+        self.pairs = [pairs] if isinstance(pairs, str) else list(pairs)
+        self.path = path
+        self.endpoint = endpoint
+        self.url = url
+        self.n_jobs = n_jobs
+        self.limiter = RateLimiter() if limiter is None else limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.report = {}
+
+    def __repr__(self):
+        return 'Backfill({} pairs from {} {})'.format(
+            len(self.pairs), self.url, self.endpoint
+        )
+
+    def load_checkpoint(self, pair):
+        """ Return the cursor saved for a pair.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair.
+
+        Returns
+        -------
+        int or None
+            Cursor of the endpoint, None if there is no checkpoint saved for
+            this endpoint.
+
+        """
+        return load_checkpoint(self.path, pair).get(self.endpoint)
+
+    def save_checkpoint(self, pair, cursor):
+        """ Save atomically the cursor of a pair.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair.
+        cursor : int
+            Cursor of the endpoint.
+
+        """
+        save_checkpoint(self.path, pair, **{self.endpoint: int(cursor)})
+
+    def _request(self, req, pair, cursor):
+        for k in range(self.max_retries + 1):
+            self.limiter()
+            ans = req.get_data(self.endpoint, pair=pair, since=cursor)
+            if not ans['error']:
+
+                return ans['result']
+
+            elif not any(e in ans['error'] for e in RATE_LIMIT_ERRORS):
+
+                raise ValueError('{}: {}'.format(pair, ans['error']))
+
+            self.logger.info('{}: rate limit exceeded, retry in {}s'.format(
+                pair, self.backoff * 2 ** k
+            ))
+            time.sleep(self.backoff * 2 ** k)
+
+        raise ValueError('{}: {}'.format(pair, ans['error']))
+
+    def _append(self, pair, data, stats):
+        interval = write_data(data, pair, path=self.path)
+        if interval is not None:
+            stats['rows'] += data.shape[0]
+            stats['first'] = min(stats['first'] or interval[0], interval[0])
+            stats['last'] = max(stats['last'] or interval[1], interval[1])
+
+    def _backfill(self, pair, since, until):
+        stats = {'requests': 0, 'rows': 0, 'first': None, 'last': None}
+        t = time.time()
+        os.makedirs(os.path.join(self.path, pair), exist_ok=True)
+        req = DataRequests(self.url)
+        checkpoint = self.load_checkpoint(pair)
+        cursor = since if checkpoint is None else max(since, checkpoint)
+        # Trades of the last minute of a page are pending until the next one
+        pending = []
+        self.logger.info('{}: start from {}'.format(pair, cursor))
+
+        while True:
+            result = self._request(req, pair, cursor)
+            stats['requests'] += 1
+            last = int(result['last'])
+            rows = next(v for k, v in result.items() if k != 'last')
+            done = last <= cursor or not rows
+
+            if self.endpoint == 'OHLC':
+                data = ohlc_to_frame(rows)
+                # The current bar is not closed
+                data = data.loc[data.index < min(until, now())]
+                next_cursor = last
+
+            else:
+                rows = pending + rows
+                t_last = now() if done else rows[-1][2] // 60 * 60
+                pending = [r for r in rows if r[2] >= t_last]
+                data = trades_to_frame([r for r in rows if r[2] < t_last])
+                data = data.loc[data.index < until]
+                # Resume from the first pending trade, in nanoseconds
+                next_cursor = last if not pending else int(t_last * 1e9)
+
+            self._append(pair, data, stats)
+            self.save_checkpoint(pair, next_cursor)
+            cursor = last
+            if done or data.index.size > 0 and data.index[-1] >= until - 60:
+
+                break
+
+            elif self.endpoint == 'Trades' and t_last >= until:
+
+                break
+
+        if stats['first'] is not None:
+            update_rollups(self.path, pair, stats['first'], stats['last'])
+
+        stats['elapsed'] = time.time() - t
+        stats['rows_per_sec'] = stats['rows'] / max(stats['elapsed'], 1e-9)
+        self.logger.info('{}: {} rows in {} requests, {:.1f} rows/s'.format(
+            pair, stats['rows'], stats['requests'], stats['rows_per_sec']
+        ))
+
+        return stats
+
+    def run(self, since=0, until=None):
+        """ Backfill all pairs and return a throughput report.
+
+        Each pair is paged by one worker, the workers share the rate limiter.
+        A pair resumes from its checkpoint if it is more recent than `since`.
+
+        Parameters
+        ----------
+        since : int, optional
+            Cursor of the first request, i.e. a timestamp in seconds for the
+            OHLC endpoint and in nanoseconds for the Trades endpoint. Default
+            is 0.
+        until : int, optional
+            Timestamp in seconds where to stop, default is now.
+
+        Returns
+        -------
+        dict
+            Number of requests, of rows appended, first and last timestamps
+            appended, elapsed time and rows per second for each pair, and
+            totals in the 'total' key.
+
+        """
+        until = now() if until is None else until
+        t = time.time()
+        with ThreadPoolExecutor(max_workers=max(self.n_jobs, 1)) as pool:
+            futures = {
+                pair: pool.submit(self._backfill, pair, since, until)
+                for pair in self.pairs
+            }
+            self.report = {p: f.result() for p, f in futures.items()}
+
+        elapsed = time.time() - t
+        total = {
+            'requests': sum(s['requests'] for s in self.report.values()),
+            'rows': sum(s['rows'] for s in self.report.values()),
+            'elapsed': elapsed,
+            'waited': self.limiter.waited,
+        }
+        total['rows_per_sec'] = total['rows'] / max(elapsed, 1e-9)
+        total['requests_per_sec'] = total['requests'] / max(elapsed, 1e-9)
+        self.report['total'] = total
+        self.logger.info('{} rows in {} requests, {:.1f} rows/s'.format(
+            total['rows'], total['requests'], total['rows_per_sec']
+        ))
+
+        return self.report
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Backfill the data base.')
+    parser.add_argument('pairs', nargs='+', help='Name of the pairs.')
+    parser.add_argument('--endpoint', default='OHLC',
+                        choices=['OHLC', 'Trades'])
+    parser.add_argument('--path', default='data_base/')
+    parser.add_argument('--url', default=KRAKEN_URL)
+    parser.add_argument('--since', type=int, default=0)
+    parser.add_argument('--until', type=int, default=None)
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=1.)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    backfill = Backfill(args.pairs, path=args.path, endpoint=args.endpoint,
+                        url=args.url, n_jobs=args.jobs,
+                        limiter=RateLimiter(args.rate))
+    report = backfill.run(since=args.since, until=args.until)
+    for key, stats in report.items():
+        backfill.logger.info('{}: {}'.format(key, stats))
@@ -11,13 +11,16 @@
 # Built-in packages
 import logging
 from multiprocessing import Process
-from threading import Thread
+from threading import Lock, Thread
 import time
 
 # Third party packages
 
 # Local packages
 from trading_bot._server import _TradingBotManager
+from trading_bot.market_data import MarketDataHub
+from trading_bot.order_book import BookFeed
+from trading_bot.strategy_host import start_strategy_host
 from trading_bot.strategy_manager import StrategyBot as SB
 from trading_bot.tools.io import load_config_params
 from trading_bot.tools.time_tools import str_time
@@ -54,20 +57,47 @@ class TradingBotManager(_TradingBotManager):
         gen_config = load_config_params('./general_config.yaml')
         self.path_log = gen_config['path']['log_file']
         self.auto = gen_config['auto']
+        # Run the strategies started together in a single process
+        self.strategy_host = gen_config.get('strategy_host', False)
         self.address = address
         self.authkey = authkey
         self.txt = {}
         self.client_thread = Thread(target=self.client_manager, daemon=True)
 
+        # Set market data hub shared by strategy bots, started by the first
+        # subscription
+        self._hub_lock = Lock()
+        self.hub = MarketDataHub(
+            self.conn_sb, **gen_config.get('market_data', {})
+        )
+        self.hub_thread = Thread(
+            target=self.hub.run,
+            kwargs={'is_stop': self.is_stop},
+            daemon=True
+        )
+
+        # Set order books shared with the orders manager, only if configured
+        self.book_feed = None
+        if gen_config.get('order_book'):
+            self.book_feed = BookFeed(**gen_config['order_book'])
+
     def __enter__(self):
         """ Enter into TradingBotManager context manager. """
         super(TradingBotManager, self).__enter__()
         time.sleep(1)
         self.client_thread.start()
+        if self.book_feed is not None:
+            self.book_feed.start()
 
     def __exit__(self, exc_type, exc_value, exc_tb):
         """ Exit from TradingBotManager context manager. """
         super(TradingBotManager, self).__exit__(exc_type, exc_value, exc_tb)
+        if self.hub_thread.ident is not None:
+            self.hub_thread.join()
+
+        if self.book_feed is not None:
+            self.book_feed.stop()
+
         if exc_type is not None:
             self.logger.error(
                 '{}: {}'.format(exc_type, exc_value),
@@ -175,6 +205,12 @@ class TradingBotManager(_TradingBotManager):
 
         self.logger.debug('end listen OrderManager')
 
+    def _start_hub(self):
+        # The market data hub runs only if a strategy bot subscribes to it
+        with self._hub_lock:
+            if self.hub_thread.ident is None:
+                self.hub_thread.start()
+
     def listen_sb(self, _id):
         """ Update fees and balance when received them from OrdersManager. """
         _msg = 'SB ID {} - '.format(_id)
@@ -188,6 +224,10 @@ class TradingBotManager(_TradingBotManager):
             elif k in ['cpos', 'cvol']:
                 self.conn_cli.send((k, a),)
 
+            elif k == 'subscribe':
+                self.hub.subscribe(_id, **a)
+                self._start_hub()
+
             elif k is None:
                 pass
 
@@ -231,6 +271,15 @@ class TradingBotManager(_TradingBotManager):
                     else:
                         self.logger.error('{} not in conn_sb'.format(v))
 
+            elif k == 'start' and self.strategy_host:
+                self.logger.info('CLI sent START command: {}'.format(a))
+                p = self.set_process(
+                    start_strategy_host, 'host:' + ','.join(a), list(a),
+                    address=self.address, authkey=self.authkey
+                )
+                for v in a:
+                    self.process_sb[v] = p
+
             elif k == 'start':
                 self.logger.info('CLI sent START command: {}'.format(a))
                 for v in a:
@@ -375,6 +424,7 @@ class TradingBotManager(_TradingBotManager):
         else:
             conn = self.conn_sb.pop(_id)
             name = conn.name
+            self.hub.unsubscribe(_id)
 
         self.logger.debug('{}'.format(conn))
 
@@ -388,7 +438,9 @@ class TradingBotManager(_TradingBotManager):
         if _id > 0 and name in self.process_sb:
             self.logger.debug('wait to process {} join TBM'.format(name))
             p = self.process_sb.pop(name)
-            p.join()
+            # A host process is joined with its last strategy
+            if p not in self.process_sb.values():
+                p.join()
 
         self.logger.debug('shutdown Client ID {}'.format(_id))
 
@@ -7,26 +7,31 @@
 # @Last modified time: 2020-08-28 08:24:13
 
 # Built-in import
-import json
+from concurrent.futures import ThreadPoolExecutor
 import logging
-from os import listdir
-from pickle import Pickler, Unpickler
-import sys
+from threading import Condition
 import time
 
 # External import
-import requests
-from requests.exceptions import ConnectionError as RequestsConnectionError
 import pandas as pd
 import numpy as np
 
 # Local import
+from trading_bot.database import (Manifest, get_frame, list_tiers,
+                                  load_partition, partition_cache,
+                                  read_panel, read_range, resample,
+                                  save_partition, set_partition,
+                                  update_rollups, write_rows)
+from trading_bot.tools.decoders import decode_ohlc, to_frame
+from trading_bot.tools.sessions import session as _session
 from trading_bot.tools.time_tools import now
+from trading_bot.websocket_feed import RingBuffer, enable_feed, get_feed
 
 __all__ = [
     'DataRequests', 'data_base_requests', 'aggregate_data', 'DataBaseManager',
     'set_dataframe', 'get_ohlcv', 'get_ohlcv_kraken', 'save_data',
-    'update_data', 'DataExchangeManager',
+    'write_data', 'append_data', 'update_data', 'DataExchangeManager',
+    'HybridDataManager', 'TickerCache', 'ticker_cache',
 ]
 
 """
@@ -53,11 +58,12 @@ class DataRequests:
         Timestamp of last observation if exist else `0`.
     t : int
         The `t` th request.
-
+    session : trading_bot.tools.sessions.PooledSession
+        Pooled HTTP session used to request the API.
 
     """
 
-    def __init__(self, public_api_url, stop_step=1, last_ts=0):
+    def __init__(self, public_api_url, stop_step=1, last_ts=0, session=None):
         """ Set kind of request, time step in second between two requests,
         and if necessary from when (timestamp).
 
@@ -69,9 +75,13 @@ class DataRequests:
             Max number of request, default is `1`.
         last_ts : int, optional
             Timestamp of last observation if exist else `0`. Default is `0`.
+        session : trading_bot.tools.sessions.PooledSession, optional
+            HTTP session, default is the session shared by the process (see
+            `trading_bot.tools.sessions`).
 
         """
-        self.url = public_api_url
+        self.url = public_api_url.rstrip('/')
+        self.session = _session if session is None else session
         self.t = 0
         self.stop_step = stop_step
         self.last_ts = last_ts
@@ -92,6 +102,11 @@ class DataRequests:
         data : dict of dict
             Requested data.
 
+        Raises
+        ------
+        requests.exceptions.RequestException or ValueError
+            If the request failed after the retries of the session.
+
         Examples
         --------
         >>> req = DataRequests("https://api.kraken.com/0/public", stop_step=1)
@@ -106,29 +121,8 @@ class DataRequests:
         for arg in args:
             url += '/' + arg
 
-        # Requests data
-        ans = requests.get(url, kwargs)
-
-        # Returns result
-        try:
-            return json.loads(ans.text)
-
-        except Exception as error:
-            txt = '\nUNKNOWN ERROR\n'
-            txt += 'In {} script, at {}, '.format(
-                sys.argv[0],
-                time.strftime('%y-%m-%d %H:%M:%S', time.gmtime(time.time())),
-            )
-            txt += 'the following error occurs: {}\n'.format(
-                str(error)
-            )
-
-            with open('errors/{}.log'.format(sys.argv[0]), 'a') as f:
-                f.write(txt)
-
-            time.sleep(1)
-
-            return self.get_data(*args, **kwargs)
+        # Requests data through the pooled session, retries are bounded
+        return self.session.get(url, kwargs)
 
     def __iter__(self):
         """ Set iterative method """
@@ -158,7 +152,7 @@ class DataRequests:
 
 
 def data_base_requests(assets, ohlcv, frequency=60, start=None, end=None,
-                       path='data_base/'):
+                       path='data_base/', panel=False):
     """ Function to request in the data base one or several ohlcv data assets
     from a specified date to an other specified data and at a specified
     frequency.
@@ -180,6 +174,16 @@ def data_base_requests(assets, ohlcv, frequency=60, start=None, end=None,
         available.
     path : str
         Path to load data.
+    panel : bool, optional
+        If True, data of all assets are filled in one array of shape (time x
+        asset x field) on a common timestamp grid, and returned as a labelled
+        view with columns indexed by asset and field. Default is False.
+
+    Notes
+    -----
+    If rollup tiers are persisted for the assets (see
+    `trading_bot.database.build_rollups`), data are read from the largest
+    tier that divides `frequency`, otherwise minutely data are aggregated.
 
     Returns
     -------
@@ -189,18 +193,22 @@ def data_base_requests(assets, ohlcv, frequency=60, start=None, end=None,
     Examples
     --------
     >>> data_base_requests(['example', 'other_example'], 'clhv')
-                c  l  h  ...  l_other_example h_other_example v_other_example
-    1552155180  0  0  0  ...                0               0             150
+                  c    l    h  ...  l_other_example  h_other_example  v_other_example
+    1552155180  0.0  0.0  0.0  ...              0.0              0.0            150.0
     <BLANKLINE>
     [1 rows x 8 columns]
     >>> start, end = 1552089600, 1552155180
     >>> df = data_base_requests('example', 'c', start=start, end=end)
     >>> df.iloc[0:1, :]
-                c
-    1552089600  0
+                  c
+    1552089600  0.0
     >>> df.iloc[-1:,:]
-                c
-    1552155180  0
+                  c
+    1552155180  0.0
+    >>> data_base_requests(['example', 'other_example'], 'cv', panel=True)
+               example        other_example
+                     c      v             c      v
+    1552155180     0.0  100.0           0.0  150.0
 
     See Also
     --------
@@ -216,6 +224,12 @@ def data_base_requests(assets, ohlcv, frequency=60, start=None, end=None,
     if isinstance(ohlcv, str):
         ohlcv = [i for i in ohlcv]
 
+    if panel:
+
+        return _panel_data_base_requests(
+            assets, ohlcv, frequency, start, end, path
+        )
+
     # Set data by asset
     asset = assets.pop(0)
     data = _subdata_base_requests(asset, ohlcv, frequency, start, end, path)
@@ -228,82 +242,91 @@ def data_base_requests(assets, ohlcv, frequency=60, start=None, end=None,
     return data
 
 
-def _subdata_base_requests(asset, ohlcv, frequency, start, end, path):
-    if start is None:
-        path_file = _get_last_file(path + asset)
-        df = _data_base_requests(path_file, slice(None), ohlcv)
+def _get_timestep(assets, frequency, path):
+    # Select the largest tier available for all assets, minutely data are
+    # always available
+    tiers = [set(list_tiers(path, asset)) | {60} for asset in assets]
+    for tier in sorted(set.intersection(*tiers), reverse=True):
+        if frequency % tier == 0:
 
-        if frequency > 60:
-            df = aggregate_data(df, frequency // 60)
+            return tier
 
-        return df.iloc[-1:, :]
+    return 60
 
-    else:
-        row_slices = _set_row_slice(start, end, frequency)
-        row_slice = row_slices.pop(0)
-        date = time.strftime('%y-%m-%d', time.gmtime(row_slice[0]))
-        path_file = path + asset + '/' + date + '.dat'
-        df = _data_base_requests(path_file, row_slice, ohlcv)
-
-        for row_slice in row_slices:
-            date = time.strftime('%y-%m-%d', time.gmtime(row_slice[0]))
-            path_file = path + asset + '/' + date + '.dat'
-            subdf = _data_base_requests(path_file, row_slice, ohlcv)
-            df.append(subdf)
 
-        if frequency > 60:
-            df = aggregate_data(df, frequency // 60)
-
-        return df
+def _panel_data_base_requests(assets, ohlcv, frequency, start, end, path):
+    timestep = _get_timestep(assets, frequency, path)
+    last_only = start is None
+    if last_only:
+        start = min(end, max(Manifest.load(path, a, timestep).get()['last']
+                             for a in assets))
+        start = start // frequency * frequency
 
+    index, array = read_panel(
+        path, assets, start, end, fields=ohlcv, timestep=timestep
+    )
+    if frequency > timestep:
+        index, array = resample(index, array, frequency, ohlcv)
 
-def _data_base_requests(path, row_slice, col_slice):
-    # Load data base
-    with open(path, 'rb') as f:
-        df = Unpickler(f).load()
+    if last_only:
+        index, array = index[-1:], array[-1:]
 
-    # Return specified data
-    if isinstance(row_slice, tuple):
-        row_slice = slice(*row_slice)
+    columns = pd.MultiIndex.from_product([assets, ohlcv])
 
-    return df.loc[row_slice, col_slice]
+    return pd.DataFrame(
+        array.reshape(index.size, -1), index=index, columns=columns,
+        copy=False,
+    )
 
 
-def _set_row_slice(start, end, frequency):
-    i = 0
-    row_slice = []
-    STOP = (end - start) // 86400
+def _subdata_base_requests(asset, ohlcv, frequency, start, end, path):
+    timestep = _get_timestep([asset], frequency, path)
+    if start is None:
+        part = Manifest.load(path, asset, timestep).get()
+        df = _data_base_requests(path, asset, part, ohlcv, timestep)
 
-    while i <= STOP:
-        last = (start // 86400 + 1) * 86400
+        if frequency > timestep:
+            df = aggregate_data(df, frequency // timestep, timestep=timestep)
 
-        if frequency <= 60:
-            row_slice += [(start, min(last, end))]
+        return df.iloc[-1:, :]
 
-        else:
-            row_slice += [range(start, min(last, end), frequency)]
+    else:
+        index, array = read_range(
+            path, asset, start, end, fields=ohlcv, timestep=timestep
+        )
+        df = pd.DataFrame(array, index=index, columns=ohlcv, copy=False)
 
-        start += last
-        i += 1
+        if frequency > timestep:
+            df = aggregate_data(df, frequency // timestep, timestep=timestep)
 
-    return row_slice
+        return df
 
 
-def _get_last_file(path):
-    files = listdir(path)
+def _data_base_requests(path, asset, part, col_slice, timestep=60):
+    # Load memory-mapped partition
+    day = int(part['day'])
+    array = load_partition(path, asset, day, timestep)
 
-    return path + '/' + max(files)
+    # Return specified data as a view of the partition
+    return get_frame(
+        array, day, slice(0, int(part['n_rows'])), col_slice, timestep
+    )
 
 
-def aggregate_data(df, win):
+def aggregate_data(df, win, timestep=60):
     """ Aggregate OHLCV data frame.
 
+    Bars are aligned on multiples of `win * timestep` seconds and labelled by
+    their open timestamp (see `trading_bot.database.resample`).
+
     Parameters
     ----------
     df : pandas.DataFrame
         OHLCV data.
     win : int
         Number of periods to aggregate.
+    timestep : int, optional
+        Number of seconds between two rows of `df`, default is 60.
 
     Returns
     -------
@@ -315,20 +338,12 @@ def aggregate_data(df, win):
     data_base_requests
 
     """
-    for c in df.columns:
-        if c == 'h':
-            df.loc[::-1, c] = df.loc[::-1, c].rolling(win, min_periods=0).max()
-
-        elif c == 'l':
-            df.loc[::-1, c] = df.loc[::-1, c].rolling(win, min_periods=0).min()
-
-        elif c == 'c':
-            df.loc[:, c] = df.loc[:, c].shift(-win).fillna(method='ffill')
-
-        elif c == 'v':
-            df.loc[::-1, c] = df.loc[::-1, c].rolling(win, min_periods=0).sum()
+    index, array = resample(
+        df.index.values.astype(np.int64), df.values.astype(np.float64),
+        win * timestep, [c for c in df.columns],
+    )
 
-    return df
+    return pd.DataFrame(array, index=index, columns=df.columns)
 
 
 class DataBaseManager:
@@ -347,16 +362,21 @@ class DataBaseManager:
         Database's path to load data.
     n_min_obs : int, optional
         Minimal number of historic data to compute signal, default is 1.
+    panel : bool, optional
+        If True, data are requested as a panel (time x asset x field), see
+        `data_base_requests`. Default is False.
 
     Methods
     -------
     get_data(start=None, last=None)
         Request specified data in the data base.
+    cache_info()
+        Return hit and miss counters of the cache of partitions.
 
     """
 
     def __init__(self, assets, ohlcv, frequency=60, path='data_base/',
-                 n_min_obs=1):
+                 n_min_obs=1, panel=False):
         """ Set the data manager class.
 
         Parameters
@@ -372,6 +392,9 @@ class DataBaseManager:
             Database's path to load data.
         n_min_obs : int, optional
             Minimal number of historic data to compute signal, default is 1.
+        panel : bool, optional
+            If True, data are requested as a panel (time x asset x field),
+            see `data_base_requests`. Default is False.
 
         """
         self.assets = assets
@@ -379,6 +402,7 @@ class DataBaseManager:
         self.frequency = frequency
         self.path = path
         self.n_min_obs = n_min_obs
+        self.panel = panel
 
     def get_data(self, start=None, last=None):
         """ Get data from data base.
@@ -406,9 +430,23 @@ class DataBaseManager:
 
         return data_base_requests(
             self.assets.copy(), self.ohlcv, self.frequency,
-            start=start, end=last, path=self.path
+            start=start, end=last, path=self.path, panel=self.panel
         )
 
+    def cache_info(self):
+        """ Return hit and miss counters of the cache of partitions.
+
+        Partitions loaded from the data base are shared between calls (and
+        between data managers of the same process) in a LRU cache.
+
+        Returns
+        -------
+        dict
+            Number of `hits`, `misses`, current `size` and `maxsize`.
+
+        """
+        return partition_cache.info()
+
 
 def set_dataframe(data, rename={}, index=None, drop=None):
     """ Set raw data to data frame.
@@ -508,20 +546,18 @@ def get_ohlcv_kraken(asset, since=None, frequency=60):
     # Get raw data
     data = get_ohlcv('kraken', asset, since=since, frequency=frequency)
     # Set data in a dataframe
-    data = set_dataframe(
-        data['result'][asset],
-        rename={0: 'TS', 1: 'o', 2: 'h', 3: 'l', 4: 'c', 6: 'v'},
-        index='TS',
-        drop=[5, 7]
-    )
+    data = to_frame(*decode_ohlc(data['result'][asset]))
 
     # Return without the current observation
-    return data.drop(index=now())
+    return data.drop(index=now(), errors='ignore')
 
 
 def save_data(data, asset, path='data_base/'):
     """ Save data to the specified file.
 
+    Data are saved as columnar partitions, one memory-mapped file per day (see
+    `trading_bot.database`), and the manifest of the asset is updated.
+
     Parameters
     ----------
     data : pandas.DataFrame
@@ -537,17 +573,96 @@ def save_data(data, asset, path='data_base/'):
 
     day = (data.index // 86400)
     files = range(day.min(), day.max() + 1)
+    manifest = Manifest.load(path, asset)
 
     for file in files:
-        name = time.strftime('%y-%m-%d', time.gmtime(file * 86400))
+        array = set_partition(data, file)
+        offset = save_partition(array, path, asset, file)
+        manifest.update(file, array, offset=offset)
+
+    manifest.save()
+
+
+def append_data(data, asset, path='data_base/'):
+    """ Append new observations to the data base of an asset.
+
+    Observations older than the last stored timestamp are dropped, the new
+    rows are written in the tail of the current partition, new partitions
+    are created if necessary, and then the manifest is replaced atomically.
+    The cost doesn't depend on the size of the data base.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        OHLCV data indexed by timestamp.
+    asset : str
+        Asset name of data.
+    path : str, optional
+        Path of the data base.
+
+    Returns
+    -------
+    tuple of int or None
+        Timestamps of the first and last appended observations, None if there
+        is no new observation.
+
+    """
+    manifest = Manifest.load(path, asset)
+    if len(manifest) > 0:
+        data = data.loc[data.index > manifest.get()['last']]
+
+    return write_data(data, asset, path=path, manifest=manifest)
+
+
+def write_data(data, asset, path='data_base/', manifest=None):
+    """ Write observations at any time in the data base of an asset.
+
+    Each observation is written in its day partition (other rows are kept,
+    see `write_rows`), e.g. history older than the stored observations, and
+    then the manifest is replaced atomically with the new first and last
+    timestamps.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        OHLCV data indexed by timestamp.
+    asset : str
+        Asset name of data.
+    path : str, optional
+        Path of the data base.
+    manifest : trading_bot.database.Manifest, optional
+        Manifest of the asset, default is loaded.
+
+    Returns
+    -------
+    tuple of int or None
+        Timestamps of the first and last written observations, None if
+        `data` is empty.
+
+    """
+    if data.empty:
 
-        with open(path + asset + '/' + name + '.dat', 'wb') as f:
-            Pickler(f).dump(data.loc[data.index // 86400 == file])
+        return None
+
+    if manifest is None:
+        manifest = Manifest.load(path, asset)
+
+    for day in np.unique(data.index // 86400):
+        array, offset = write_rows(data, path, asset, day)
+        manifest.update(day, array, offset=offset)
+
+    manifest.save()
+
+    return int(data.index.min()), int(data.index.max())
 
 
 def update_data(exchange, asset, path='data_base/'):
     """ Update a minutely OHLCV data base for a specified exchange and asset.
 
+    Only the new observations are requested and appended to the data base
+    (see `append_data`). Rollup tiers persisted for the asset are updated
+    with the new data.
+
     Parameters
     ----------
     exchange : str
@@ -558,15 +673,11 @@ def update_data(exchange, asset, path='data_base/'):
         Path to load and save data.
 
     """
-    since = now(freq=86400)
-
-    # Load data
     try:
-        df = data_base_requests(asset, 'ohlcv', start=since, frequency=60)
-        since = df.index[-1]
+        since = int(Manifest.load(path, asset).get()['last'])
 
     except FileNotFoundError:
-        df = pd.DataFrame()
+        since = now(freq=86400)
 
     if exchange.lower() == 'kraken':
         data = get_ohlcv_kraken(asset, since=since, frequency=60)
@@ -574,10 +685,10 @@ def update_data(exchange, asset, path='data_base/'):
     else:
         raise ValueError('Unknow exchange', exchange)
 
-    # Update data
-    df = df.append(data).drop_duplicates()
-    # Save updated data
-    save_data(df, asset, path=path)
+    # Append new data
+    appended = append_data(data, asset, path=path)
+    if appended is not None:
+        update_rollups(path, asset, *appended)
 
 
 class DataExchangeManager:
@@ -585,36 +696,124 @@ class DataExchangeManager:
 
     /! CURRENTLY WORK ONLY WITH KRAKEN EXCHANGE /!
 
+    If `websocket` is True, OHLC data are read from the WebSocket feed of the
+    process (see `trading_bot.websocket_feed`), the REST API is requested
+    only when the feed doesn't have enough candles, and its answer seeds the
+    feed.
+
+    If `incremental` is True, only the candles since the last answer are
+    requested (with the `since` cursor returned by Kraken) and the kept
+    candles are appended to a rolling array of `n_min_obs` rows, such that
+    the cost of a request doesn't depend on the length of the history.
+
+    With several `assets`, OHLC data of each asset are requested concurrently
+    by a pool of `n_jobs` threads and aligned on a common index, `get_data`
+    returns then an array of shape `(n_min_obs, n_assets, n_fields)` with
+    `NaN` for the missing observations.
+
     """
 
+    _columns = {'o': 1, 'h': 2, 'l': 3, 'c': 4, 'v': 6}
+
     def __init__(self, assets, path="https://api.kraken.com/0/public",
-                 frequency=None, n_min_obs=1, ohlcv='ohlcv'):
+                 frequency=None, n_min_obs=1, ohlcv='ohlcv', websocket=False,
+                 incremental=False, n_jobs=4):
         self.logger = logging.getLogger(__name__)
         self.assets = assets
         self.req = DataRequests(path, stop_step=1)
         self.frequency = frequency
         self.n_min_obs = n_min_obs
         self.ohlcv = [i for i in ohlcv]
+        self.feed = None
+        if websocket:
+            self.feed = enable_feed(assets, channels=('ticker', 'spread'))
+
+        self.incremental = incremental
+        self.n_jobs = n_jobs
+        self.reset()
+
+        # One data manager per asset, with its own cursor and rolling array
+        self.managers = {}
+        if len(assets) > 1:
+            kwargs = {'path': path, 'frequency': frequency,
+                      'n_min_obs': n_min_obs, 'ohlcv': ohlcv,
+                      'websocket': websocket, 'incremental': incremental}
+            self.managers = {a: self._new_manager(a, **kwargs)
+                             for a in assets}
+
+    def _new_manager(self, asset, **kwargs):
+        return DataExchangeManager([asset], **kwargs)
+
+    def reset(self):
+        """ Reset the cursor and the rolling array of incremental mode. """
+        self.since = None
+        self.buffer = None
+        self._newest = None
+        self._interval = None
 
     def get_data(self, *args, **kwargs):
-        """
+        """ Request and clean the last data.
 
         Returns
         -------
         np.array
+            Last `n_min_obs` observations of the `ohlcv` fields, of shape
+            `(n_min_obs, n_fields)`, or `(n_min_obs, n_assets, n_fields)` if
+            there are several assets.
 
         """
-        data = self._get_data(*args, **kwargs)
-        if 'interval' in kwargs:
-            interval = kwargs['interval']
+        if self.managers and args[:1] == ('OHLC',):
 
-        else:
-            self.logger.warning('INTERVAL not specified in kwargs to get data')
-            interval = 1
+            return self.get_panel(*args, **kwargs)[1]
+
+        return self._fetch(*args, **kwargs)[1]
+
+    def get_panel(self, *args, **kwargs):
+        """ Request concurrently and align the last data of all the assets.
+
+        The `pair` keyword argument is set to each asset, such that the total
+        latency is about one request.
+
+        Returns
+        -------
+        index : np.ndarray[dtype=np.int64, ndim=1]
+            Union of the timestamps of the assets, last `n_min_obs` ones.
+        array : np.ndarray[dtype=np.float64, ndim=3]
+            Data of shape `(n_rows, n_assets, n_fields)`, missing
+            observations are `NaN`.
+
+        """
+        managers = self.managers or {self.assets[0]: self}
+        n_jobs = max(min(self.n_jobs, len(managers)), 1)
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [
+                pool.submit(m._fetch, *args, **{**kwargs, 'pair': a})
+                for a, m in managers.items()
+            ]
+            results = [f.result() for f in futures]
+
+        return self._align(results)
+
+    def _align(self, results):
+        # Align the (index, array) of each asset on the union of timestamps
+        index = np.unique(np.concatenate([r[0] for r in results]))
+        index = index[-self.n_min_obs:]
+        array = np.full([index.size, len(results), len(self.ohlcv)], np.nan)
+        for k, (idx, values) in enumerate(results):
+            keep = np.isin(idx, index)
+            array[np.searchsorted(index, idx[keep]), k] = values[keep]
+
+        return index, array
+
+    def _fetch(self, *args, **kwargs):
+        # Request and clean data of the first asset, return timestamps and
+        # values
+        interval, kwargs = self._set_interval(kwargs)
+        data = self._get_data(*args, **kwargs)
 
         try:
 
-            return self.clean_data(data, interval=interval * 60)  # , _raise=_raise)
+            return self._clean(data, interval)
 
         except NotLatestDataError as e:
             self.logger.error(
@@ -622,38 +821,164 @@ class DataExchangeManager:
             )
             time.sleep(1)
 
-            return self.get_data(*args, **kwargs)
+            return self._fetch(*args, **kwargs)
 
-    # TODO : to finish
-    def _get_data(self, *args, wait=1, **kwargs):
-        try:
+    def _set_interval(self, kwargs):
+        if 'interval' in kwargs:
+            interval = kwargs['interval']
+
+        else:
+            self.logger.warning('INTERVAL not specified in kwargs to get data')
+            interval = 1
+
+        if self.incremental and interval != self._interval:
+            self.reset()
+            self._interval = interval
+
+        if self.incremental and self.since is not None:
+            kwargs = {**kwargs, 'since': self.since}
+
+        return interval, kwargs
+
+    def _clean(self, data, interval):
+        if self.incremental:
+
+            return self._roll_data(data, interval=interval * 60)
+
+        return self._clean_data(data, interval=interval * 60)
+
+    def roll_data(self, data, interval=60):
+        """ Append new candles to the rolling array and return it.
+
+        Same output as `clean_data`, but only the new candles are parsed.
+
+        Parameters
+        ----------
+        data : dict
+            Answer of the OHLC endpoint, candles of the first asset and the
+            `last` cursor.
+        interval : int, optional
+            Number of seconds of a candle, default is 60.
+
+        Returns
+        -------
+        np.array
+            Last `n_min_obs` observations of the `ohlcv` fields.
+
+        """
+        return self._roll_data(data, interval=interval)[1]
+
+    def _roll_data(self, data, interval=60):
+        index, array = decode_ohlc(data[self.assets[0]], 'ohlcwvn')
+        rows = np.column_stack([index, array])
+        if 'last' in data:
+            self.since = int(data['last'])
+
+        if self.buffer is None:
+            self.buffer = RingBuffer(self.n_min_obs, 8)
+
+        if rows.shape[0] > 0:
+            self._newest = max(self._newest or rows[-1, 0], rows[-1, 0])
+
+        # Append kept candles, the last one can be updated
+        buf = self.buffer
+        keep = rows[rows[:, 0] % self.frequency == interval]
+        for row in keep[-(self.n_min_obs + 1):]:
+            last = buf.last(1)[0, 0] if len(buf) > 0 else -1
+            if row[0] == last:
+                buf.update(row)
+
+            elif row[0] > last:
+                buf.append(row)
+
+        out = buf.last()
+        t = now(interval)
+        if self._newest is not None and self._newest < t:
+            # Current candle not yet available, close with last price
+            c = get_close(self.assets[0])
+            ts = t - interval
+            if ts % self.frequency == interval:
+                if out.shape[0] > 0 and out[-1, 0] == ts:
+                    out[-1, 4] = c
+
+                else:
+                    row = np.full([1, 8], np.nan)
+                    row[0, [0, 4]] = ts, c
+                    out = np.concatenate([out, row])[-self.n_min_obs:]
+
+        columns = [self._columns[k] for k in self.ohlcv]
+
+        return out[:, 0].astype(np.int64), out[:, columns]
+
+    def _get_data(self, *args, **kwargs):
+        data = self._read_feed(args, kwargs)
+        if data is None:
+            data = self._request_data(*args, **kwargs)
+            self._seed_feed(args, kwargs, data)
+
+        return data
+
+    def _read_feed(self, args, kwargs):
+        # Candles of the feed, None if the REST API must be requested
+        if self.feed is None or args[:1] != ('OHLC',):
+
+            return None
+
+        asset, interval = self.assets[0], kwargs.get('interval', 1)
+        n = self._n_candles(interval)
+        self.feed.subscribe(asset, 'ohlc', interval=interval)
+        self.feed.reserve(asset, interval, n)
+        rows = self.feed.ohlc(asset, interval, n=n)
+
+        return None if rows is None else {asset: rows}
+
+    def _seed_feed(self, args, kwargs, data):
+        # The answer of the REST API fills the candles of the feed
+        if self.feed is not None and args[:1] == ('OHLC',):
+            asset = self.assets[0]
+            self.feed.seed(asset, kwargs.get('interval', 1), data[asset])
+
+    def _n_candles(self, interval):
+        # Candles of `interval` minutes covering the last `n_min_obs` bars
+        frequency = self.frequency or 60 * interval
+
+        return self.n_min_obs * frequency // (60 * interval) + 1
+
+    def _request_data(self, *args, wait=1, **kwargs):
+        # Connection errors are retried by the session, unavailable service
+        # is retried a bounded number of times
+        for k in range(self.req.session.max_retries + 1):
             data = self.req.get_data(*args, **kwargs)
+            if not self._is_retried(data, k, wait):
+
+                break
 
-        except RequestsConnectionError:
-            self.logger.error('Requests failed, ConnectionError, wait 3 sec')
             time.sleep(wait)
             wait *= 2
 
-            return self._get_data(*args, wait=wait, **kwargs)
+        return self._result(data, args, kwargs)
 
-        try:
-            if 'EService:Unavailable' in data['error']:
-                self.logger.error('eservice unvailable, wait 1 sec')
-                time.sleep(wait)
+    def _is_retried(self, data, k, wait):
+        # Unavailable service is retried, except after the last attempt
+        unavailable = 'EService:Unavailable' in data.get('error', [])
+        if not unavailable or k == self.req.session.max_retries:
+
+            return False
+
+        self.logger.error('eservice unvailable, wait {} sec'.format(wait))
 
-                return self._get_data(*args, wait=wait, **kwargs)
+        return True
+
+    def _result(self, data, args, kwargs):
+        # Return the result of an answer or raise the error of Kraken
+        if 'result' in data:
 
             return data['result']
 
-        except Exception as e:
-            txt = 'UNKNOWN ERROR !\n' + '-' * 15 + '\n'
-            # print('Error is', e, type(e))
-            txt += ("Error is {}\nAnswere is {} of type {}\nArgs are {}\n"
-                    "Kwargs are {}".format(data["error"], data, type(data),
-                                           args, kwargs))
-            self.logger.error(txt)
+        error = ExchangeError(data.get('error'), args=args, kwargs=kwargs)
+        self.logger.error(error)
 
-            raise e
+        raise error
 
     def clean_data(self, data, interval=60):  # , _raise=True):
         """ Clean data.
@@ -663,35 +988,27 @@ class DataExchangeManager:
         np.array
 
         """
-        # TODO : to finish
-        # to make copy of asset
-        # to loop for several assets
-        rename = {0: 'TS', 1: 'o', 2: 'h', 3: 'l', 4: 'c', 6: 'v'}
-        df = set_dataframe(
-            data[self.assets[0]], index='TS', rename=rename, drop=[5, 7],
-        )
-        t = now(interval)
-
-        if df.index[-1] < t:  # - self.frequency:
-            txt = 'Too old data: {} < {}'.format(df.index[-1], t)
-            txt += ' | TS: {} & price: {}'.format(df.index[-1],
-                                                  df.loc[:, 'c'].values[-1])
-            # if _raise:  # (self.ohlcv != 'c' and _raise) or _raise:
+        return self._clean_data(data, interval=interval)[1]
 
-            #    raise NotLatestDataError(txt)
+    def _clean_data(self, data, interval=60):
+        index, array = decode_ohlc(data[self.assets[0]], self.ohlcv)
+        t = now(interval)
 
-            # self.logger.debug(df.tail())
+        if index[-1] < t:  # - self.frequency:
+            # Current candle not yet available, close with last price
             c = get_close(self.assets[0])
-            txt += ' | add closed price: {} at TS: {}'.format(c, t - interval)
-            # self.logger.info(txt)
-            df.loc[t - interval, 'c'] = c
+            ts = t - interval
+            if index[-1] != ts:
+                index = np.append(index, ts)
+                array = np.concatenate([array, np.full([1, len(self.ohlcv)],
+                                                       np.nan)])
+
+            if 'c' in self.ohlcv:
+                array[-1, self.ohlcv.index('c')] = c
 
-        df = df.loc[df.index % self.frequency == interval, self.ohlcv]
-        # self.logger.debug('Timestamp is {}'.format(t))
-        # self.logger.debug('interval is {} sec'.format(interval))
-        # self.logger.debug(df.tail())
+        keep = index % self.frequency == interval
 
-        return df.iloc[-self.n_min_obs:].values
+        return index[keep][-self.n_min_obs:], array[keep][-self.n_min_obs:]
 
     def clean_data2(self, data):
         """ Clean data.
@@ -704,22 +1021,189 @@ class DataExchangeManager:
         # TODO : to finish
         # to make copy of asset
         # to loop for several assets
-        rename = {0: 'TS', 1: 'o', 2: 'h', 3: 'l', 4: 'c', 6: 'v'}
-        df = set_dataframe(
-            data[self.assets[0]], index='TS', rename=rename, drop=[5, 7],
-        )
-        df = df.loc[df.index % self.frequency == 0, self.ohlcv]
+        index, array = decode_ohlc(data[self.assets[0]], self.ohlcv)
+        keep = index % self.frequency == 0
+        index, array = index[keep], array[keep]
         # TODO : append several assets
 
-        if df.index[-1] < now():  # - self.frequency:
+        if index[-1] < now():  # - self.frequency:
 
-            raise NotLatestDataError('Too old data: ', df.index[-1])
+            raise NotLatestDataError('Too old data: ', index[-1])
 
         else:
             self.logger.debug('Timestamp is {} '.format(now()))
-            self.logger.debug(df.loc[:, self.ohlcv].tail())
 
-            return df.loc[:, self.ohlcv].values[-self.n_min_obs:]
+            return array[-self.n_min_obs:]
+
+
+class HybridDataManager(DataExchangeManager):
+    """ Object to serve the history of the data base and the last bars of an
+    exchange.
+
+    /! CURRENTLY WORK ONLY WITH KRAKEN EXCHANGE /!
+
+    The window of the last `n_min_obs` bars is on a regular grid of
+    `frequency` seconds, the bars are aggregated (see `resample`) such that
+    they are the same as in `database` mode. Bars covered by the candles of
+    the exchange (the last 720 candles for Kraken) are requested to the
+    exchange, older bars are read from the data base. The exchange wins on
+    the seam (the last bars of the data base can be partial).
+
+    The window is kept in memory between bars, such that the data base is
+    read only at the first request (or after a gap longer than the candles of
+    the exchange) and only the candles of the new bars are requested.
+
+    """
+
+    def __init__(self, assets, path="https://api.kraken.com/0/public",
+                 db_path='data_base/', frequency=60, n_min_obs=1,
+                 ohlcv='ohlcv', websocket=False, incremental=False,
+                 n_jobs=4):
+        """ Set the data manager.
+
+        Parameters
+        ----------
+        assets : list of str
+            Id(s) of the asset(s), same names on the exchange and in the data
+            base.
+        path : str, optional
+            Url of the public API of the exchange, default is Kraken.
+        db_path : str, optional
+            Path of the data base, default is 'data_base/'.
+        frequency : int, optional
+            Number of seconds of a bar, default is 60.
+        n_min_obs : int, optional
+            Number of bars of the window, default is 1.
+        ohlcv : str or list of str, optional
+            Fields of the bars, default is 'ohlcv'.
+        websocket : bool, optional
+            If True, candles are read from the WebSocket feed when it has
+            enough candles, default is False.
+        incremental : bool, optional
+            Accepted for the same configuration as `DataExchangeManager`,
+            the window is always updated with the candles of the new bars.
+        n_jobs : int, optional
+            Number of assets requested at the same time, default is 4.
+
+        """
+        super(HybridDataManager, self).__init__(
+            assets, path=path, frequency=frequency, n_min_obs=n_min_obs,
+            ohlcv=ohlcv, websocket=websocket, n_jobs=n_jobs,
+        )
+        self.db_path = db_path
+        self.n_db_reads = 0
+
+    def reset(self):
+        """ Reset the window kept in memory. """
+        super(HybridDataManager, self).reset()
+        self.index = None
+        self.array = None
+
+    def get_data(self, *args, **kwargs):
+        """ Return the last complete bars.
+
+        Returns
+        -------
+        np.array
+            Last `n_min_obs` bars of the `ohlcv` fields, of shape
+            `(n_min_obs, n_fields)`, or `(n_min_obs, n_assets, n_fields)` if
+            there are several assets. Bars without data are `NaN`.
+
+        """
+        _, array = self.get_window(*args, **kwargs)
+
+        return array if self.managers else array[:, 0]
+
+    def get_window(self, *args, **kwargs):
+        """ Update and return the window of the last complete bars.
+
+        Returns
+        -------
+        index : np.ndarray[dtype=np.int64, ndim=1]
+            Timestamps of the bars.
+        array : np.ndarray[dtype=np.float64, ndim=3]
+            Data of shape `(n_min_obs, n_assets, n_fields)`.
+
+        """
+        interval = kwargs.get('interval', 1) * 60
+        if self.frequency % interval:
+
+            raise ValueError('Frequency {} is not a multiple of the interval '
+                             '{}'.format(self.frequency, interval))
+
+        end = now(self.frequency)
+        index = end - self.frequency * np.arange(self.n_min_obs, 0, -1)
+        array = np.full([index.size, len(self.assets), len(self.ohlcv)],
+                        np.nan)
+        known = np.zeros(index.size, dtype=bool)
+        since = None
+        if self.index is not None:
+            # Bars already in the window
+            keep = np.isin(self.index, index)
+            rows = np.searchsorted(index, self.index[keep])
+            array[rows], known[rows] = self.array[keep], True
+            since = int(self.index[-1] + self.frequency - interval)
+
+        # Bars of the exchange, it wins on the seam
+        first = end
+        tails = self._get_tails(args, kwargs, end, since)
+        for k, (idx, values) in enumerate(tails):
+            keep = np.isin(idx, index)
+            array[np.searchsorted(index, idx[keep]), k] = values[keep]
+            first = min(first, idx[0] if idx.size else end)
+
+        # Older bars, not in the window, from the data base
+        missing = ~known & (index < first)
+        if missing.any():
+            start = index[missing][0]
+            stop = index[missing][-1] + self.frequency - 60
+            idx, values = self._read_data_base(start, stop)
+            keep = np.isin(idx, index[missing])
+            array[np.searchsorted(index, idx[keep])] = values[keep]
+
+        self.index, self.array = index, array
+
+        return index, array
+
+    def _get_tails(self, args, kwargs, end, since):
+        managers = self.managers or {self.assets[0]: self}
+        if since is not None:
+            kwargs = {**kwargs, 'since': since}
+
+        def get(asset, manager):
+            data = manager._get_data(*args, **{**kwargs, 'pair': asset})
+            index, array = decode_ohlc(data[asset], self.ohlcv)
+            # Only complete bars, covered by the candles
+            lower = index[0] if since is None else since
+            lower = -(-lower // self.frequency) * self.frequency
+            keep = (index >= lower) & (index < end)
+
+            return resample(index[keep], array[keep], self.frequency,
+                            self.ohlcv)
+
+        n_jobs = max(min(self.n_jobs, len(managers)), 1)
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(get, a, m) for a, m in managers.items()]
+
+            return [f.result() for f in futures]
+
+    def _read_data_base(self, start, end):
+        self.n_db_reads += 1
+        timestep = _get_timestep(self.assets, self.frequency, self.db_path)
+        try:
+            index, array = read_panel(self.db_path, self.assets, start, end,
+                                      fields=self.ohlcv, timestep=timestep)
+
+        except FileNotFoundError as e:
+            self.logger.warning('No data in the data base: {}'.format(e))
+
+            return (np.zeros(0, dtype=np.int64),
+                    np.zeros([0, len(self.assets), len(self.ohlcv)]))
+
+        if self.frequency > timestep:
+            index, array = resample(index, array, self.frequency, self.ohlcv)
+
+        return index, array
 
 
 class NotLatestDataError(Exception):
@@ -728,6 +1212,212 @@ class NotLatestDataError(Exception):
     pass
 
 
+class ExchangeError(Exception):
+    """ Error raised when the exchange answers without result.
+
+    Attributes
+    ----------
+    error : list of str
+        Error field of the answer of the exchange.
+
+    """
+
+    def __init__(self, error, args=(), kwargs=None):
+        """ Initialize the exchange error. """
+        self.error = error
+        msg = 'exchange answered with error {}'.format(error)
+        msg += ', args were {} and kwargs were {}'.format(args, kwargs or {})
+        super(ExchangeError, self).__init__(msg)
+
+
+class TickerCache:
+    """ Time-to-live cache of the Ticker endpoint shared by the ticker helpers.
+
+    A ticker is requested only if it is older than `ttl` seconds. Concurrent
+    misses for the same pair are merged into one request, and misses for
+    different pairs are batched into one comma-delimited Ticker request: the
+    first thread that misses requests all pending pairs, the others wait
+    for its answer.
+
+    Methods
+    -------
+    get
+    clear
+    info
+
+    Attributes
+    ----------
+    ttl : float
+        Number of seconds a ticker is valid, `0` disables the cache (misses
+        are still merged and batched).
+    hits, misses : int
+        Number of tickers found and not found in the cache.
+    requests : int
+        Number of requests to the Ticker endpoint.
+
+    """
+
+    def __init__(self, ttl=1.):
+        """ Initialize the cache.
+
+        Parameters
+        ----------
+        ttl : float, optional
+            Number of seconds a ticker is valid, default is `1`.
+
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self._data = {}
+        self._pending = {}
+        self._inflight = {}
+        self._round = {}
+        self._failed = {}
+        self._cond = Condition()
+
+    def _is_fresh(self, key, t, start):
+        item = self._data.get(key)
+        if item is None:
+
+            return False
+
+        # Tickers requested after the call started are always valid
+        return t - item[0] < self.ttl or item[1] > start
+
+    def get(self, pairs, path="https://api.kraken.com/0/public"):
+        """ Get tickers from the cache or request them.
+
+        Parameters
+        ----------
+        pairs : list of str
+            Codes of the requested pairs. The canonical names of the exchange
+            (e.g. 'XXBTZUSD') should be used, a pair answered under another
+            name is requested alone.
+        path : str, optional
+            Path of the exchange to request.
+
+        Returns
+        -------
+        dict
+            Raw ticker of each pair.
+
+        """
+        waited = None
+        while True:
+            with self._cond:
+                t = time.monotonic()
+                if waited is None:
+                    start = self._round.get(path, 0)
+
+                missing = [p for p in pairs
+                           if not self._is_fresh((path, p), t, start)]
+                if waited is None:
+                    self.hits += len(pairs) - len(missing)
+                    self.misses += len(missing)
+
+                if not missing:
+
+                    return {p: self._data[(path, p)][2] for p in pairs}
+
+                # Raise the error of a request this thread waited for
+                for p in missing:
+                    n, error = self._failed.get((path, p), (-1, None))
+                    if waited is not None and n >= waited:
+
+                        raise error
+
+                inflight = self._inflight.setdefault(path, set())
+                pending = self._pending.setdefault(path, set())
+                pending.update(p for p in missing if p not in inflight)
+                waited = self._round.get(path, 0)
+                if inflight:
+                    # Another thread is requesting, wait for its answer
+                    self._cond.wait()
+
+                    continue
+
+                self._round[path] = self._round.get(path, 0) + 1
+                batch = sorted(pending)
+                inflight.update(batch)
+                pending.clear()
+                n = self._round[path]
+
+            self._request(batch, path, n)
+
+    def _request(self, batch, path, n):
+        try:
+            result = self._get(batch, path)
+            if len(batch) > 1:
+                # Pairs answered under another name are requested alone
+                for p in batch:
+                    if p not in result:
+                        result.update(self._get([p], path))
+
+        except Exception as e:
+            with self._cond:
+                self._failed.update({(path, p): (n, e) for p in batch})
+
+            raise e
+
+        else:
+            with self._cond:
+                t = time.monotonic()
+                self._data.update({
+                    (path, p): (t, n, result[p]) for p in batch
+                })
+
+        finally:
+            with self._cond:
+                self._inflight[path].clear()
+                self._cond.notify_all()
+
+    def _get(self, batch, path):
+        out = DataRequests(path, stop_step=1).get_data(
+            'Ticker', pair=','.join(batch)
+        )
+        with self._cond:
+            self.requests += 1
+
+        if out['error']:
+
+            raise ValueError('Ticker {}: {}'.format(batch, out['error']))
+
+        elif len(batch) == 1 and len(out['result']) == 1:
+
+            return {batch[0]: next(iter(out['result'].values()))}
+
+        return out['result']
+
+    def clear(self):
+        """ Remove all tickers and reset counters. """
+        with self._cond:
+            self._data.clear()
+            self._failed.clear()
+            self.hits = 0
+            self.misses = 0
+            self.requests = 0
+
+    def info(self):
+        """ Return the counters and the size of the cache.
+
+        Returns
+        -------
+        dict
+            Number of hits, misses, requests, cached tickers and the TTL.
+
+        """
+        with self._cond:
+
+            return {'hits': self.hits, 'misses': self.misses,
+                    'requests': self.requests, 'size': len(self._data),
+                    'ttl': self.ttl}
+
+
+ticker_cache = TickerCache()
+
+
 def get_open(pair, path="https://api.kraken.com/0/public"):
     """ Get the open price of `pair`.
 
@@ -740,30 +1430,47 @@ def get_open(pair, path="https://api.kraken.com/0/public"):
 
     Returns
     -------
-    float
-        Last close price.
+    float or dict
+        Today open price(s).
 
     """
-    out = DataRequests(path, stop_step=1).get_data('Ticker', pair=pair)
-    res = []
-    for arg in out['result'].values():
+    return _get_ticker(pair, 'o', path)
 
-        res += [float(arg['o'])]
 
-    if len(res) == 1:
+def _get_feed_ticker(feed, pair, method):
+    # Best bid and ask from the spread channel, else from the ticker channel
+    if method in ['a', 'b']:
+        spread = feed.spread(pair)
+        if spread is not None:
 
-        return res[0]
+            return float(spread[-1, 2 if method == 'a' else 1])
 
-    else:
+    ticker = feed.ticker(pair)
+    if ticker is None:
+
+        return None
+
+    v = ticker[method]
 
-        return res
+    return float(v[0] if isinstance(v, list) else v)
 
 
 def _get_ticker(pair, method, path="https://api.kraken.com/0/public"):
-    out = DataRequests(path, stop_step=1).get_data('Ticker', pair=pair)
+    pairs = pair.split(',')
     res = {}
-    for p, v in out['result'].items():
-        res[p] = float(v[method][0] if method != 'o' else v[method])
+    feed = get_feed()
+    if feed is not None:
+        for p in pairs:
+            value = _get_feed_ticker(feed, p, method)
+            if value is not None:
+                res[p] = value
+
+    missing = [p for p in pairs if p not in res]
+    if missing:
+        out = ticker_cache.get(missing, path)
+        for p in missing:
+            v = out[p][method]
+            res[p] = float(v[0] if method != 'o' else v)
 
     if len(res) == 1:
 
@@ -771,7 +1478,7 @@ def _get_ticker(pair, method, path="https://api.kraken.com/0/public"):
 
     else:
 
-        return res
+        return {p: res[p] for p in pairs}
 
 
 def get_close(pair, path="https://api.kraken.com/0/public"):
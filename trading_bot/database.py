@@ -0,0 +1,1239 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Columnar memory-mapped storage of OHLCV data.
+
+Each asset of the data base is a folder of daily partitions. A partition is a
+`.npy` file with a float64 array of shape `(5, 1440)`: one contiguous row per
+field (open, high, low, close and volume) on an implicit minutely grid that
+starts at midnight UTC. Missing observations are set to `NaN`.
+
+Partitions are loaded with `numpy.load(..., mmap_mode='r')` such that slicing
+rows or fields returns a view of the file without copy.
+
+Rollup tiers (e.g. 5 minutes, 15 minutes, 1 hour and 1 day bars) can be
+persisted in subfolders of the asset named by their timestep in seconds (e.g.
+`300s/`). Tier partitions have the same layout with 1440 rows, such that a
+partition covers `1440 * timestep` seconds and its number is the timestamp
+of its first row divided by this span. For minutely data a partition is a
+day and its number is the number of days since epoch. Sub-minute tiers (e.g.
+`10s/`, built from trades, see `trading_bot.trades_tape`) have partitions
+shorter than a day, named with the time of their first row.
+
+Each asset folder (and tier subfolder) also has a manifest (`manifest.npy`)
+that records for each partition the first and last timestamps, the number of
+rows and the offset of the data in the file. It is kept up to date when
+partitions are saved, and range requests find partitions with a binary search
+on it. A manifest is not part of the data: it is rebuilt from the partitions
+when it is missing or older than its folder (e.g. partitions copied in the
+folder).
+
+Loaded partitions and manifests are kept in a process-wide LRU cache
+(`partition_cache`), invalidated when the file is modified.
+
+"""
+
+# Built-in packages
+import calendar
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from os import listdir, makedirs, replace, stat, utime
+from os.path import isdir
+from pickle import Unpickler
+from threading import Lock
+import time
+
+# Third party packages
+import numpy as np
+import pandas as pd
+
+# Local packages
+
+__all__ = [
+    'load_partition', 'save_partition', 'set_partition', 'partition_size',
+    'list_days', 'get_array', 'get_frame', 'convert_data_base', 'Manifest',
+    'PartitionCache', 'iter_range', 'read_range', 'read_panel', 'resample',
+    'update_rollups', 'build_rollups', 'list_tiers', 'write_rows',
+    'write_bars',
+]
+
+FIELDS = 'ohlcv'
+TIMESTEP = 60
+N_ROWS = 86400 // TIMESTEP
+ROLLUP_TIERS = (300, 900, 3600, 86400)
+EXT = '.npy'
+LEGACY_EXT = '.dat'
+MANIFEST = 'manifest.npy'
+MANIFEST_DTYPE = np.dtype([
+    ('day', '<i8'),
+    ('first', '<i8'),
+    ('last', '<i8'),
+    ('n_rows', '<i8'),
+    ('offset', '<i8'),
+])
+
+
+def _set_path(path, asset, timestep=TIMESTEP):
+    if path[-1] != '/':
+        path += '/'
+
+    if timestep != TIMESTEP:
+
+        return path + asset + '/{}s/'.format(timestep)
+
+    return path + asset + '/'
+
+
+def _span(timestep):
+    # number of seconds covered by a partition
+    return timestep * N_ROWS
+
+
+def day_to_name(day, timestep=TIMESTEP):
+    """ Return the name of the partition of a day (number of days since epoch).
+
+    Parameters
+    ----------
+    day : int
+        Number of days since 1970-01-01 (number of the partition if
+        `timestep` is not 60).
+    timestep : int, optional
+        Number of seconds between two rows, default is `60`.
+
+    Returns
+    -------
+    str
+        Name of the partition formated as `'%y-%m-%d'`, or as
+        `'%y-%m-%d_%H%M%S'` if a partition covers less than a day.
+
+    Examples
+    --------
+    >>> day_to_name(17963)
+    '19-03-08'
+    >>> day_to_name(107779, timestep=10)
+    '19-03-08_040000'
+
+    """
+    ts = int(day) * _span(timestep)
+    if _span(timestep) % 86400:
+
+        return time.strftime('%y-%m-%d_%H%M%S', time.gmtime(ts))
+
+    return time.strftime('%y-%m-%d', time.gmtime(ts))
+
+
+def name_to_day(name, timestep=TIMESTEP):
+    """ Return the day (number of days since epoch) of a partition name.
+
+    Parameters
+    ----------
+    name : str
+        Name of the partition formated as `'%y-%m-%d'` (or
+        `'%y-%m-%d_%H%M%S'`), the extension is ignored.
+    timestep : int, optional
+        Number of seconds between two rows, default is `60`.
+
+    Returns
+    -------
+    int
+        Number of days since 1970-01-01 (number of the partition if
+        `timestep` is not 60).
+
+    Examples
+    --------
+    >>> name_to_day('19-03-08.npy')
+    17963
+    >>> name_to_day('19-03-08_040000.npy', timestep=10)
+    107779
+
+    """
+    name = name.split('.')[0]
+    fmt = '%y-%m-%d_%H%M%S' if len(name) > 8 else '%y-%m-%d'
+    ts = calendar.timegm(time.strptime(name, fmt))
+
+    return ts // _span(timestep)
+
+
+def list_days(path, asset, timestep=TIMESTEP):
+    """ List the days available in the data base of an asset.
+
+    Parameters
+    ----------
+    path : str
+        Path of the data base.
+    asset : str
+        Name of the asset.
+    timestep : int, optional
+        Number of seconds between two rows, default is `60`.
+
+    Returns
+    -------
+    list of int
+        Sorted days (number of days since epoch) of each partition.
+
+    """
+    days = set()
+    for name in listdir(_set_path(path, asset, timestep)):
+        if name == MANIFEST:
+
+            continue
+
+        elif name.endswith(EXT) or name.endswith(LEGACY_EXT):
+            days.add(name_to_day(name, timestep))
+
+    return sorted(days)
+
+
+def set_partition(df, day, timestep=TIMESTEP):
+    """ Set the columnar array of a day partition from a dataframe.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        OHLCV data indexed by timestamp, columns must be in 'o', 'h', 'l',
+        'c' and 'v'. Observations not in `day` are ignored.
+    day : int
+        Number of days since 1970-01-01.
+    timestep : int, optional
+        Number of seconds between two rows, default is `60`.
+
+    Returns
+    -------
+    np.ndarray[dtype=np.float64, ndim=2]
+        Array of shape `(5, 1440)`, missing observations are `NaN`.
+
+    """
+    array = np.full((len(FIELDS), N_ROWS), np.nan)
+    _set_rows(array, df, day, timestep)
+
+    return array
+
+
+def _set_rows(array, df, day, timestep=TIMESTEP):
+    index = np.asarray(df.index, dtype=np.int64)
+    mask = index // _span(timestep) == day
+    rows = (index[mask] - day * _span(timestep)) // timestep
+    for k, f in enumerate(FIELDS):
+        if f in df.columns:
+            array[k, rows] = df.loc[:, f].values[mask].astype(np.float64)
+
+
+def save_partition(array, path, asset, day, timestep=TIMESTEP):
+    """ Save atomically the array of a day partition.
+
+    Parameters
+    ----------
+    array : np.ndarray[dtype=np.float64, ndim=2]
+        Array of shape `(5, 1440)`.
+    path : str
+        Path of the data base.
+    asset : str
+        Name of the asset.
+    day : int
+        Number of days since 1970-01-01.
+    timestep : int, optional
+        Number of seconds between two rows, default is `60`.
+
+    Returns
+    -------
+    int
+        Offset in bytes of the data in the file.
+
+    """
+    path = _set_path(path, asset, timestep)
+    makedirs(path, exist_ok=True)
+    name = path + day_to_name(day, timestep) + EXT
+    with open(name + '.tmp', 'wb') as f:
+        np.save(f, np.ascontiguousarray(array, dtype=np.float64))
+        offset = f.tell() - array.size * 8
+
+    replace(name + '.tmp', name)
+
+    return offset
+
+
+class PartitionCache:
+    """ Size-bounded LRU cache of decoded files of the data base.
+
+    Objects are keyed by file name and are invalidated when the inode, the
+    modification time or the size of the file change (e.g. a partition
+    replaced by `save_partition`).
+
+    Methods
+    -------
+    get
+    clear
+    info
+
+    Attributes
+    ----------
+    maxsize : int
+        Maximum number of cached objects.
+    hits, misses : int
+        Number of requests found and not found in the cache.
+
+    """
+
+    def __init__(self, maxsize=256):
+        """ Initialize the cache.
+
+        Parameters
+        ----------
+        maxsize : int, optional
+            Maximum number of cached objects, default is `256` (i.e. about
+            15 MB of day partitions).
+
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, filename, loader):
+        """ Get a decoded file from the cache or load it.
+
+        Parameters
+        ----------
+        filename : str
+            Path of the file.
+        loader : callable
+            Function that takes `filename` and returns the decoded object.
+
+        Returns
+        -------
+        object
+            The decoded file.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the file doesn't exist.
+
+        """
+        st = stat(filename)
+        sign = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            item = self._data.get(filename)
+            if item is not None and item[0] == sign:
+                self._data.move_to_end(filename)
+                self.hits += 1
+
+                return item[1]
+
+            self.misses += 1
+
+        obj = loader(filename)
+        with self._lock:
+            self._data[filename] = (sign, obj)
+            self._data.move_to_end(filename)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+        return obj
+
+    def clear(self):
+        """ Remove all objects and reset counters. """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """ Return the counters and the size of the cache.
+
+        Returns
+        -------
+        dict
+            Number of `hits`, `misses`, current `size` and `maxsize`.
+
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+
+partition_cache = PartitionCache()
+
+
+def _load_npy(filename):
+    return np.load(filename, mmap_mode='r')
+
+
+def _load_legacy(filename):
+    with open(filename, 'rb') as f:
+        df = Unpickler(f).load()
+
+    array = set_partition(df, name_to_day(filename.split('/')[-1]))
+    array.flags.writeable = False
+
+    return array
+
+
+def load_partition(path, asset, day, timestep=TIMESTEP):
+    """ Load a day partition as a read-only memory-mapped array.
+
+    If the columnar partition doesn't exist, the legacy pickled dataframe
+    (`.dat` file) is loaded and converted in memory. Partitions are cached in
+    `partition_cache`.
+
+    Parameters
+    ----------
+    path : str
+        Path of the data base.
+    asset : str
+        Name of the asset.
+    day : int
+        Number of days since 1970-01-01.
+    timestep : int, optional
+        Number of seconds between two rows, default is `60`.
+
+    Returns
+    -------
+    np.ndarray[dtype=np.float64, ndim=2]
+        Array of shape `(5, 1440)`.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the partition doesn't exist.
+
+    """
+    name = _set_path(path, asset, timestep) + day_to_name(day, timestep)
+    try:
+
+        return partition_cache.get(name + EXT, _load_npy)
+
+    except FileNotFoundError:
+        if timestep != TIMESTEP:
+
+            raise
+
+        return partition_cache.get(name + LEGACY_EXT, _load_legacy)
+
+
+def write_rows(df, path, asset, day):
+    """ Write observations in the tail of a day partition.
+
+    The rows of `df` are written in a copy of the partition (a missing or a
+    legacy partition is created), other rows are unchanged, and the copy is
+    saved atomically (see `save_partition`), such that a crash never leaves
+    a partly updated partition. The manifest must be updated after.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        OHLCV data indexed by timestamp, columns must be in 'o', 'h', 'l',
+        'c' and 'v'. Observations not in `day` are ignored.
+    path : str
+        Path of the data base.
+    asset : str
+        Name of the asset.
+    day : int
+        Number of days since 1970-01-01.
+
+    Returns
+    -------
+    array : np.ndarray[dtype=np.float64, ndim=2]
+        Array of the updated partition.
+    offset : int
+        Offset in bytes of the data in the file.
+
+    """
+    try:
+        array = np.array(load_partition(path, asset, day))
+
+    except FileNotFoundError:
+        array = np.full((len(FIELDS), N_ROWS), np.nan)
+
+    _set_rows(array, df, day)
+
+    return array, save_partition(array, path, asset, day)
+
+
+def partition_size(array):
+    """ Return the number of rows until the last observation of a partition.
+
+    Parameters
+    ----------
+    array : np.ndarray[dtype=np.float64, ndim=2]
+        Array of a day partition.
+
+    Returns
+    -------
+    int
+        Index of the last observation plus one, `0` if partition is empty.
+
+    """
+    rows = np.flatnonzero(~np.isnan(array).all(axis=0))
+    if rows.size == 0:
+
+        return 0
+
+    return int(rows[-1]) + 1
+
+
+def _field_index(fields):
+    fields = ''.join(fields)
+    k = FIELDS.find(fields)
+    if k >= 0:
+        # contiguous fields are selected with a slice (i.e. view)
+
+        return slice(k, k + len(fields))
+
+    return [FIELDS.index(f) for f in fields]
+
+
+def get_array(array, row_slice=slice(None), fields=FIELDS):
+    """ Select rows and fields of a partition.
+
+    The result is a view of the partition if `fields` are contiguous in
+    'ohlcv' (e.g. 'ohlc', 'c' or 'hl'), otherwise it is a copy.
+
+    Parameters
+    ----------
+    array : np.ndarray[dtype=np.float64, ndim=2]
+        Array of a day partition.
+    row_slice : slice, optional
+        Rows to select, default is all the rows.
+    fields : str or list of str, optional
+        Fields to select, default is 'ohlcv'.
+
+    Returns
+    -------
+    np.ndarray[dtype=np.float64, ndim=2]
+        Array of shape `(n_rows, n_fields)`.
+
+    """
+    return array[_field_index(fields), row_slice].T
+
+
+def get_frame(array, day, row_slice=slice(None), fields=FIELDS,
+              timestep=TIMESTEP):
+    """ Select rows and fields of a partition and set it as a dataframe.
+
+    Parameters
+    ----------
+    array : np.ndarray[dtype=np.float64, ndim=2]
+        Array of a day partition.
+    day : int
+        Number of days since 1970-01-01.
+    row_slice : slice, optional
+        Rows to select, default is all the rows.
+    fields : str or list of str, optional
+        Fields to select, default is 'ohlcv'.
+    timestep : int, optional
+        Number of seconds between two rows, default is `60`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Data indexed by timestamp.
+
+    """
+    start, stop, _ = row_slice.indices(array.shape[1])
+    rows = np.arange(start, stop, dtype=np.int64)
+    index = day * _span(timestep) + rows * timestep
+
+    return pd.DataFrame(
+        get_array(array, row_slice, fields),
+        index=index,
+        columns=[f for f in fields],
+        copy=False,
+    )
+
+
+def _is_stale(folder):
+    # A partition added, replaced or removed modifies the folder
+    return stat(folder).st_mtime_ns > stat(folder + MANIFEST).st_mtime_ns
+
+
+def _load_manifest(filename):
+    index = np.load(filename)
+    index.flags.writeable = False
+
+    return index
+
+
+class Manifest:
+    """ Persistent index of the day partitions of an asset.
+
+    The manifest is a structured array sorted by day, with for each partition
+    the timestamps of the first and last observations, the number of rows
+    (index of the last observation plus one) and the offset in bytes of the
+    data in the partition file (`-1` for legacy partitions).
+
+    Methods
+    -------
+    load
+    save
+    rebuild
+    update
+    find
+    get
+
+    Attributes
+    ----------
+    path : str
+        Path of the data base.
+    asset : str
+        Name of the asset.
+    timestep : int
+        Number of seconds between two rows of the partitions.
+    index : np.ndarray[dtype=MANIFEST_DTYPE, ndim=1]
+        Records of the partitions sorted by day.
+
+    """
+
+    def __init__(self, path, asset, timestep=TIMESTEP):
+        """ Initialize the manifest of an asset.
+
+        Parameters
+        ----------
+        path : str
+            Path of the data base.
+        asset : str
+            Name of the asset.
+        timestep : int, optional
+            Number of seconds between two rows, default is `60`.
+
+        """
+        self.path = path
+        self.asset = asset
+        self.timestep = timestep
+        self.index = np.zeros(0, dtype=MANIFEST_DTYPE)
+
+    def __len__(self):
+        return self.index.size
+
+    def __repr__(self):
+        return 'Manifest of {} with {} partitions'.format(
+            self.asset, len(self)
+        )
+
+    @classmethod
+    def load(cls, path, asset, timestep=TIMESTEP):
+        """ Load the manifest of an asset.
+
+        If the manifest file doesn't exist or is stale (the folder of the
+        asset was modified after it), it is built from the partitions of the
+        asset folder and saved.
+
+        Parameters
+        ----------
+        path : str
+            Path of the data base.
+        asset : str
+            Name of the asset.
+        timestep : int, optional
+            Number of seconds between two rows, default is `60`.
+
+        Returns
+        -------
+        Manifest
+            Index of the partitions.
+
+        """
+        manifest = cls(path, asset, timestep)
+        folder = _set_path(path, asset, timestep)
+        try:
+            if _is_stale(folder):
+
+                raise FileNotFoundError(folder + MANIFEST)
+
+            manifest.index = partition_cache.get(
+                folder + MANIFEST, _load_manifest
+            )
+
+        except FileNotFoundError:
+            manifest.rebuild()
+
+        return manifest
+
+    def rebuild(self):
+        """ Rebuild the manifest from the partitions of the asset folder. """
+        self.index = np.zeros(0, dtype=MANIFEST_DTYPE)
+        try:
+            days = list_days(self.path, self.asset, self.timestep)
+
+        except FileNotFoundError:
+            # new asset
+
+            return
+
+        for day in days:
+            array = load_partition(self.path, self.asset, day, self.timestep)
+            self.update(day, array)
+
+        self.save()
+
+    def save(self):
+        """ Save atomically the manifest in the asset folder. """
+        path = _set_path(self.path, self.asset, self.timestep)
+        makedirs(path, exist_ok=True)
+        with open(path + MANIFEST + '.tmp', 'wb') as f:
+            np.save(f, self.index)
+
+        replace(path + MANIFEST + '.tmp', path + MANIFEST)
+        # Up to date with the folder, including its own replacement
+        st = stat(path + MANIFEST)
+        utime(path + MANIFEST, ns=(st.st_atime_ns, stat(path).st_mtime_ns))
+
+    def update(self, day, array, offset=-1):
+        """ Add or replace the record of a partition.
+
+        Parameters
+        ----------
+        day : int
+            Number of days since 1970-01-01.
+        array : np.ndarray[dtype=np.float64, ndim=2]
+            Array of the day partition.
+        offset : int, optional
+            Offset in bytes of the data in the partition file, default is
+            `-1` (unknown offset).
+
+        """
+        i = np.searchsorted(self.index['day'], day)
+        exists = i < self.index.size and self.index['day'][i] == day
+        rows = np.flatnonzero(~np.isnan(array).all(axis=0))
+        if rows.size == 0:
+            # empty partitions are not recorded
+            if exists:
+                self.index = np.delete(self.index, i)
+
+            return
+
+        record = np.array([(
+            day,
+            day * _span(self.timestep) + rows[0] * self.timestep,
+            day * _span(self.timestep) + rows[-1] * self.timestep,
+            rows[-1] + 1,
+            offset,
+        )], dtype=MANIFEST_DTYPE)
+        if exists:
+            self.index = self.index.copy()
+            self.index[i] = record[0]
+
+        else:
+            self.index = np.insert(self.index, i, record)
+
+    def find(self, start, end):
+        """ Find with a binary search the partitions overlapping a range.
+
+        Parameters
+        ----------
+        start, end : int
+            Timestamps of the first and last observations of the range.
+
+        Returns
+        -------
+        np.ndarray[dtype=MANIFEST_DTYPE, ndim=1]
+            Records of the partitions sorted by day.
+
+        """
+        i = np.searchsorted(self.index['last'], start, side='left')
+        j = np.searchsorted(self.index['first'], end, side='right')
+
+        return self.index[i: j]
+
+    def get(self, day=-1):
+        """ Get the record of a partition.
+
+        Parameters
+        ----------
+        day : int, optional
+            Number of days since 1970-01-01, default is `-1` the last
+            partition.
+
+        Returns
+        -------
+        np.void
+            Record of the partition.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the partition is not in the manifest.
+
+        """
+        if day == -1 and self.index.size > 0:
+
+            return self.index[-1]
+
+        i = np.searchsorted(self.index['day'], day)
+        if i < self.index.size and self.index['day'][i] == day:
+
+            return self.index[i]
+
+        raise FileNotFoundError('No partition {} for {}'.format(
+            day_to_name(day, self.timestep) if day >= 0 else day, self.asset
+        ))
+
+
+def _slice_part(part, start, end, timestep=TIMESTEP):
+    t0 = int(part['day']) * _span(timestep)
+    i = -(-(start - t0) // timestep)
+    i = max(i, (int(part['first']) - t0) // timestep)
+    j = min((end - t0) // timestep + 1, int(part['n_rows']))
+
+    return t0 + i * timestep, slice(i, max(i, j))
+
+
+def iter_range(path, asset, start, end, fields=FIELDS, n_jobs=4, parts=None,
+               timestep=TIMESTEP):
+    """ Iterate over the data of an asset between two timestamps.
+
+    Partitions are decoded in parallel by a small thread pool, at most
+    `n_jobs` partitions are loaded ahead of the consumer such that the memory
+    used doesn't depend on the length of the range.
+
+    Parameters
+    ----------
+    path : str
+        Path of the data base.
+    asset : str
+        Name of the asset.
+    start, end : int
+        Timestamps of the first and last observations of the range.
+    fields : str or list of str, optional
+        Fields to select, default is 'ohlcv'.
+    n_jobs : int, optional
+        Number of partitions decoded in parallel, default is `4`.
+    parts : np.ndarray[dtype=MANIFEST_DTYPE, ndim=1], optional
+        Records of the partitions to read, default is found in the manifest of
+        the asset.
+    timestep : int, optional
+        Number of seconds between two rows, default is `60` (i.e. minutely
+        data, otherwise data of a rollup tier).
+
+    Yields
+    ------
+    int
+        Timestamp of the first row of the chunk, aligned on the minutely
+        grid.
+    np.ndarray[dtype=np.float64, ndim=2]
+        Chunk of shape `(n_rows, n_fields)`, a view of the partition if
+        `fields` are contiguous in 'ohlcv'.
+
+    """
+    if parts is None:
+        parts = Manifest.load(path, asset, timestep).find(start, end)
+
+    def _chunk(part, array):
+        t, row_slice = _slice_part(part, start, end, timestep)
+
+        return t, get_array(array, row_slice, fields)
+
+    if n_jobs <= 1 or parts.size <= 1:
+        for part in parts:
+            day = int(part['day'])
+            yield _chunk(part, load_partition(path, asset, day, timestep))
+
+        return
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        queue = deque()
+        for part in parts:
+            queue.append((part, pool.submit(
+                load_partition, path, asset, int(part['day']), timestep
+            )))
+            if len(queue) < n_jobs:
+
+                continue
+
+            part, future = queue.popleft()
+            yield _chunk(part, future.result())
+
+        while queue:
+            part, future = queue.popleft()
+            yield _chunk(part, future.result())
+
+
+def read_range(path, asset, start, end, fields=FIELDS, n_jobs=4, out=None,
+               timestep=TIMESTEP):
+    """ Read the data of an asset between two timestamps.
+
+    Chunks of the partitions are stitched in one array on the minutely grid,
+    missing observations (and missing days) are `NaN`. If the range is in
+    only one partition and `out` is `None`, the result is a view of the
+    partition (see `get_array`).
+
+    Parameters
+    ----------
+    path : str
+        Path of the data base.
+    asset : str
+        Name of the asset.
+    start, end : int
+        Timestamps of the first and last observations of the range.
+    fields : str or list of str, optional
+        Fields to select, default is 'ohlcv'.
+    n_jobs : int, optional
+        Number of partitions decoded in parallel, default is `4`.
+    out : np.ndarray[dtype=np.float64, ndim=2], optional
+        Preallocated array to fill, must have at least as many rows as the
+        range.
+    timestep : int, optional
+        Number of seconds between two rows, default is `60` (i.e. minutely
+        data, otherwise data of a rollup tier).
+
+    Returns
+    -------
+    index : np.ndarray[dtype=np.int64, ndim=1]
+        Timestamps of the rows, from the first to the last available
+        observations of the range.
+    array : np.ndarray[dtype=np.float64, ndim=2]
+        Data of shape `(n_rows, n_fields)`.
+
+    Raises
+    ------
+    FileNotFoundError
+        If there is no data in the range.
+
+    """
+    parts = Manifest.load(path, asset, timestep).find(start, end)
+    if parts.size == 0:
+
+        raise FileNotFoundError('No data for {} between {} and {}'.format(
+            asset, start, end
+        ))
+
+    first, _ = _slice_part(parts[0], start, end, timestep)
+    last = min(end, int(parts[-1]['last']))
+    n = max((last - first) // timestep + 1, 0)
+    index = first + timestep * np.arange(n, dtype=np.int64)
+    chunks = iter_range(path, asset, start, end, fields, n_jobs, parts=parts,
+                        timestep=timestep)
+    if out is None and parts.size == 1:
+
+        return index, next(chunks)[1]
+
+    if out is None:
+        out = np.empty((n, len(fields)))
+
+    out = out[:n]
+    out.fill(np.nan)
+    for t, chunk in chunks:
+        k = (t - first) // timestep
+        out[k: k + chunk.shape[0]] = chunk
+
+    return index, out
+
+
+def read_panel(path, assets, start, end, fields=FIELDS, n_jobs=4, out=None,
+               timestep=TIMESTEP):
+    """ Read the data of several assets on a common minutely grid.
+
+    Parameters
+    ----------
+    path : str
+        Path of the data base.
+    assets : list of str
+        Name of the assets.
+    start, end : int
+        Timestamps of the first and last observations of the range.
+    fields : str or list of str, optional
+        Fields to select, default is 'ohlcv'.
+    n_jobs : int, optional
+        Number of partitions decoded in parallel, default is `4`.
+    out : np.ndarray[dtype=np.float64, ndim=3], optional
+        Preallocated array to fill, must have at least as many rows as the
+        range.
+    timestep : int, optional
+        Number of seconds between two rows, default is `60` (i.e. minutely
+        data, otherwise data of a rollup tier).
+
+    Returns
+    -------
+    index : np.ndarray[dtype=np.int64, ndim=1]
+        Timestamps of the rows, from the first to the last available
+        observations of the range (over all the assets).
+    array : np.ndarray[dtype=np.float64, ndim=3]
+        Data of shape `(n_rows, n_assets, n_fields)`, missing observations
+        are `NaN`.
+
+    Raises
+    ------
+    FileNotFoundError
+        If there is no data in the range.
+
+    """
+    parts = [
+        Manifest.load(path, asset, timestep).find(start, end)
+        for asset in assets
+    ]
+    bounds = [
+        (_slice_part(p[0], start, end, timestep)[0],
+         min(end, int(p[-1]['last'])))
+        for p in parts if p.size > 0
+    ]
+    if not bounds:
+
+        raise FileNotFoundError('No data for {} between {} and {}'.format(
+            assets, start, end
+        ))
+
+    first = min(b[0] for b in bounds)
+    last = max(b[1] for b in bounds)
+    n = max((last - first) // timestep + 1, 0)
+    if out is None:
+        out = np.empty((n, len(assets), len(fields)))
+
+    out = out[:n]
+    out.fill(np.nan)
+    for a, asset in enumerate(assets):
+        for t, chunk in iter_range(path, asset, start, end, fields, n_jobs,
+                                   parts=parts[a], timestep=timestep):
+            k = (t - first) // timestep
+            out[k: k + chunk.shape[0], a] = chunk
+
+    return first + timestep * np.arange(n, dtype=np.int64), out
+
+
+def resample(index, array, frequency, fields=FIELDS):
+    """ Aggregate OHLCV data into bars of a lower frequency.
+
+    Bars are aligned on multiples of `frequency` and labelled by their open
+    timestamp. Each field is reduced over the rows of a bar with
+    `ufunc.reduceat`: first open, max high, min low, last close and sum of
+    volume, missing observations (`NaN`) are ignored.
+
+    Parameters
+    ----------
+    index : np.ndarray[dtype=np.int64, ndim=1]
+        Sorted timestamps of the rows.
+    array : np.ndarray[dtype=np.float64]
+        Data of shape `(n_rows, ..., n_fields)`, e.g. a panel `(n_rows,
+        n_assets, n_fields)`.
+    frequency : int
+        Number of seconds of a bar.
+    fields : str or list of str, optional
+        Fields of the last axis of `array`, default is 'ohlcv'. Unknown
+        fields are reduced as the close price (last observation).
+
+    Returns
+    -------
+    index : np.ndarray[dtype=np.int64, ndim=1]
+        Timestamps of the bars.
+    array : np.ndarray[dtype=np.float64]
+        Data of shape `(n_bars, ..., n_fields)`.
+
+    Examples
+    --------
+    >>> index = np.arange(0, 600, 60)
+    >>> array = np.arange(20.).reshape([10, 2])
+    >>> resample(index, array, 300, 'hv')
+    (array([  0, 300]), array([[ 8., 25.],
+           [18., 75.]]))
+
+    """
+    labels = index // frequency * frequency
+    if labels.size == 0:
+
+        return labels, array[:0]
+
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    n = labels.size
+    rows = np.arange(n).reshape((n,) + (1,) * (array.ndim - 2))
+    out = np.empty((starts.size,) + array.shape[1:])
+    for k, f in enumerate(fields):
+        x = array[..., k]
+        valid = ~np.isnan(x)
+        if f == 'h':
+            out[..., k] = np.fmax.reduceat(x, starts, axis=0)
+
+        elif f == 'l':
+            out[..., k] = np.fmin.reduceat(x, starts, axis=0)
+
+        elif f == 'v':
+            count = np.add.reduceat(valid, starts, axis=0)
+            total = np.add.reduceat(np.where(valid, x, 0.), starts, axis=0)
+            out[..., k] = np.where(count > 0, total, np.nan)
+
+        else:
+            if f == 'o':
+                i = np.minimum.reduceat(np.where(valid, rows, n), starts,
+                                        axis=0)
+
+            else:
+                i = np.maximum.reduceat(np.where(valid, rows, -1), starts,
+                                        axis=0)
+
+            value = np.take_along_axis(x, np.clip(i, 0, n - 1), axis=0)
+            out[..., k] = np.where((i >= 0) & (i < n), value, np.nan)
+
+    return labels[starts], out
+
+
+def list_tiers(path, asset):
+    """ List the tiers persisted for an asset.
+
+    Parameters
+    ----------
+    path : str
+        Path of the data base.
+    asset : str
+        Name of the asset.
+
+    Returns
+    -------
+    list of int
+        Sorted timesteps in seconds of the available tiers (rollups and
+        sub-minute tiers).
+
+    """
+    try:
+        names = listdir(_set_path(path, asset))
+
+    except FileNotFoundError:
+
+        return []
+
+    return sorted(int(n[:-1]) for n in names if n[-1:] == 's'
+                  and n[:-1].isdigit() and isdir(_set_path(path, asset) + n))
+
+
+def update_rollups(path, asset, start, end, tiers=None):
+    """ Update the rollup tiers of an asset from its minutely data.
+
+    Only the bars overlapping the range are recomputed.
+
+    Parameters
+    ----------
+    path : str
+        Path of the data base.
+    asset : str
+        Name of the asset.
+    start, end : int
+        Timestamps of the first and last updated minutely observations.
+    tiers : list of int, optional
+        Timesteps in seconds of the tiers to update, default are the tiers
+        already persisted for the asset (see `list_tiers`).
+
+    """
+    if tiers is None:
+        tiers = [t for t in list_tiers(path, asset) if t > TIMESTEP]
+
+    for tier in tiers:
+        t0 = start // tier * tier
+        t1 = (end // tier + 1) * tier - TIMESTEP
+        try:
+            index, array = read_range(path, asset, t0, t1)
+
+        except FileNotFoundError:
+
+            continue
+
+        write_bars(*resample(index, array, tier), path, asset, tier)
+
+
+def write_bars(index, array, path, asset, timestep=TIMESTEP):
+    """ Write bars in the partitions of a tier and update its manifest.
+
+    Parameters
+    ----------
+    index : np.ndarray[dtype=np.int64, ndim=1]
+        Timestamps of the bars, multiples of `timestep`.
+    array : np.ndarray[dtype=np.float64, ndim=2]
+        OHLCV data of shape `(n_bars, 5)`.
+    path : str
+        Path of the data base.
+    asset : str
+        Name of the asset.
+    timestep : int, optional
+        Number of seconds of a bar, default is `60`.
+
+    """
+    manifest = Manifest.load(path, asset, timestep)
+    days = index // _span(timestep)
+    for day in np.unique(days):
+        try:
+            part = np.array(load_partition(path, asset, day, timestep))
+
+        except FileNotFoundError:
+            part = np.full((len(FIELDS), N_ROWS), np.nan)
+
+        rows = (index[days == day] - day * _span(timestep)) // timestep
+        part[:, rows] = array[days == day].T
+        offset = save_partition(part, path, asset, day, timestep)
+        manifest.update(day, part, offset=offset)
+
+    manifest.save()
+
+
+def build_rollups(asset, path='data_base/', tiers=ROLLUP_TIERS):
+    """ Build rollup tiers of an asset from all its minutely data.
+
+    Once built, tiers are maintained by `update_data`.
+
+    Parameters
+    ----------
+    asset : str
+        Name of the asset.
+    path : str, optional
+        Path of the data base.
+    tiers : list of int, optional
+        Timesteps in seconds of the tiers, default are 5 minutes, 15 minutes,
+        1 hour and 1 day.
+
+    """
+    manifest = Manifest.load(path, asset)
+    if len(manifest) == 0:
+
+        return
+
+    # 30 days of minutely data at each step, aligned on every tier
+    step = 30 * 86400
+    t = int(manifest.index['first'][0]) // step * step
+    while t <= manifest.index['last'][-1]:
+        update_rollups(path, asset, t, t + step - TIMESTEP, tiers=tiers)
+        t += step
+
+
+def convert_data_base(asset, path='data_base/'):
+    """ Convert legacy pickled dataframes of an asset to columnar partitions.
+
+    Parameters
+    ----------
+    asset : str
+        Name of the asset.
+    path : str, optional
+        Path of the data base.
+
+    Returns
+    -------
+    list of int
+        Days converted.
+
+    """
+    days = []
+    manifest = Manifest.load(path, asset)
+    for name in sorted(listdir(_set_path(path, asset))):
+        if not name.endswith(LEGACY_EXT):
+
+            continue
+
+        day = name_to_day(name)
+        with open(_set_path(path, asset) + name, 'rb') as f:
+            df = Unpickler(f).load()
+
+        array = set_partition(df, day)
+        manifest.update(day, array, save_partition(array, path, asset, day))
+        days += [day]
+
+    manifest.save()
+
+    return days
+
+
+if __name__ == '__main__':
+
+    import doctest
+
+    doctest.testmod()
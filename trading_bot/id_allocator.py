@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Allocator of order IDs with a crash-safe memory-mapped counter.
+
+The counter of order IDs is kept in memory, only the end of the block of IDs
+reserved is persisted in a small memory-mapped file. When the counter crosses
+the end of the block, a new block is reserved and the file is flushed to the
+disk before handing out the next ID.
+
+After a crash the counter resumes from the end of the reserved block, such
+that an ID is never handed out twice (some IDs of the block are skipped). A
+clean `close` persists the exact counter.
+
+"""
+
+# Built-in packages
+import mmap
+import os
+from pickle import Unpickler
+import struct
+
+# Third party packages
+
+# Local packages
+
+__all__ = ['OrderIdAllocator']
+
+_FMT = '<q'
+_SIZE = struct.calcsize(_FMT)
+
+
+class OrderIdAllocator:
+    """ Object to allocate unique order IDs of a strategy.
+
+    An order ID is the counter followed by the ID of the strategy, zero
+    padded with `n` digits, and is a signed 32-bit integer.
+
+    Methods
+    -------
+    __next__()
+        Return a new order ID.
+    reserve(end)
+        Persist the end of the block of reserved counters.
+    close()
+        Persist the current counter and close the file.
+
+    Attributes
+    ----------
+    path : str
+        Name of the memory-mapped file.
+    id_strat : int
+        ID of the strategy.
+    n : int
+        Number of digits of the ID of the strategy.
+    block : int
+        Number of counters reserved at once.
+    max_counter : int
+        Max value of the counter, it restarts at 0 after.
+    counter : int
+        Last counter handed out.
+    reserved : int
+        End of the block of reserved counters.
+    n_sync : int
+        Number of flushes to the disk.
+
+    """
+
+    def __init__(self, path, id_strat, n=3, block=100):
+        """ Initialize the allocator.
+
+        Parameters
+        ----------
+        path : str
+            Name of the memory-mapped file. If it doesn't exist, the counter
+            is migrated from a former pickled file `id_order.dat` in the same
+            folder, if any.
+        id_strat : int
+            ID of the strategy.
+        n : int, optional
+            $10^n$ is the maximum number of different ID strategies allowed,
+            default is 3.
+        block : int, optional
+            Number of counters reserved at once, default is 100.
+
+        """
+        self.path = path
+        self.id_strat = id_strat
+        self.n = n
+        self.block = block
+        self.max_counter = 2147483647 // 10 ** n
+        self._suffix = str(id_strat).zfill(n)
+        self.n_sync = 0
+
+        if not os.path.exists(path):
+            self._create(path)
+
+        self._fd = os.open(path, os.O_RDWR)
+        self._mm = mmap.mmap(self._fd, _SIZE)
+        # IDs until the end of the previous block may have been handed out
+        self.counter = struct.unpack_from(_FMT, self._mm)[0]
+        self.reserved = self.counter
+
+    def __repr__(self):
+        return 'OrderIdAllocator(id_strat={}, counter={}, reserved={})'.format(
+            self.id_strat, self.counter, self.reserved
+        )
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """ Return a new order ID.
+
+        Returns
+        -------
+        int (signed and 32-bit)
+            Number to identify an order and link it with a strategy.
+
+        """
+        counter = self.counter + 1
+        if counter > self.max_counter:
+            counter = 0
+
+        if counter > self.reserved or counter == 0:
+            self.reserve(min(counter + self.block, self.max_counter))
+
+        self.counter = counter
+
+        return int(str(counter) + self._suffix)
+
+    def _create(self, path):
+        # Migrate the counter of a former pickled file
+        counter = 0
+        old_path = os.path.join(os.path.dirname(path), 'id_order.dat')
+        if os.path.exists(old_path):
+            with open(old_path, 'rb') as f:
+                counter = Unpickler(f).load()
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(struct.pack(_FMT, counter))
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, path)
+        if os.path.exists(old_path):
+            os.remove(old_path)
+
+    def reserve(self, end):
+        """ Persist the end of the block of reserved counters.
+
+        Parameters
+        ----------
+        end : int
+            Last counter that can be handed out before the next flush.
+
+        """
+        struct.pack_into(_FMT, self._mm, 0, end)
+        self._mm.flush()
+        os.fsync(self._fd)
+        self.reserved = end
+        self.n_sync += 1
+
+    def close(self):
+        """ Persist the current counter and close the file. """
+        if self._mm.closed:
+
+            return
+
+        self.reserve(self.counter)
+        self._mm.close()
+        os.close(self._fd)
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Streaming indicators updated in constant time at each bar.
+
+Each indicator keeps the state needed to compute its next value from a new
+observation (`update`), instead of computing the whole series at each bar.
+Values are the last values of the corresponding functions of `fynance`
+(`ema`, `emstd`, `sma`, `smstd`, `roll_min`, `roll_max` and `iso_vol`), with
+the same recursions, such that an indicator updated with a series gives the
+same values as these functions on this series.
+
+The state of indicators is a dict of numbers and lists (`get_state`), they
+are saved in a JSON file with `save_indicators` and loaded back with
+`load_indicators`, e.g. by a `StrategyBot` between bars and restarts.
+
+"""
+
+# Built-in packages
+from collections import deque
+import json
+import os
+
+# Third party packages
+import numpy as np
+
+# Local packages
+
+__all__ = [
+    'EWMA', 'EWMStd', 'IsoVol', 'RollingMean', 'RollingStd', 'RollingMin',
+    'RollingMax', 'ZScore', 'save_indicators', 'load_indicators',
+]
+
+
+class _Indicator:
+    """ Base class of streaming indicators.
+
+    Methods
+    -------
+    update(x)
+        Update the indicator with a new observation and return its value.
+    extend(X)
+        Update the indicator with several observations.
+    get_state()
+        Return the parameters and the state of the indicator.
+    from_state(state)
+        Build an indicator from its state.
+
+    Attributes
+    ----------
+    n : int
+        Number of observations.
+    value : float
+        Last value of the indicator, NaN if there is no observation.
+
+    """
+
+    _params = ()
+
+    def __init__(self):
+        self.n = 0
+        self.value = np.nan
+
+    def __repr__(self):
+        params = ', '.join(
+            '{}={}'.format(k, getattr(self, k)) for k in self._params
+        )
+
+        return '{}({}, n={}, value={})'.format(
+            type(self).__name__, params, self.n, self.value
+        )
+
+    def update(self, x):
+        """ Update the indicator with a new observation.
+
+        Parameters
+        ----------
+        x : float
+            New observation.
+
+        Returns
+        -------
+        float
+            Value of the indicator.
+
+        """
+        self.value = float(self._update(float(x)))
+        self.n += 1
+
+        return self.value
+
+    def extend(self, X):
+        """ Update the indicator with several observations.
+
+        Parameters
+        ----------
+        X : array_like
+            Observations in chronological order.
+
+        Returns
+        -------
+        float
+            Last value of the indicator.
+
+        """
+        for x in np.asarray(X, dtype=np.float64).flatten():
+            self.update(x)
+
+        return self.value
+
+    def get_state(self):
+        """ Return the parameters and the state of the indicator.
+
+        Returns
+        -------
+        dict
+            Name of the indicator, parameters and state, made of numbers and
+            lists only.
+
+        """
+        params = {k: getattr(self, k) for k in self._params}
+        state = {
+            k: list(v) if isinstance(v, deque) else v
+            for k, v in self.__dict__.items() if k not in self._params
+        }
+
+        return {'name': type(self).__name__, 'params': params,
+                'state': state}
+
+    @classmethod
+    def from_state(cls, state):
+        """ Build an indicator from its state (see `get_state`).
+
+        Examples
+        --------
+        >>> ma = RollingMean(3)
+        >>> ma.extend([1., 2., 3.])
+        2.0
+        >>> ma2 = RollingMean.from_state(ma.get_state())
+        >>> ma.update(7.), ma2.update(7.)
+        (4.0, 4.0)
+
+        """
+        indicator = INDICATORS[state['name']](**state['params'])
+        for k, v in state['state'].items():
+            current = getattr(indicator, k, None)
+            if isinstance(current, deque):
+                v = deque(v, maxlen=current.maxlen)
+
+            setattr(indicator, k, v)
+
+        return indicator
+
+
+class EWMA(_Indicator):
+    """ Exponential weighted moving average (as `fynance.ema`).
+
+    Examples
+    --------
+    >>> EWMA(w=3).extend([60, 100, 80, 120, 160, 80])
+    105.0
+
+    """
+
+    _params = ('alpha',)
+
+    def __init__(self, alpha=0.94, w=None):
+        """ Initialize the indicator.
+
+        Parameters
+        ----------
+        alpha : float, optional
+            Weight of the previous average, default is 0.94.
+        w : int, optional
+            Size of the lagged window, if set `alpha = 1 - 2 / (1 + w)`.
+
+        """
+        super(EWMA, self).__init__()
+        if w is not None:
+            if w <= 0:
+
+                raise ValueError('Window must be positive: {}'.format(w))
+
+            alpha = 1 - 2 / (1 + w)
+
+        self.alpha = alpha
+
+    def _update(self, x):
+        if self.n == 0:
+
+            return x
+
+        return self.alpha * self.value + (1. - self.alpha) * x
+
+
+class EWMStd(_Indicator):
+    """ Exponential weighted moving standard deviation (as `fynance.emstd`).
+
+    Examples
+    --------
+    >>> round(EWMStd(w=3).extend([60, 100, 80, 120, 160, 80]), 6)
+    24.494897
+
+    """
+
+    _params = ('alpha',)
+
+    def __init__(self, alpha=0.94, w=None):
+        """ Initialize the indicator.
+
+        Parameters
+        ----------
+        alpha : float, optional
+            Weight of the previous moments, default is 0.94.
+        w : int, optional
+            Size of the lagged window, if set `alpha = 1 - 2 / (1 + w)`.
+
+        """
+        super(EWMStd, self).__init__()
+        self.alpha = EWMA(alpha, w).alpha
+        self.mean = np.nan
+
+    def _update(self, x):
+        a = self.alpha
+        if self.n == 0:
+            self.mean = x
+
+            return 0.
+
+        self.mean = a * self.mean + (1. - a) * x
+        m2 = (1. - a) * (x - self.mean) * (x - self.mean)
+
+        return np.sqrt(a * self.value * self.value + m2)
+
+
+class IsoVol(_Indicator):
+    """ Iso-volatility coefficient (as `fynance.iso_vol`).
+
+    The coefficient of a bar targets the volatility `target_vol` with the
+    exponential volatility of the returns until the previous bar, it is
+    bounded by `leverage`.
+
+    Examples
+    --------
+    >>> iv = IsoVol(target_vol=0.5, leverage=2, period=12, half_life=3)
+    >>> [round(iv.update(x), 6) for x in [95, 100, 85, 105, 110, 90]]
+    [1.0, 1.0, 2.0, 1.284077, 0.78279, 1.071865]
+
+    """
+
+    _params = ('target_vol', 'leverage', 'period', 'half_life')
+
+    def __init__(self, target_vol=0.2, leverage=1., period=252, half_life=11):
+        """ Initialize the indicator.
+
+        Parameters
+        ----------
+        target_vol : float, optional
+            Volatility to target, default is 0.2 (20 %).
+        leverage : float, optional
+            Max coefficient, default is 1.
+        period : int, optional
+            Number of periods per year, default is 252.
+        half_life : int, optional
+            Lagged window of the exponential average of the squared returns,
+            default is 11.
+
+        """
+        super(IsoVol, self).__init__()
+        self.target_vol = target_vol
+        self.leverage = leverage
+        self.period = period
+        self.half_life = half_life
+        self.alpha = EWMA(w=half_life).alpha
+        self.last = np.nan
+        self.n_ret = 0
+        self.ema = np.nan
+
+    def _update(self, x):
+        # Coefficient of this bar uses returns until the previous bar
+        iv = 1.
+        if self.n_ret > 0:
+            vol = np.sqrt(self.period * self.ema)
+            iv = min(self.target_vol / (vol if vol > 0. else 1e-8),
+                     self.leverage)
+
+        if self.n > 0:
+            ret2 = np.square(x / self.last - 1)
+            if self.n_ret == 0:
+                self.ema = ret2
+
+            else:
+                self.ema = self.alpha * self.ema + (1. - self.alpha) * ret2
+
+            self.n_ret += 1
+
+        self.last = x
+
+        return iv
+
+
+class RollingMean(_Indicator):
+    """ Rolling mean on a window of `w` observations (as `fynance.sma`).
+
+    Examples
+    --------
+    >>> RollingMean(3).extend([60, 100, 80, 120, 160, 80])
+    120.0
+
+    """
+
+    _params = ('w',)
+
+    def __init__(self, w):
+        """ Initialize the indicator.
+
+        Parameters
+        ----------
+        w : int
+            Size of the window, the mean is expanding while less than `w`
+            observations are available.
+
+        """
+        super(RollingMean, self).__init__()
+        self.w = w
+        self.S = 0.
+        self.window = deque(maxlen=w)
+
+    def _update(self, x):
+        if self.n < self.w:
+            self.S += x
+            self.window.append(x)
+
+            return self.S / (self.n + 1)
+
+        self.S += x - self.window[0]
+        self.window.append(x)
+
+        return self.S / self.w
+
+
+class RollingStd(_Indicator):
+    """ Rolling standard deviation on a window of `w` observations (as
+    `fynance.smstd`).
+
+    Examples
+    --------
+    >>> round(RollingStd(3).extend([60, 100, 80, 120, 160, 80]), 6)
+    32.659863
+
+    """
+
+    _params = ('w', 'ddof')
+
+    def __init__(self, w, ddof=0):
+        """ Initialize the indicator.
+
+        Parameters
+        ----------
+        w : int
+            Size of the window, the standard deviation is expanding while
+            less than `w` observations are available.
+        ddof : int, optional
+            Delta degrees of freedom, default is 0.
+
+        """
+        super(RollingStd, self).__init__()
+        self.w = w
+        self.ddof = ddof
+        self.S = 0.
+        self.S2 = 0.
+        self.window = deque(maxlen=w)
+
+    def _update(self, x):
+        sub_x = self.window[0] if self.n >= self.w else 0.
+        self.window.append(x)
+        n = min(self.n + 1, self.w)
+        self.S += x - sub_x
+        self.S2 += x * x - sub_x * sub_x
+        if self.n < self.ddof:
+
+            return 0.
+
+        return np.sqrt((self.S2 - (self.S / n) * self.S) / (n - self.ddof))
+
+
+class ZScore(RollingStd):
+    """ Rolling z-score of the observations on a window of `w` observations.
+
+    Examples
+    --------
+    >>> round(ZScore(3).extend([60, 100, 80, 120, 160, 80]), 6)
+    -1.224745
+
+    """
+
+    def _update(self, x):
+        sd = super(ZScore, self)._update(x)
+        mean = self.S / min(self.n + 1, self.w)
+
+        return (x - mean) / sd if sd > 0. else 0.
+
+
+class RollingMin(_Indicator):
+    """ Rolling minimum on a window of `w` observations (as
+    `fynance.roll_min`).
+
+    Examples
+    --------
+    >>> RollingMin(3).extend([60, 100, 80, 120, 160, 80])
+    80.0
+
+    """
+
+    _params = ('w',)
+    _sign = 1.
+
+    def __init__(self, w):
+        """ Initialize the indicator.
+
+        Parameters
+        ----------
+        w : int
+            Size of the window.
+
+        """
+        super(RollingMin, self).__init__()
+        self.w = w
+        # Monotonic queue of the (time, value) candidates
+        self.queue = deque()
+
+    def _update(self, x):
+        queue, sign = self.queue, self._sign
+        while queue and sign * queue[-1][1] >= sign * x:
+            queue.pop()
+
+        queue.append([self.n, x])
+        if queue[0][0] < self.n - self.w + 1:
+            queue.popleft()
+
+        return queue[0][1]
+
+
+class RollingMax(RollingMin):
+    """ Rolling maximum on a window of `w` observations (as
+    `fynance.roll_max`).
+
+    Examples
+    --------
+    >>> RollingMax(3).extend([60, 100, 80, 120, 160, 80])
+    160.0
+
+    """
+
+    _sign = -1.
+
+
+INDICATORS = {
+    cls.__name__: cls for cls in [EWMA, EWMStd, IsoVol, RollingMean,
+                                  RollingStd, ZScore, RollingMin, RollingMax]
+}
+
+
+def save_indicators(indicators, path, **info):
+    """ Save atomically the state of indicators in a JSON file.
+
+    Parameters
+    ----------
+    indicators : dict
+        Indicators by name.
+    path : str
+        Name of the file.
+    **info
+        Other values to save, e.g. the timestamp of the last bar.
+
+    """
+    data = {'info': info, 'indicators': {
+        k: v.get_state() for k, v in indicators.items()
+    }}
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+
+    os.replace(path + '.tmp', path)
+
+
+def load_indicators(path):
+    """ Load indicators saved with `save_indicators`.
+
+    Parameters
+    ----------
+    path : str
+        Name of the file.
+
+    Returns
+    -------
+    indicators : dict or None
+        Indicators by name, None if there is no file.
+    info : dict
+        Other values saved.
+
+    """
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+
+    except FileNotFoundError:
+
+        return None, {}
+
+    indicators = {
+        k: _Indicator.from_state(v) for k, v in data['indicators'].items()
+    }
+
+    return indicators, data['info']
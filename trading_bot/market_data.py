@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Market data shared by all strategy bots of a trading bot manager.
+
+The `MarketDataHub` runs in the `TradingBotManager` process. Strategy bots
+subscribe to a request of the exchange public API (e.g. OHLC of a pair at an
+interval) with the frequency of their bars, the hub requests each
+subscription once per bar of its subscribers and publishes the answer to all
+subscribed bots through their connection to the server. In the
+strategy bot, the `HubDataManager` waits for the published answer instead of
+requesting the exchange (`source_data: hub` in the configuration).
+
+"""
+
+# Built-in packages
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+import logging
+from math import gcd
+from threading import Condition, Event, Lock
+import time
+
+# Third party packages
+import numpy as np
+
+# Local packages
+from trading_bot.data_requests import DataExchangeManager, DataRequests
+
+__all__ = ['MarketDataHub', 'HubDataManager']
+
+
+def _key(args, kwargs):
+    return tuple(args), tuple(sorted(kwargs.items()))
+
+
+def _timestep(key):
+    # Kraken interval is in minutes, default is minutely
+    return int(dict(key[1]).get('interval', 1)) * 60
+
+
+def _bar(key, t, frequency=None):
+    # Timestamp of the current bar of a request, at the frequency of the
+    # strategy bots or at the interval of the request
+    step = frequency or _timestep(key)
+
+    return int(t // step * step)
+
+
+class MarketDataHub:
+    """ Request market data once per bar and fan out to strategy bots.
+
+    Methods
+    -------
+    subscribe
+    unsubscribe
+    poll
+    next_time
+    run
+
+    Attributes
+    ----------
+    conns : trading_bot._containers.ConnDict
+        Connections to the strategy bots.
+    subscriptions : dict
+        Frequency of the bars of the strategy bots subscribed to each
+        request, by ID.
+    last : dict
+        Timestamp of the bar and the last answer of each request.
+    delay : float
+        Seconds waited after the bar boundary before requesting.
+    n_requests, n_messages : int
+        Number of requests to the exchange and of messages published.
+
+    """
+
+    def __init__(self, conns, path="https://api.kraken.com/0/public",
+                 delay=1., n_jobs=4):
+        """ Initialize the market data hub.
+
+        Parameters
+        ----------
+        conns : trading_bot._containers.ConnDict
+            Connections to the strategy bots.
+        path : str, optional
+            Url of the exchange public API, default is Kraken.
+        delay : float, optional
+            Seconds waited after the bar boundary before requesting, such
+            that the exchange has closed the bar. Default is 1.
+        n_jobs : int, optional
+            Number of concurrent requests, default is 4.
+
+        """
+        self.logger = logging.getLogger(__name__)
+        self.conns = conns
+        self.req = DataRequests(path)
+        self.delay = delay
+        self.n_jobs = n_jobs
+        self.subscriptions = {}
+        self.last = {}
+        self.n_requests = 0
+        self.n_messages = 0
+        self._lock = Lock()
+        self._event = Event()
+
+    def __repr__(self):
+        return 'MarketDataHub({} subscriptions, {} bots)'.format(
+            len(self.subscriptions),
+            len(set().union(*self.subscriptions.values())),
+        )
+
+    def subscribe(self, _id, args=(), kwargs={}, frequency=None):
+        """ Subscribe a strategy bot to a request.
+
+        The last answer of the request is published immediately if it is
+        available for the current bar. A request is due at each bar of its
+        subscribers, i.e. every greatest common divisor of their frequencies.
+
+        Parameters
+        ----------
+        _id : int
+            ID of the strategy bot.
+        args, kwargs : tuple and dict, optional
+            Parameters of the request (cf `DataRequests.get_data`), e.g.
+            `('OHLC',)` and `{'pair': 'XXBTZUSD', 'interval': 1}`.
+        frequency : int, optional
+            Number of seconds between two bars of the strategy bot, default
+            is the interval of the request.
+
+        """
+        key = _key(args, kwargs)
+        with self._lock:
+            self.subscriptions.setdefault(key, {})[_id] = frequency
+            last = self.last.get(key)
+            ts = _bar(key, time.time(), self._frequency(key))
+
+        self.logger.info('SB ID {} subscribed to {}'.format(_id, key))
+        if last is not None and last[0] == ts:
+            self._send(_id, key, *last)
+
+        # Wake up the hub to request the new subscription
+        self._event.set()
+
+    def unsubscribe(self, _id):
+        """ Unsubscribe a strategy bot from all requests.
+
+        Parameters
+        ----------
+        _id : int
+            ID of the strategy bot.
+
+        """
+        with self._lock:
+            for key in list(self.subscriptions):
+                self.subscriptions[key].pop(_id, None)
+                if not self.subscriptions[key]:
+                    self.subscriptions.pop(key)
+                    self.last.pop(key, None)
+
+    def _frequency(self, key):
+        # Bars of a request are the bars of all its subscribers
+        frequencies = [f for f in self.subscriptions.get(key, {}).values()
+                       if f]
+        if not frequencies:
+
+            return _timestep(key)
+
+        return reduce(gcd, [int(f) for f in frequencies])
+
+    def _send(self, _id, key, ts, result):
+        conn = self.conns.get(_id)
+        if conn is None or conn.state != 'up':
+
+            return
+
+        conn.send(('market_data', (key, ts, result)),)
+        self.n_messages += 1
+
+    def _request(self, key):
+        data = self.req.get_data(*key[0], **dict(key[1]))
+        with self._lock:
+            self.n_requests += 1
+
+        if data['error']:
+
+            raise ValueError('{}: {}'.format(key, data['error']))
+
+        return data['result']
+
+    def _due(self, t):
+        # Requests with a bar not yet requested and closed since `delay`
+        with self._lock:
+            bars = {k: _bar(k, t, self._frequency(k))
+                    for k in self.subscriptions}
+
+            return [k for k, ts in bars.items()
+                    if self.last.get(k, (-1,))[0] < ts
+                    and t - ts >= self.delay]
+
+    def poll(self, t=None):
+        """ Request the due subscriptions and publish the answers.
+
+        Parameters
+        ----------
+        t : float, optional
+            Current timestamp, default is now.
+
+        Returns
+        -------
+        list
+            Requests done.
+
+        """
+        t = time.time() if t is None else t
+        keys = self._due(t)
+        if not keys:
+
+            return keys
+
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as pool:
+            futures = {k: pool.submit(self._request, k) for k in keys}
+
+        done = []
+        for key, future in futures.items():
+            try:
+                result = future.result()
+
+            except Exception as e:
+                self.logger.error('Request {} failed: {}'.format(key, e))
+
+                continue
+
+            with self._lock:
+                ts = _bar(key, t, self._frequency(key))
+                self.last[key] = (ts, result)
+                ids = list(self.subscriptions.get(key, ()))
+
+            for _id in ids:
+                self._send(_id, key, ts, result)
+
+            done.append(key)
+
+        return done
+
+    def next_time(self):
+        """ Return the time of the next request.
+
+        Returns
+        -------
+        float
+            Timestamp of the next bar boundary plus delay, infinity if there
+            is no subscription.
+
+        """
+        with self._lock:
+            steps = {self._frequency(k) for k in self.subscriptions}
+
+        t = time.time()
+
+        return min([t // s * s + s + self.delay for s in steps] or [np.inf])
+
+    def run(self, is_stop):
+        """ Loop until the trading bot manager is stopped.
+
+        Parameters
+        ----------
+        is_stop : callable
+            Function returning True when the loop must stop.
+
+        """
+        self.logger.debug('start')
+        while not is_stop():
+            self.poll()
+            # Sleep until the next bar, woken up by new subscriptions and
+            # checking the stop state every second
+            wait = min(self.next_time() - time.time(), 1.)
+            self._event.wait(max(wait, 0.))
+            self._event.clear()
+
+        self.logger.debug('stop | {} requests, {} messages'.format(
+            self.n_requests, self.n_messages
+        ))
+
+
+class HubDataManager(DataExchangeManager):
+    """ Object to get data published by the market data hub.
+
+    Data are cleaned as with `DataExchangeManager`, but the raw answer is
+    waited from the hub. The exchange is requested directly if the hub
+    doesn't publish the current bar before `timeout` seconds.
+
+    With several `assets`, the request is subscribed for each asset and the
+    managers of the assets wait the answers published to this manager.
+
+    If `websocket` is True, the request of the exchange reads the WebSocket
+    feed first (see `DataExchangeManager`). `incremental` is accepted for the
+    same configuration as `DataExchangeManager` but is ignored, the hub
+    publishes whole answers.
+
+    """
+
+    def __init__(self, assets, path="https://api.kraken.com/0/public",
+                 frequency=None, n_min_obs=1, ohlcv='ohlcv', websocket=False,
+                 incremental=False, timeout=30.):
+        # Set before the managers of the assets, they share the answers
+        self.timeout = timeout
+        self.data = {}
+        self._cond = Condition()
+        super(HubDataManager, self).__init__(
+            assets, path=path, frequency=frequency, n_min_obs=n_min_obs,
+            ohlcv=ohlcv, websocket=websocket,
+        )
+
+    def _new_manager(self, asset, path=None, frequency=None, n_min_obs=1,
+                     ohlcv='ohlcv', websocket=False, **kwargs):
+        manager = HubDataManager([asset], path=path, frequency=frequency,
+                                 n_min_obs=n_min_obs, ohlcv=ohlcv,
+                                 websocket=websocket, timeout=self.timeout)
+        manager.data, manager._cond = self.data, self._cond
+
+        return manager
+
+    def subscribe(self, conn, *args, **kwargs):
+        """ Subscribe to a request of the hub.
+
+        Parameters
+        ----------
+        conn : trading_bot._connection.ConnTradingBotManager
+            Connection to the trading bot manager.
+        args, kwargs : tuple and dict
+            Parameters of the request (cf `DataRequests.get_data`).
+
+        """
+        if self.managers and args[:1] == ('OHLC',):
+            for asset in self.managers:
+                conn.send(('subscribe', {
+                    'args': args, 'kwargs': {**kwargs, 'pair': asset},
+                    'frequency': self.frequency,
+                }),)
+
+        else:
+            conn.send(('subscribe', {'args': args, 'kwargs': kwargs,
+                                     'frequency': self.frequency}),)
+
+    def put(self, msg):
+        """ Store an answer published by the hub.
+
+        Parameters
+        ----------
+        msg : tuple
+            Key of the request, timestamp of the bar and answer.
+
+        """
+        key, ts, result = msg
+        with self._cond:
+            self.data[key] = (ts, result)
+            self._cond.notify_all()
+
+    def _get_data(self, *args, **kwargs):
+        key = _key(args, kwargs)
+        ts = _bar(key, time.time(), self.frequency)
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self.data.get(key, (-1,))[0] >= ts,
+                timeout=self.timeout,
+            )
+            if ready:
+
+                return self.data[key][1]
+
+        self.logger.error('No data from hub for {}, request exchange'.format(
+            key
+        ))
+
+        return super(HubDataManager, self)._get_data(*args, **kwargs)
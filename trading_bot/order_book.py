@@ -0,0 +1,687 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" L2 order books shared in memory between processes.
+
+`L2Book` keeps the top price levels of a pair sorted in arrays, it applies
+the snapshots and updates of the Kraken book channel (or snapshots of the
+Depth endpoint of the REST API) and validates them with the CRC32 checksum
+sent by Kraken.
+
+`BookFeed` is a `KrakenFeed` subscribed to the book channel, it publishes the
+levels of each pair in a `SharedBook`, a block of shared memory named after
+the pair. The orders manager (or any process of the host) reads the best
+quotes with `get_best_bid` and `get_best_ask` without network call, they fall
+back to the Ticker endpoint when the book is not published, invalid or stale.
+
+A `SharedBook` is written by a single process with a sequence lock: the
+sequence is odd while the levels are written, a reader copies the levels and
+retries if the sequence changed meanwhile.
+
+"""
+
+# Built-in packages
+from bisect import bisect_left
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import json
+import logging
+from threading import Thread
+import time
+import zlib
+
+# Third party packages
+import numpy as np
+
+# Local packages
+from trading_bot.data_requests import DataRequests, get_ask, get_bid
+from trading_bot.websocket_feed import WS_URL, KrakenFeed, ws_name
+
+__all__ = [
+    'L2Book', 'SharedBook', 'BookFeed', 'book_checksum', 'get_best_bid',
+    'get_best_ask',
+]
+
+KRAKEN = "https://api.kraken.com/0/public"
+# Header of a shared book: sequence, depth, time, valid, number of bids and
+# number of asks, followed by the bids then the asks (price and volume)
+_HEADER = 6
+# Names of the blocks created by this process (or its parent if forked)
+_created = set()
+
+
+def _checksum_str(x):
+    return x.replace('.', '').lstrip('0')
+
+
+def book_checksum(asks, bids):
+    """ Compute the checksum of the top 10 levels of a book as Kraken.
+
+    Parameters
+    ----------
+    asks, bids : list of tuple of str
+        Price and volume, as sent by Kraken, of the asks sorted by increasing
+        price and of the bids sorted by decreasing price.
+
+    Returns
+    -------
+    int
+        CRC32 of the concatenated prices and volumes (without decimal point
+        and leading zeros) of the 10 best asks then the 10 best bids.
+
+    Examples
+    --------
+    >>> book_checksum([('0.05005', '0.00000500')], [('0.05000', '0.00000800')])
+    3981036208
+
+    """
+    txt = ''.join(
+        _checksum_str(p) + _checksum_str(v)
+        for p, v in list(asks[:10]) + list(bids[:10])
+    )
+
+    return zlib.crc32(txt.encode())
+
+
+class L2Book:
+    """ Top price levels of the book of a pair.
+
+    Levels are kept sorted from the best price with their original strings,
+    which are needed to compute the checksum.
+
+    Methods
+    -------
+    snapshot(asks, bids)
+        Replace all the levels.
+    update(asks=(), bids=())
+        Update some levels.
+    checksum()
+        Return the checksum of the book.
+    best()
+        Return the best bid and the best ask.
+    arrays()
+        Return the levels as arrays.
+
+    Attributes
+    ----------
+    depth : int
+        Number of levels kept on each side.
+    time : float
+        Time of the last update of the book.
+
+    """
+
+    def __init__(self, depth=10):
+        """ Initialize an empty book.
+
+        Parameters
+        ----------
+        depth : int, optional
+            Number of levels kept on each side, default is 10.
+
+        """
+        self.depth = depth
+        self.time = 0.
+        # Sorted keys (price of asks, opposite price of bids) and levels
+        self._keys = {'a': [], 'b': []}
+        self._levels = {'a': [], 'b': []}
+
+    def __repr__(self):
+        return 'L2Book({} bids, {} asks)'.format(
+            len(self._keys['b']), len(self._keys['a'])
+        )
+
+    def snapshot(self, asks, bids):
+        """ Replace all the levels.
+
+        Parameters
+        ----------
+        asks, bids : list of list
+            Levels `[price, volume, ...]`, prices and volumes are strings.
+
+        """
+        for side in 'ab':
+            self._keys[side], self._levels[side] = [], []
+
+        self.update(asks, bids)
+
+    def update(self, asks=(), bids=()):
+        """ Update some levels, a level with a null volume is removed.
+
+        Parameters
+        ----------
+        asks, bids : list of list
+            Levels `[price, volume, time, ...]`, prices and volumes are
+            strings.
+
+        """
+        for side, levels in (('a', asks), ('b', bids)):
+            keys, values = self._keys[side], self._levels[side]
+            for level in levels:
+                price, volume = level[0], level[1]
+                key = float(price) if side == 'a' else -float(price)
+                i = bisect_left(keys, key)
+                found = i < len(keys) and keys[i] == key
+                if float(volume) == 0.:
+                    if found:
+                        del keys[i], values[i]
+
+                elif found:
+                    values[i] = (price, volume)
+
+                else:
+                    keys.insert(i, key)
+                    values.insert(i, (price, volume))
+
+                if len(level) > 2:
+                    self.time = max(self.time, float(level[2]))
+
+            # Levels out of the subscribed depth are not updated by Kraken
+            del keys[self.depth:], values[self.depth:]
+
+    def checksum(self):
+        """ Return the checksum of the book (see `book_checksum`). """
+        return book_checksum(self._levels['a'], self._levels['b'])
+
+    def best(self):
+        """ Return the best bid and the best ask.
+
+        Returns
+        -------
+        tuple of float
+            Best bid and best ask prices, NaN if a side is empty.
+
+        Examples
+        --------
+        >>> book = L2Book(depth=2)
+        >>> book.snapshot([['2.1', '1'], ['2.0', '3']], [['1.9', '2']])
+        >>> book.update(bids=[['1.95', '1', '1600000000.1']])
+        >>> book.best()
+        (1.95, 2.0)
+
+        """
+        bids, asks = self._keys['b'], self._keys['a']
+
+        return (-bids[0] if bids else np.nan, asks[0] if asks else np.nan)
+
+    def arrays(self):
+        """ Return the levels as arrays.
+
+        Returns
+        -------
+        bids, asks : np.ndarray[dtype=np.float64, ndim=2]
+            Price and volume of the levels sorted from the best price.
+
+        """
+        return tuple(
+            np.array(self._levels[side], dtype=np.float64).reshape([-1, 2])
+            for side in 'ba'
+        )
+
+
+class SharedBook:
+    """ Levels of the book of a pair in shared memory.
+
+    The block is created by the single process publishing the book, and is
+    attached by name by the readers.
+
+    Methods
+    -------
+    write(bids, asks, t=None, valid=True)
+        Publish the levels of the book.
+    invalidate()
+        Mark the book as invalid until the next write.
+    touch(t=None)
+        Update the time of a valid book.
+    read()
+        Return a consistent copy of the levels.
+    best(max_age=None)
+        Return the best quotes if the book is valid and recent.
+    close()
+        Detach the block, and remove it if this object created it.
+
+    Attributes
+    ----------
+    pair : str
+        Name of the pair.
+    depth : int
+        Number of levels of each side.
+    name : str
+        Name of the block of shared memory.
+
+    """
+
+    def __init__(self, pair, depth=10, create=False):
+        """ Create or attach the shared book of a pair.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair (see `trading_bot.websocket_feed.ws_name`).
+        depth : int, optional
+            Number of levels of each side, default is 10. Ignored if the book
+            is attached.
+        create : bool, optional
+            If True create the block (or reset a block left by a previous
+            process), otherwise attach an existing block. Default is False.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the book is attached and doesn't exist.
+
+        """
+        self.pair = pair
+        self.name = self.shm_name(pair)
+        self.create = create
+        if create:
+            size = (_HEADER + 4 * depth) * 8
+            try:
+                self.shm = SharedMemory(self.name, create=True, size=size)
+
+            except FileExistsError:
+                SharedMemory(self.name).unlink()
+                self.shm = SharedMemory(self.name, create=True, size=size)
+
+            _created.add(self.name)
+            self._buf = np.ndarray(_HEADER + 4 * depth, dtype=np.float64,
+                                   buffer=self.shm.buf)
+            self._buf[:] = 0.
+            self._buf[1] = depth
+
+        else:
+            self.shm = SharedMemory(self.name)
+            if self.name not in _created:
+                # The block belongs to the publisher, not removed at exit of
+                # a reader (the tracker is shared with the processes forked
+                # by the publisher)
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+
+            header = np.ndarray(2, dtype=np.float64, buffer=self.shm.buf)
+            depth = int(header[1])
+            self._buf = np.ndarray(_HEADER + 4 * depth, dtype=np.float64,
+                                   buffer=self.shm.buf)
+
+        self.depth = depth
+
+    def __repr__(self):
+        return 'SharedBook({}, depth={})'.format(self.pair, self.depth)
+
+    @staticmethod
+    def shm_name(pair):
+        """ Return the name of the block of shared memory of a pair.
+
+        Examples
+        --------
+        >>> SharedBook.shm_name('XXBTZUSD'), SharedBook.shm_name('XBT/USD')
+        ('trading_bot_book_XBT_USD', 'trading_bot_book_XBT_USD')
+
+        """
+        return 'trading_bot_book_' + ws_name(pair).replace('/', '_')
+
+    def write(self, bids, asks, t=None, valid=True):
+        """ Publish the levels of the book.
+
+        Parameters
+        ----------
+        bids, asks : np.ndarray[dtype=np.float64, ndim=2]
+            Price and volume of the levels sorted from the best price, only
+            the first `depth` levels are written.
+        t : float, optional
+            Time of the book, default is now.
+        valid : bool, optional
+            If False readers ignore the book, default is True.
+
+        """
+        bids, asks = bids[:self.depth], asks[:self.depth]
+        d = self.depth
+        buf = self._buf
+        buf[0] += 1
+        buf[2] = time.time() if t is None else t
+        buf[3] = float(valid)
+        buf[4], buf[5] = bids.shape[0], asks.shape[0]
+        buf[_HEADER: _HEADER + 2 * bids.shape[0]] = bids.flatten()
+        buf[_HEADER + 2 * d: _HEADER + 2 * (d + asks.shape[0])] = (
+            asks.flatten()
+        )
+        buf[0] += 1
+
+    def invalidate(self):
+        """ Mark the book as invalid until the next write. """
+        self._buf[0] += 1
+        self._buf[3] = 0.
+        self._buf[0] += 1
+
+    def touch(self, t=None):
+        """ Update the time of a valid book, e.g. at each heartbeat. """
+        self._buf[0] += 1
+        self._buf[2] = time.time() if t is None else t
+        self._buf[0] += 1
+
+    def read(self):
+        """ Return a consistent copy of the levels.
+
+        Returns
+        -------
+        t : float
+            Time of the book.
+        valid : bool
+            True if the book is valid.
+        bids, asks : np.ndarray[dtype=np.float64, ndim=2]
+            Price and volume of the levels sorted from the best price.
+
+        """
+        buf, d = self._buf, self.depth
+        for _ in range(10000):
+            seq = buf[0]
+            data = buf.copy()
+            if seq % 2 == 0 and buf[0] == seq:
+
+                break
+
+        else:
+            # The publisher stopped while writing
+            data = np.zeros(_HEADER)
+
+        n_bids, n_asks = int(data[4]), int(data[5])
+        bids = data[_HEADER: _HEADER + 2 * n_bids].reshape([-1, 2])
+        asks = data[_HEADER + 2 * d: _HEADER + 2 * (d + n_asks)]
+
+        return data[2], bool(data[3]), bids, asks.reshape([-1, 2])
+
+    def best(self, max_age=None):
+        """ Return the best quotes if the book is valid and recent.
+
+        Parameters
+        ----------
+        max_age : float, optional
+            Max seconds since the last update of the book, default is no
+            limit.
+
+        Returns
+        -------
+        tuple of float or None
+            Best bid and best ask (NaN if a side is empty), None if the book
+            is invalid or too old.
+
+        """
+        t, valid, bids, asks = self.read()
+        if not valid or (max_age is not None and time.time() - t > max_age):
+
+            return None
+
+        return (bids[0, 0] if bids.size else np.nan,
+                asks[0, 0] if asks.size else np.nan)
+
+    def close(self):
+        """ Detach the block, and remove it if this object created it. """
+        if self.create:
+            self.invalidate()
+
+        self._buf = None
+        self.shm.close()
+        if self.create:
+            self.shm.unlink()
+
+
+class BookFeed(KrakenFeed):
+    """ Feed of the Kraken book channel published in shared books.
+
+    Each update is validated with its checksum, on a mismatch the book is
+    invalidated and the pair is subscribed again to receive a new snapshot.
+    Books are invalidated when the connection is lost. If `websocket` is
+    False, the books are snapshots of the Depth endpoint of the REST API
+    requested every `delay` seconds.
+
+    Methods
+    -------
+    start
+    stop
+    snapshot(pair)
+        Request a snapshot of the Depth endpoint and publish it.
+
+    Attributes
+    ----------
+    books : dict of L2Book
+        Book of each pair.
+    shared : dict of SharedBook
+        Shared book of each pair.
+    n_checksum_errors : int
+        Number of updates rejected by their checksum.
+
+    """
+
+    def __init__(self, pairs, depth=10, websocket=True, delay=1.,
+                 path=KRAKEN, url=WS_URL, timeout=10., max_wait=60.):
+        """ Initialize the feed and create the shared books.
+
+        Parameters
+        ----------
+        pairs : str or list of str
+            Names of the pairs (see `trading_bot.websocket_feed.ws_name`).
+        depth : {10, 25, 100, 500, 1000}, optional
+            Number of levels of each side, default is 10.
+        websocket : bool, optional
+            If True (default) the books are fed by the book channel,
+            otherwise by snapshots of the Depth endpoint.
+        delay : float, optional
+            Seconds between two snapshots of the Depth endpoint, default is
+            1.
+        path : str, optional
+            Url of the public REST API, default is Kraken.
+        url : str, optional
+            Url of the WebSocket API, default is Kraken.
+        timeout, max_wait : float, optional
+            Cf `KrakenFeed` constructor.
+
+        """
+        pairs = [pairs] if isinstance(pairs, str) else list(pairs)
+        super(BookFeed, self).__init__(
+            channels=(), url=url, timeout=timeout, max_wait=max_wait
+        )
+        self.depth = depth
+        self.websocket = websocket
+        self.delay = delay
+        self.req = DataRequests(path)
+        self.n_checksum_errors = 0
+        self._pairs = {ws_name(p): p for p in pairs}
+        self.books = {p: L2Book(depth) for p in self._pairs}
+        self.shared = {
+            p: SharedBook(p, depth=depth, create=True) for p in self._pairs
+        }
+        if websocket:
+            self.subscribe(pairs, 'book', depth=depth)
+
+    def __repr__(self):
+        return 'BookFeed({} pairs, depth={})'.format(
+            len(self.books), self.depth
+        )
+
+    def start(self):
+        """ Start the feed in a thread. """
+        if self.websocket:
+
+            return super(BookFeed, self).start()
+
+        self._stop.clear()
+        self._thread = Thread(target=self._poll, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        """ Stop the feed and remove the shared books. """
+        super(BookFeed, self).stop()
+        for shared in self.shared.values():
+            shared.close()
+
+    def snapshot(self, pair):
+        """ Request a snapshot of the Depth endpoint and publish it.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair.
+
+        """
+        data = self.req.get_data('Depth', pair=self._pairs[ws_name(pair)],
+                                 count=self.depth)
+        if data['error']:
+            self.logger.error('Depth {}: {}'.format(pair, data['error']))
+
+            return
+
+        result = next(iter(data['result'].values()))
+        with self._lock:
+            book = self.books[ws_name(pair)]
+            book.snapshot(result['asks'], result['bids'])
+            self._publish(ws_name(pair), time.time())
+
+    def _poll(self):
+        self._ready.set()
+        while not self._stop.is_set():
+            for pair in self.books:
+                try:
+                    self.snapshot(pair)
+
+                except Exception as e:
+                    self.logger.error('Depth {}: {}'.format(pair, e))
+                    self.shared[pair].invalidate()
+
+            self._stop.wait(self.delay)
+
+        self._ready.clear()
+
+    def _connect(self):
+        # A new snapshot is sent after each subscription
+        with self._lock:
+            for shared in self.shared.values():
+                shared.invalidate()
+
+        return super(BookFeed, self)._connect()
+
+    def _handle(self, msg, t):
+        if isinstance(msg, dict):
+            if msg.get('event') == 'heartbeat':
+                with self._lock:
+                    for shared in self.shared.values():
+                        shared.touch(t)
+
+        if isinstance(msg, dict) or not msg[-2].startswith('book'):
+
+            return super(BookFeed, self)._handle(msg, t)
+
+        self.n_messages += 1
+        pair = msg[-1]
+        data = {k: v for d in msg[1:-2] for k, v in d.items()}
+        with self._lock:
+            book = self.books.get(pair)
+            if book is None:
+
+                return
+
+            if 'as' in data or 'bs' in data:
+                book.snapshot(data.get('as', []), data.get('bs', []))
+
+            else:
+                book.update(data.get('a', []), data.get('b', []))
+
+            if 'c' in data and int(data['c']) != book.checksum():
+                self.n_checksum_errors += 1
+                self.logger.error('checksum mismatch {}'.format(pair))
+                self.shared[pair].invalidate()
+                self._resubscribe(pair)
+
+                return
+
+            self._publish(pair, t)
+
+    def _publish(self, pair, t):
+        bids, asks = self.books[pair].arrays()
+        self.shared[pair].write(bids, asks, t=t)
+
+    def _resubscribe(self, pair):
+        ws = self._ws
+        if ws is None:
+
+            return
+
+        sub = {'name': 'book', 'depth': self.depth}
+        for event in ('unsubscribe', 'subscribe'):
+            ws.send(json.dumps(
+                {'event': event, 'pair': [pair], 'subscription': sub}
+            ))
+
+
+_books = {}
+
+
+def _best(pair, max_age):
+    name = SharedBook.shm_name(pair)
+    book = _books.get(name)
+    if book is None:
+        try:
+            book = _books[name] = SharedBook(pair)
+
+        except FileNotFoundError:
+
+            return None
+
+    quotes = book.best(max_age)
+    if quotes is None:
+        # Attached again at the next call, the publisher may have restarted
+        _books.pop(name).close()
+
+    return quotes
+
+
+def get_best_bid(pair, path=KRAKEN, max_age=10.):
+    """ Get the best bid price of `pair`, from its shared book if published.
+
+    Parameters
+    ----------
+    pair : str
+        Code of the pair.
+    path : str, optional
+        Path of the exchange requested if the shared book is not available.
+    max_age : float, optional
+        Max seconds since the last update of the shared book, default is 10.
+
+    Returns
+    -------
+    float
+        Best bid price.
+
+    """
+    quotes = _best(pair, max_age)
+    if quotes is None or np.isnan(quotes[0]):
+
+        return get_bid(pair, path)
+
+    return float(quotes[0])
+
+
+def get_best_ask(pair, path=KRAKEN, max_age=10.):
+    """ Get the best ask price of `pair`, from its shared book if published.
+
+    Parameters
+    ----------
+    pair : str
+        Code of the pair.
+    path : str, optional
+        Path of the exchange requested if the shared book is not available.
+    max_age : float, optional
+        Max seconds since the last update of the shared book, default is 10.
+
+    Returns
+    -------
+    float
+        Best ask price.
+
+    """
+    quotes = _best(pair, max_age)
+    if quotes is None or np.isnan(quotes[1]):
+
+        return get_ask(pair, path)
+
+    return float(quotes[1])
@@ -22,7 +22,8 @@ from pickle import Pickler, Unpickler
 
 # Local packages
 from trading_bot._exceptions import OrderError, OrderStatusError
-from trading_bot.data_requests import get_ask, get_bid, get_close
+from trading_bot.data_requests import get_close
+from trading_bot.order_book import get_best_ask, get_best_bid
 
 __all__ = ['OrderSL', 'OrderBestLimit']
 
@@ -568,8 +569,8 @@ class OrderBestLimit(_BasisOrder):
     """
 
     _handler_best = {
-        'buy': get_bid,
-        'sell': get_ask,
+        'buy': get_best_bid,
+        'sell': get_best_ask,
     }
 
     def __init__(self, id, input={}, tol=0.001, time_force=None, info={},
@@ -605,7 +606,9 @@ class OrderBestLimit(_BasisOrder):
 
         The new order fill the non-executed volume and it add at the specified
         price, if price is None the order will be at the market price or if the
-        is "best" then the order will be add at the best ask/bid price.
+        is "best" then the order will be add at the best ask/bid price. The
+        best price is read in the shared order book of the pair if it is
+        published (see `trading_bot.order_book`), otherwise it is requested.
 
         If orders are already executed, then set status to 'closed' and get
         execution restuls.
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Speculative prefetch of the data of the next bar.
+
+A strategy bot requests its data once the bar is closed, such that the round
+trip to the data source is on the critical path of the signal. The
+`Prefetcher` requests the data manager in a background thread `lead` seconds
+before the bar boundary: connections of the pooled session are warmed up and
+the candles until the previous bar are kept by the data manager. At the
+boundary, only the final bar is requested.
+
+The data manager must have an incremental path, i.e. keep the candles of its
+last answer and request only the new ones (the `incremental` exchange
+manager, see `trading_bot.data_requests.DataExchangeManager`), otherwise the
+prefetch would only double the requests.
+
+The durations of the prefetch and of the request at the boundary are
+measured at each iteration.
+
+"""
+
+# Built-in packages
+from collections import deque
+import logging
+from threading import Event, Lock, Thread
+import time
+
+# Third party packages
+import numpy as np
+
+# Local packages
+
+__all__ = ['Prefetcher']
+
+
+class Prefetcher:
+    """ Object to request the data of a data manager ahead of a bar boundary.
+
+    Methods
+    -------
+    schedule(t)
+        Prefetch the data `lead` seconds before the time `t`.
+    get_data()
+        Request the data at the boundary, once the prefetch is done.
+    metrics()
+        Return the statistics of the latencies.
+    stop()
+        Cancel the scheduled prefetch.
+
+    Attributes
+    ----------
+    DM : object
+        Data manager with an incremental path.
+    args, kwargs : tuple and dict
+        Arguments passed to `DM.get_data`.
+    lead : float
+        Number of seconds between the prefetch and the boundary.
+    data : object
+        Output of the last prefetch, None if not prefetched.
+    latencies : collections.deque
+        Duration of the prefetch and of the request at the boundary, in
+        seconds, of the last iterations.
+
+    """
+
+    def __init__(self, DM, args=(), kwargs={}, lead=2., n_latencies=1000):
+        """ Initialize the prefetcher.
+
+        Parameters
+        ----------
+        DM : object
+            Data manager with a `get_data` method and an `incremental`
+            attribute set to True.
+        args : tuple, optional
+            Arguments passed to `DM.get_data`.
+        kwargs : dict, optional
+            Keyword arguments passed to `DM.get_data`.
+        lead : float, optional
+            Number of seconds between the prefetch and the boundary, default
+            is 2.
+        n_latencies : int, optional
+            Number of iterations kept to compute the statistics, default is
+            1000.
+
+        Raises
+        ------
+        ValueError
+            If the data manager has no incremental path.
+
+        """
+        if not getattr(DM, 'incremental', False):
+
+            raise ValueError('prefetch needs an incremental data manager, '
+                             'got {}'.format(type(DM).__name__))
+
+        self.logger = logging.getLogger(__name__)
+        self.DM = DM
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs)
+        self.lead = lead
+        self.latencies = deque(maxlen=n_latencies)
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+        self._prefetch = None
+        self.data = None
+
+    def __repr__(self):
+        return 'Prefetcher({}, lead={})'.format(
+            type(self.DM).__name__, self.lead
+        )
+
+    def schedule(self, t):
+        """ Prefetch the data `lead` seconds before the time `t`.
+
+        Parameters
+        ----------
+        t : float
+            Time (`time.time`) of the next bar boundary.
+
+        """
+        self._thread = Thread(target=self._run, args=(t,), daemon=True)
+        self._thread.start()
+
+    def _run(self, t):
+        if self._stop.wait(max(t - self.lead - time.time(), 0)):
+
+            return
+
+        with self._lock:
+            t0 = time.perf_counter()
+            try:
+                # Candles until the previous bar are kept by the manager
+                self.data = self.DM.get_data(*self.args, **self.kwargs)
+
+            except Exception as e:
+                self.logger.warning('Prefetch failed: {}'.format(e))
+                self._prefetch = None
+
+                return
+
+            self._prefetch = time.perf_counter() - t0
+
+    def get_data(self):
+        """ Request the final bar at the boundary, once the prefetch is done.
+
+        Returns
+        -------
+        object
+            Output of `DM.get_data`, the prefetched candles updated with the
+            final bar.
+
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        with self._lock:
+            t0 = time.perf_counter()
+            data = self.DM.get_data(*self.args, **self.kwargs)
+            latency = time.perf_counter() - t0
+
+        if self._prefetch is not None:
+            self.latencies.append((self._prefetch, latency))
+            self.logger.debug('Prefetch {:.1f} ms, boundary {:.1f} ms'.format(
+                self._prefetch * 1e3, latency * 1e3
+            ))
+
+        self._prefetch = None
+        self.data = None
+
+        return data
+
+    def metrics(self):
+        """ Return the statistics of the latencies of the last iterations.
+
+        Returns
+        -------
+        dict
+            Number of prefetched iterations, mean durations of the prefetch
+            and of the request at the boundary, and max duration of the
+            request at the boundary, in seconds.
+
+        """
+        x = np.array(self.latencies).reshape([-1, 2])
+        if x.shape[0] == 0:
+
+            return {'count': 0, 'prefetch': np.nan, 'boundary': np.nan,
+                    'max_boundary': np.nan}
+
+        return {
+            'count': x.shape[0],
+            'prefetch': x[:, 0].mean(),
+            'boundary': x[:, 1].mean(),
+            'max_boundary': x[:, 1].max(),
+        }
+
+    def stop(self):
+        """ Cancel the scheduled prefetch and wait its thread. """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Event-driven scheduler of the bars of a strategy.
+
+The `BarScheduler` sleeps until the next bar boundary instead of polling the
+clock. The boundary is a time of the exchange server (the offset between the
+local clock and the server clock is estimated with the Time endpoint, see
+`server_time_offset`), converted into a deadline of the monotonic clock, such
+that an adjustment of the system clock doesn't move the wake up.
+
+The sleep is only interrupted by `wake`, e.g. when a stop or a control
+message is received. The drift between each actual fire time and its planned
+boundary is recorded.
+
+"""
+
+# Built-in packages
+from collections import deque
+import logging
+from threading import Event
+import time
+
+# Third party packages
+import numpy as np
+
+# Local packages
+from trading_bot.data_requests import DataRequests
+
+__all__ = ['BarScheduler', 'server_time_offset']
+
+KRAKEN = "https://api.kraken.com/0/public"
+
+
+def server_time_offset(path=KRAKEN, n=3):
+    """ Estimate the offset between the clock of the exchange and the local
+    clock.
+
+    The server time is compared with the middle of the round trip of each
+    request, the request with the shortest round trip is kept.
+
+    Parameters
+    ----------
+    path : str, optional
+        Url of the public API, default is Kraken.
+    n : int, optional
+        Number of requests to the Time endpoint, default is 3.
+
+    Returns
+    -------
+    float
+        Seconds to add to `time.time()` to get the server time.
+
+    """
+    req = DataRequests(path)
+    best = None
+    for _ in range(n):
+        t0 = time.time()
+        server = req.get_data('Time')['result']['unixtime']
+        t1 = time.time()
+        # The server time is truncated to the second
+        offset = server + 0.5 - (t0 + t1) / 2
+        if best is None or t1 - t0 < best[0]:
+            best = (t1 - t0, offset)
+
+    return best[1]
+
+
+class BarScheduler:
+    """ Object to wait the bar boundaries of a strategy.
+
+    Methods
+    -------
+    time()
+        Return the current server time.
+    next_boundary(t=None)
+        Return the first bar boundary after a time.
+    wait(t)
+        Sleep until the server time `t` or until woken up.
+    wake()
+        Interrupt the current or the next sleep.
+    metrics()
+        Return the statistics of the drifts.
+
+    Attributes
+    ----------
+    frequency : int
+        Number of seconds between two bars.
+    offset : float
+        Seconds to add to `time.time()` to get the server time.
+    drifts : collections.deque
+        Seconds between the planned boundary and the actual fire time of the
+        last bars.
+
+    """
+
+    def __init__(self, frequency, offset=0., n_drifts=1000):
+        """ Initialize the scheduler.
+
+        Parameters
+        ----------
+        frequency : int
+            Number of seconds between two bars.
+        offset : float, optional
+            Seconds to add to `time.time()` to get the server time (see
+            `server_time_offset`), default is 0.
+        n_drifts : int, optional
+            Number of bars kept to compute the statistics, default is 1000.
+
+        """
+        self.logger = logging.getLogger(__name__)
+        self.frequency = frequency
+        self.offset = offset
+        self.drifts = deque(maxlen=n_drifts)
+        self._wake = Event()
+        # Server time at a monotonic reference
+        self._t0 = time.time() + offset
+        self._m0 = time.monotonic()
+
+    def __repr__(self):
+        return 'BarScheduler(frequency={}, offset={:.3f})'.format(
+            self.frequency, self.offset
+        )
+
+    def time(self):
+        """ Return the current server time, on the monotonic clock. """
+        return self._t0 + time.monotonic() - self._m0
+
+    def next_boundary(self, t=None):
+        """ Return the first bar boundary strictly after a time.
+
+        Parameters
+        ----------
+        t : float, optional
+            Server time, default is now.
+
+        Returns
+        -------
+        int
+            Timestamp of the next bar boundary.
+
+        Examples
+        --------
+        >>> BarScheduler(60).next_boundary(1600000000)
+        1600000020
+
+        """
+        t = self.time() if t is None else t
+
+        return int(t // self.frequency + 1) * self.frequency
+
+    def wait(self, t):
+        """ Sleep until the server time `t` or until woken up.
+
+        Parameters
+        ----------
+        t : float
+            Server time to wait.
+
+        Returns
+        -------
+        bool
+            True if the time `t` is reached, False if woken up before.
+
+        """
+        deadline = self._m0 + t - self._t0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+
+                break
+
+            if self._wake.wait(remaining):
+                self._wake.clear()
+
+                return False
+
+        drift = self.time() - t
+        self.drifts.append(drift)
+        self.logger.debug('fired with a drift of {:.1f} ms'.format(
+            drift * 1e3
+        ))
+
+        return True
+
+    def wake(self):
+        """ Interrupt the current or the next sleep. """
+        self._wake.set()
+
+    def metrics(self):
+        """ Return the statistics of the drifts of the last bars.
+
+        Returns
+        -------
+        dict
+            Number of bars, mean, standard deviation and max drift, in
+            seconds.
+
+        """
+        x = np.array(self.drifts)
+        if x.size == 0:
+
+            return {'count': 0, 'mean': np.nan, 'std': np.nan, 'max': np.nan}
+
+        return {
+            'count': x.size,
+            'mean': x.mean(),
+            'std': x.std(),
+            'max': x.max(),
+        }
@@ -0,0 +1,555 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Host process running several strategy bots.
+
+A `StrategyHost` loads several strategies (as `StrategyBot.__call__`) in a
+single process, instead of a process per strategy. The strategy bots share
+the connection to the server, a single thread reading their messages from the
+`TradingBotManager`, a single scheduler and the data managers: strategies
+with the same data configuration request their data once per bar.
+
+Bars are run cooperatively in the order of their boundaries by a single loop.
+An exception raised by a strategy (loading, computing the signal or sending
+the order) is logged and only stops this strategy after `max_errors`
+consecutive errors.
+
+Strategies of a family (same strategy code, data, frequency and positional
+parameters, they only differ by their numeric keyword parameters) are
+evaluated in one pass if their module defines the batched function::
+
+    def get_batch_order_params(data, params, names, *args):
+        ...
+        return signals, order_params
+
+where `params` is the matrix of the keyword parameters `names` of the
+strategies (a row per strategy, see `stack_params`), `signals` is an array
+and `order_params` a list of dict or a dict of arrays (a value per
+strategy). If the strategies have streaming indicators, their list is passed
+with the keyword `indicators` (a dict per strategy, in the order of the rows
+of `params`) and they are saved after the bar. If the batched function
+fails, strategies are evaluated one by one.
+
+Start a host from the command line::
+
+    $ python -m trading_bot.strategy_host another_example example
+
+"""
+
+# Built-in packages
+import hashlib
+import json
+import logging
+from multiprocessing.connection import Connection, wait
+import sys
+from threading import Event, Lock, Thread
+
+# Third party packages
+import numpy as np
+
+# Local packages
+from trading_bot._client import connect_server
+from trading_bot.scheduler import BarScheduler, server_time_offset
+from trading_bot.strategy_manager import StrategyBot
+from trading_bot.tools.io import load_config_params
+
+__all__ = [
+    'StrategyHost', 'SharedData', 'start_strategy_host', 'stack_params',
+    'split_params',
+]
+
+
+def stack_params(kwargs_list):
+    """ Stack the numeric keyword parameters of a family of strategies.
+
+    Parameters
+    ----------
+    kwargs_list : list of dict
+        Keyword parameters of each strategy.
+
+    Returns
+    -------
+    names : list of str
+        Sorted names of the numeric parameters.
+    params : np.ndarray[dtype=np.float64, ndim=2]
+        Parameters, a row per strategy.
+
+    Examples
+    --------
+    >>> stack_params([{'leverage': 1., 'half_life': 11, 'mode': 'x'},
+    ...               {'leverage': 2., 'half_life': 5, 'mode': 'x'}])
+    (['half_life', 'leverage'], array([[11.,  1.],
+           [ 5.,  2.]]))
+
+    """
+    names = sorted(k for k, v in kwargs_list[0].items() if _is_numeric(v))
+    params = np.array([[kw[k] for k in names] for kw in kwargs_list],
+                      dtype=np.float64).reshape([len(kwargs_list), -1])
+
+    return names, params
+
+
+def split_params(order_params, n):
+    """ Split the parameters of orders returned by a batched function.
+
+    Parameters
+    ----------
+    order_params : list of dict or dict of array_like
+        Parameters of the orders, a dict per strategy or a value per strategy
+        for each parameter.
+    n : int
+        Number of strategies.
+
+    Returns
+    -------
+    list of dict
+        Parameters of the order of each strategy.
+
+    Examples
+    --------
+    >>> split_params({'price': [1.5, 2.]}, 2)
+    [{'price': 1.5}, {'price': 2.0}]
+
+    """
+    if isinstance(order_params, dict):
+        order_params = [
+            {k: _item(v[i]) for k, v in order_params.items()}
+            for i in range(n)
+        ]
+
+    if len(order_params) != n:
+
+        raise ValueError('{} order parameters for {} strategies'.format(
+            len(order_params), n
+        ))
+
+    return [dict(p) for p in order_params]
+
+
+def _is_numeric(x):
+    return isinstance(x, (int, float)) and not isinstance(x, bool)
+
+
+def _item(x):
+    return x.item() if hasattr(x, 'item') else x
+
+
+class SharedData:
+    """ Data manager shared by the strategy bots of a host.
+
+    During a round of bars (`bar` is set), the data of each request is
+    requested once and copied for each strategy. Otherwise (e.g. prefetch
+    requests) requests are passed to the data manager. Other attributes are
+    those of the data manager.
+
+    Attributes
+    ----------
+    DM : object
+        Data manager, any object with a `get_data` method.
+    bar : int or None
+        Timestamp of the current round of bars.
+    n_requests : int
+        Number of requests passed to the data manager.
+
+    """
+
+    def __init__(self, DM):
+        """ Initialize the shared data manager.
+
+        Parameters
+        ----------
+        DM : object
+            Data manager, any object with a `get_data` method.
+
+        """
+        self.DM = DM
+        self.bar = None
+        self.n_requests = 0
+        self._cache = {}
+        self._lock = Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.DM, name)
+
+    def __repr__(self):
+        return 'SharedData({})'.format(type(self.DM).__name__)
+
+    def get_data(self, *args, **kwargs):
+        """ Request the data once per round of bars.
+
+        Returns
+        -------
+        object
+            Output of `DM.get_data`, copied if it is cached.
+
+        """
+        with self._lock:
+            bar = self.bar
+            key = json.dumps([args, kwargs], sort_keys=True, default=str)
+            if bar is None or key not in self._cache.get(bar, {}):
+                self.n_requests += 1
+                data = self.DM.get_data(*args, **kwargs)
+                if bar is None:
+
+                    return data
+
+                self._cache = {bar: {**self._cache.get(bar, {}), key: data}}
+
+            data = self._cache[bar][key]
+
+        return data.copy() if hasattr(data, 'copy') else data
+
+
+class StrategyHost:
+    """ Object to run several strategy bots in a single process.
+
+    Methods
+    -------
+    run()
+        Run the bars of the strategies until they stop.
+    listen_tbm()
+        Read the messages of the TradingBotManager to the strategy bots.
+    is_stop()
+        Check if the server is stopped.
+
+    Attributes
+    ----------
+    names : list of str
+        Names of the strategies.
+    bots : dict of StrategyBot
+        Strategy bots running, by ID.
+    data : dict of SharedData
+        Data managers shared by strategies, by data configuration.
+    scheduler : trading_bot.scheduler.BarScheduler
+        Scheduler of the bars, woken up by stop commands.
+    errors : dict of int
+        Number of consecutive errors of each strategy.
+    families : dict of tuple
+        Family of each strategy with a batched function, by ID.
+
+    """
+
+    def __init__(self, names, address=('', 50000), authkey=b'tradingbot',
+                 path='./strategies', max_errors=3, server_time=True):
+        """ Initialize the host.
+
+        Parameters
+        ----------
+        names : list of str
+            Names of the strategies to run.
+        address : tuple, optional
+            Address of the server.
+        authkey : bytes, optional
+            Authentication key of the server.
+        path : str, optional
+            Path of the folder of the strategies, default is './strategies'.
+        max_errors : int, optional
+            Number of consecutive errors after which a strategy is stopped,
+            default is 3.
+        server_time : bool, optional
+            If True (default) bars are aligned on the server time of the
+            exchange.
+
+        """
+        self.logger = logging.getLogger('strategy_host')
+        self.names = list(names)
+        self.address = address
+        self.authkey = authkey
+        self.path = path
+        self.max_errors = max_errors
+        self.server_time = server_time
+        self.bots = {}
+        self.data = {}
+        self.errors = {}
+        self.families = {}
+        self.m = None
+        self.scheduler = None
+        self._stop = Event()
+        self._thread = None
+
+    def __repr__(self):
+        return 'StrategyHost({} strategies)'.format(len(self.bots))
+
+    def __enter__(self):
+        """ Connect to the server and load the strategies. """
+        self.m = connect_server(self.address, self.authkey)
+        self.p_state = self.m.get_state()
+        offset = 0.
+        if self.server_time:
+            try:
+                offset = server_time_offset()
+
+            except Exception as e:
+                self.logger.warning('Server time not available: {}'.format(e))
+
+        self.scheduler = BarScheduler(1, offset=offset)
+        for name in self.names:
+            self._load(name)
+
+        self._stop.clear()
+        self._thread = Thread(target=self.listen_tbm, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        """ Stop the strategies and the listening thread. """
+        for bot in list(self.bots.values()):
+            self._close(bot)
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        if exc_type is not None:
+            self.logger.error(
+                '{}: {}'.format(exc_type, exc_value),
+                exc_info=True
+            )
+
+        self.logger.info('Drift: {}'.format(self.scheduler.metrics()))
+        self.logger.info('StrategyHost stopped.')
+
+    def _load(self, name):
+        bot = StrategyBot(manager=self.m)
+        bot.host = self
+        try:
+            bot(name, path=self.path).__enter__()
+
+        except Exception as e:
+            self.logger.error('Cannot load {}: {}'.format(name, e),
+                              exc_info=True)
+
+            return
+
+        # Strategies with the same data configuration share their data
+        cfg = bot.cfg['get_data_instance']
+        if cfg['source_data'].lower() != 'hub':
+            key = json.dumps(cfg, sort_keys=True, default=str)
+            shared = self.data.setdefault(key, SharedData(bot.DM))
+            bot.DM = shared
+            if bot.prefetcher is not None:
+                bot.prefetcher.DM = shared
+
+            if bot.get_batch_order_params is not None:
+                self.families[bot.id] = self._family(key, bot)
+
+        bot.scheduler = BarScheduler(bot.frequency,
+                                     offset=self.scheduler.offset)
+        iter(bot)
+        self.bots[bot.id] = bot
+        self.errors[bot.id] = 0
+        self.logger.info('Load {} with ID {}'.format(name, bot.id))
+
+    @staticmethod
+    def _family(key, bot):
+        # Strategies differing only by their numeric keyword parameters
+        with open(bot.strat_file, 'rb') as f:
+            code = hashlib.sha1(f.read()).hexdigest()
+
+        other = {k: v for k, v in bot.f_kwrds.items() if not _is_numeric(v)}
+
+        return (key, code, bot.frequency, bot.delay,
+                json.dumps([bot.f_args, other, sorted(bot.f_kwrds)],
+                           sort_keys=True, default=str))
+
+    def _close(self, bot, exc_info=(None, None, None)):
+        self.bots.pop(bot.id, None)
+        try:
+            bot.__exit__(*exc_info)
+
+        except Exception as e:
+            self.logger.error('Cannot close {}: {}'.format(bot.name_strat, e))
+
+    def is_stop(self):
+        """ Check if the server is stopped. """
+        return self.p_state._getvalue()['stop']
+
+    def run(self):
+        """ Run the bars of the strategies until they stop. """
+        while True:
+            stop = self._stop.is_set() or self.is_stop()
+            for bot in list(self.bots.values()):
+                if stop or bot.t >= bot.STOP:
+                    self._close(bot)
+
+            if not self.bots:
+
+                break
+
+            t = min(bot.next + bot.delay for bot in self.bots.values())
+            if not self.scheduler.wait(t):
+                # Woken up by a control message
+                continue
+
+            # Data shared by the strategies of the same round of bars
+            for shared in self.data.values():
+                shared.bar = t
+
+            families = {}
+            for bot in list(self.bots.values()):
+                if bot.next + bot.delay <= t:
+                    key = self.families.get(bot.id, bot.id)
+                    families.setdefault(key, []).append(bot)
+
+            for bots in families.values():
+                if len(bots) > 1:
+                    self._fire_batch(bots)
+
+                else:
+                    self._fire(bots[0], bots[0].fire)
+
+            for shared in self.data.values():
+                shared.bar = None
+
+    def _fire(self, bot, func):
+        # Compute and process the signal of a strategy, errors are isolated
+        try:
+            s, kw = func()
+            bot.process_signal(s, kw)
+
+        except Exception as e:
+            self._error(bot, e)
+
+            return False
+
+        self.errors[bot.id] = 0
+
+        return True
+
+    def _error(self, bot, e):
+        self.errors[bot.id] += 1
+        self.logger.error('{} failed ({}/{}): {}'.format(
+            bot.name_strat, self.errors[bot.id], self.max_errors, e
+        ), exc_info=True)
+        if self.errors[bot.id] >= self.max_errors:
+            self._close(bot, sys.exc_info())
+
+    def _fire_batch(self, bots):
+        # Evaluate a family of strategies in one pass on the shared data
+        data = {}
+        for bot in bots:
+            try:
+                data[bot.id] = bot.next_data()
+
+            except Exception as e:
+                self._error(bot, e)
+
+        bots = [bot for bot in bots if bot.id in data]
+        if not bots:
+
+            return
+
+        bot = bots[0]
+        try:
+            names, params = stack_params([b.f_kwrds for b in bots])
+            kwargs = {}
+            if any(b.indicators is not None for b in bots):
+                kwargs['indicators'] = [b.indicators for b in bots]
+
+            signals, order_params = bot.get_batch_order_params(
+                data[bot.id], params, names, *bot.f_args, **kwargs
+            )
+            order_params = split_params(order_params, len(bots))
+
+        except Exception as e:
+            self.logger.warning('batch of {} failed, evaluate strategies one'
+                                ' by one: {}'.format(bot.name_strat, e))
+            for b in bots:
+                self._fire(b, lambda b=b: b.signal(data[b.id]))
+
+            return
+
+        for i, b in enumerate(bots):
+            self._fire(b, lambda i=i, b=b: self._output(b, signals[i],
+                                                        order_params[i]))
+
+    @staticmethod
+    def _output(bot, s, kw):
+        # Signal of a strategy evaluated in a batch, with its indicators
+        bot.save_indicators()
+
+        return _item(s), kw
+
+    def listen_tbm(self):
+        """ Read the messages of the TradingBotManager to the strategy bots.
+
+        The thread blocks on the connections of the strategy bots until the
+        next tick of the scheduler, the server is only checked on timeout.
+
+        """
+        self.logger.debug('starting listen tbm')
+        while not self._stop.is_set():
+            timeout = self.scheduler.next_boundary() - self.scheduler.time()
+            ready = self._wait_tbm(timeout)
+            for bot in ready:
+                conn = bot.conn_tbm
+                try:
+                    k, a = conn._handler(*conn.recv())
+
+                except StopIteration:
+                    # TradingBotManager closed the connection
+                    bot.t = bot.STOP
+                    self.scheduler.wake()
+
+                    continue
+
+                except (EOFError, OSError):
+
+                    continue
+
+                bot._handler_tbm(k, a)
+                if k == '_stop':
+                    self.scheduler.wake()
+
+            if not ready and self.is_stop():
+                self._stop.set()
+                self.scheduler.wake()
+
+        self.logger.debug('stopping listen tbm')
+
+    def _wait_tbm(self, timeout):
+        # Block until a message of the TradingBotManager or the timeout
+        readers = {bot.conn_tbm.r: bot for bot in list(self.bots.values())
+                   if bot.conn_tbm.state == 'up'}
+        if not readers:
+            self._stop.wait(timeout)
+
+            return []
+
+        pipes = [r for r in readers if isinstance(r, Connection)]
+        proxies = [r for r in readers if not isinstance(r, Connection)]
+        try:
+            if proxies:
+                # Pipes held by the server block remotely, in turn
+                ready = [r for r in proxies
+                         if r.poll(timeout / len(proxies))]
+                ready += wait(pipes, 0) if pipes else []
+
+            else:
+                ready = wait(pipes, timeout)
+
+        except (EOFError, OSError):
+            ready = []
+
+        return [readers[r] for r in ready]
+
+
+def start_strategy_host(strat_names, address=('', 50000),
+                        authkey=b'tradingbot'):
+    """ Start a host running several strategy bots. """
+    with StrategyHost(strat_names, address=address, authkey=authkey) as host:
+        host.run()
+
+    return None
+
+
+if __name__ == '__main__':
+
+    import logging.config
+
+    # Load logging configuration
+    log_config = load_config_params('./trading_bot/logging.ini')
+    logging.config.dictConfig(log_config)
+
+    start_strategy_host(sys.argv[1:])
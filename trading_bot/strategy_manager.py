@@ -11,7 +11,7 @@
 # Built-in packages
 import importlib
 import logging
-from pickle import Pickler, Unpickler
+from pickle import Unpickler
 import sys
 from threading import Thread
 import time
@@ -23,7 +23,11 @@ from trading_bot._client import _ClientStrategyBot
 from trading_bot._exceptions import InsufficientFunds
 # from trading_bot._containers import OrderDict
 from trading_bot.data_requests import get_close
+from trading_bot.id_allocator import OrderIdAllocator
+from trading_bot.indicators import load_indicators, save_indicators
 from trading_bot.orders import OrderSL, OrderBestLimit
+from trading_bot.prefetch import Prefetcher
+from trading_bot.scheduler import BarScheduler, server_time_offset
 # from trading_bot.performance import PnL
 from trading_bot.tools.io import load_config_params, dump_config_params
 from trading_bot.tools.time_tools import now, str_time
@@ -56,6 +60,13 @@ class StrategyBot(_ClientStrategyBot):
     get_order_params : callable
         Strategy function that returns a tuple with a signal ({1, 0, -1}) and
         additional parameters (dict) to set order.
+    get_batch_order_params : callable or None
+        Optional strategy function that returns the signals and parameters of
+        orders of a family of strategies (see `trading_bot.strategy_host`).
+    set_indicators : callable or None
+        Optional strategy function that returns a dict of streaming
+        indicators (see `trading_bot.indicators`), passed to the strategy
+        function with the keyword `indicators` and saved after each bar.
     name_strat : str
         Name of the strategy to run.
     STOP : int, optional
@@ -76,19 +87,31 @@ class StrategyBot(_ClientStrategyBot):
     order_sent = []
     pnl = None
     delay = 0
+    prefetch = 0
+    prefetcher = None
+    server_time = True
+    scheduler = None
+    host = None
+    indicators = None
+    id_allocator = None
 
     # TODO : Load strategy config
-    def __init__(self, address=('', 50000), authkey=b'tradingbot'):
+    def __init__(self, address=('', 50000), authkey=b'tradingbot',
+                 manager=None):
         """ Initialize strategy manager.
 
         Parameters
         ----------
         address :
         authkey :
+        manager : trading_bot._server.TradingBotServer, optional
+            Connection to the server shared with other strategy bots,
+            default opens a new connection.
 
         """
         # Set client and connect to the trading bot server
-        _ClientStrategyBot.__init__(self, address=address, authkey=authkey)
+        _ClientStrategyBot.__init__(self, address=address, authkey=authkey,
+                                    manager=manager)
         self.logger = logging.getLogger('strategy_bot')
 
     def __call__(self, name_strat, STOP=None, path='./strategies'):
@@ -116,14 +139,19 @@ class StrategyBot(_ClientStrategyBot):
             strat_path += '/'
 
         # Import strategy
+        self.strat_file = strat_path + name_strat + '/strategy.py'
         spec = importlib.util.spec_from_file_location(
-            'strategies.' + name_strat + '.strategy',
-            strat_path + name_strat + '/strategy.py'
+            'strategies.' + name_strat + '.strategy', self.strat_file
         )
         strat_module = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(strat_module)
 
         self.get_order_params = strat_module.get_order_params
+        # Optional batched function, see `trading_bot.strategy_host`
+        self.get_batch_order_params = getattr(
+            strat_module, 'get_batch_order_params', None
+        )
+        self.set_indicators = getattr(strat_module, 'set_indicators', None)
         self.logger.info('Load {} strategy function'.format(name_strat))
 
         self.name_strat = name_strat
@@ -135,11 +163,16 @@ class StrategyBot(_ClientStrategyBot):
     def __iter__(self):
         """ Initialize iterative method. """
         self.t = 0
-        self.TS = now(self.frequency)
+        if self.scheduler is None:
+            self.scheduler = BarScheduler(self.frequency,
+                                          offset=self._offset())
+
+        self.TS = self.scheduler.next_boundary() - self.frequency
         self.next = self.TS + self.frequency
         self.logger.info('Start now and stop in {}'.format(
             str_time(int(self.time_stop()))
         ))
+        self._schedule_prefetch()
 
         return self
 
@@ -161,35 +194,143 @@ class StrategyBot(_ClientStrategyBot):
 
             raise StopIteration
 
-        self.TS = int(time.time()) - self.delay
-        # self.TS += self.frequency + self.delay # force to send signal
-        if self.next <= self.TS:
-            self.next += self.frequency
-            self.t += 1
-            self.logger.info('{}/{}iteration, stop in {}'.format(
-                self.t, self.STOP, str_time(int(self.time_stop()))
-            ))
-            # TODO : Debug/find solution to request data correctly.
-            #        Need to choose between request a database, server,
-            #        exchange API or other.
-            data = self.DM.get_data(*self.args_data, **self.kwargs_data)
+        # Sleep until the bar boundary, woken up early by a control message
+        if not self.scheduler.wait(self.next + self.delay):
+
+            return None, None
+
+        return self.fire()
+
+    def fire(self):
+        """ Request the data of the closed bar and compute the signal.
+
+        Returns
+        -------
+        tuple
+            Signal and parameters of the order.
+
+        """
+        return self.signal(self.next_data())
+
+    def signal(self, data):
+        """ Compute the signal and the parameters of the order.
+
+        Parameters
+        ----------
+        data : object
+            Output of the data manager.
+
+        Returns
+        -------
+        tuple
+            Signal and parameters of the order.
+
+        """
+        if self.indicators is None:
 
             return self.get_order_params(data, *self.f_args, **self.f_kwrds)
 
-        time.sleep(0.01)
+        output = self.get_order_params(data, *self.f_args,
+                                       indicators=self.indicators,
+                                       **self.f_kwrds)
+        self.save_indicators()
+
+        return output
 
-        return None, None
+    def save_indicators(self):
+        """ Save the streaming indicators updated at the last bar. """
+        if self.indicators is None:
+
+            return
+
+        save_indicators(self.indicators, self.path + '/indicators.json',
+                        TS=self.TS)
+
+    def _load_indicators(self):
+        # Indicators are kept if no bar was missed since they were saved
+        if self.set_indicators is None:
+
+            return
+
+        indicators, info = load_indicators(self.path + '/indicators.json')
+        if indicators is not None and info['TS'] >= now(self.frequency):
+            self.logger.info('Load indicators of {}'.format(info['TS']))
+            self.indicators = indicators
+
+        else:
+            self.indicators = self.set_indicators(*self.f_args,
+                                                  **self.f_kwrds)
+
+    def next_data(self):
+        """ Move to the next bar and request the data of the closed bar.
+
+        Returns
+        -------
+        object
+            Output of the data manager.
+
+        """
+        self.TS = self.next
+        self.next += self.frequency
+        self.t += 1
+        self.logger.info('{}/{}iteration, stop in {}'.format(
+            self.t, self.STOP, str_time(int(self.time_stop()))
+        ))
+        # TODO : Debug/find solution to request data correctly.
+        #        Need to choose between request a database, server,
+        #        exchange API or other.
+        if self.prefetcher is None:
+            data = self.DM.get_data(*self.args_data, **self.kwargs_data)
+
+        else:
+            data = self.prefetcher.get_data()
+            self._schedule_prefetch()
+
+        return data
+
+    def _offset(self):
+        # Offset between the clocks of the exchange and of the host
+        if not self.server_time:
+
+            return 0.
+
+        try:
+            offset = server_time_offset()
+
+        except Exception as e:
+            self.logger.warning('Server time not available: {}'.format(e))
+
+            return 0.
+
+        self.logger.info('Server time offset is {:.3f} sec'.format(offset))
+
+        return offset
+
+    def _schedule_prefetch(self):
+        if self.prefetcher is not None:
+            # Prefetcher is scheduled on the local clock
+            self.prefetcher.schedule(
+                self.next + self.delay - self.scheduler.offset
+            )
 
     def __enter__(self):
         """ Enter. """
         # TODO : Load precedent data
         self.logger.info('Load configuration')
         self.set_config(self.path + '/configuration.yaml')
+        self._load_indicators()
         super(StrategyBot, self).__enter__()
-        self.conn_tbm.thread = Thread(target=self.listen_tbm, daemon=True)
-        self.conn_tbm.thread.start()
+        if self.host is None:
+            # Messages of a hosted bot are read by its host
+            self.conn_tbm.thread = Thread(target=self.listen_tbm, daemon=True)
+            self.conn_tbm.thread.start()
+
         # send name of strategy to TBM
         self.conn_tbm.send(('name', self.name_strat),)
+        # subscribe to the market data hub of TBM
+        if hasattr(self.DM, 'subscribe'):
+            self.DM.subscribe(self.conn_tbm, *self.args_data,
+                              **self.kwargs_data)
         # TODO : load history ? Is it necessary ?
         # self.get_histo_orders(self.path + '/orders_hist.dat')
         # self.get_histo_result(self.path + '/result_hist.dat')
@@ -209,6 +350,16 @@ class StrategyBot(_ClientStrategyBot):
         # if not self.is_stop():
         #    self._wait_orders_closed()
 
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.logger.info('Prefetch: {}'.format(self.prefetcher.metrics()))
+
+        if self.scheduler is not None:
+            self.logger.info('Drift: {}'.format(self.scheduler.metrics()))
+
+        if self.id_allocator is not None:
+            self.id_allocator.close()
+
         self.logger.info('Save configuration')
         # Save configuration and data
         self.set_general_cfg(self.path + '/configuration.yaml')
@@ -227,7 +378,8 @@ class StrategyBot(_ClientStrategyBot):
 
         self.logger.info('end')
         super(StrategyBot, self).__exit__(exc_type, exc_value, exc_tb)
-        self.conn_tbm.thread.join()
+        if self.conn_tbm.thread is not None:
+            self.conn_tbm.thread.join()
 
     def set_config(self, path):
         """ Set configuration.
@@ -244,6 +396,8 @@ class StrategyBot(_ClientStrategyBot):
         self._get_general_cfg(self.cfg['strat_manager_instance'])
         # Set data manager configuration
         self.set_data_manager(**self.cfg['get_data_instance'].copy())
+        if self.prefetch:
+            self._set_prefetcher()
         # Set stategy parameters
         self._strat_cfg(self.cfg['strategy_instance'])
         # Set parameters for orders
@@ -253,6 +407,14 @@ class StrategyBot(_ClientStrategyBot):
         # TODO : Set ResultManager
         self.logger.info('set_config | Strategy is configured')
 
+    def _set_prefetcher(self):
+        try:
+            self.prefetcher = Prefetcher(self.DM, self.args_data,
+                                         self.kwargs_data, lead=self.prefetch)
+
+        except ValueError as e:
+            self.logger.warning('Prefetch disabled: {}'.format(e))
+
     def _get_general_cfg(self, strat_cfg):
         # Get general parameters and strategy state
         self.frequency = strat_cfg['frequency']
@@ -267,6 +429,12 @@ class StrategyBot(_ClientStrategyBot):
         if 'delay' in strat_cfg.keys():
             self.delay = int(strat_cfg['delay'])
 
+        if 'prefetch' in strat_cfg.keys():
+            self.prefetch = float(strat_cfg['prefetch'] or 0)
+
+        if 'server_time' in strat_cfg.keys():
+            self.server_time = bool(strat_cfg['server_time'])
+
         self.logger.info('current position is {}'.format(self.current_pos))
         self.logger.info('current volume is {}'.format(self.current_vol))
         if self.STOP is None:
@@ -629,24 +797,12 @@ class StrategyBot(_ClientStrategyBot):
             Number to identify an order and link it with a strategy.
 
         """
-        s = 10 ** n
-        try:
-            with open(self.path + '/id_order.dat', 'rb') as f:
-                id_order = Unpickler(f).load()
-
-        except FileNotFoundError:
-            id_order = 0
-
-        id_order += 1
-        if id_order > 2147483647 // s:
-            id_order = 0
-
-        with open(self.path + '/id_order.dat', 'wb') as f:
-            Pickler(f).dump(id_order)
-
-        id_strat = '0' * (n - len(str(self.id))) + str(self.id)
+        if self.id_allocator is None:
+            self.id_allocator = OrderIdAllocator(
+                self.path + '/id_order.bin', self.id, n=n
+            )
 
-        return int(str(id_order) + str(id_strat))
+        return next(self.id_allocator)
 
     def listen_tbm(self):
         """ Wait message from TBM. """
@@ -655,9 +811,15 @@ class StrategyBot(_ClientStrategyBot):
             self._handler_tbm(k, a)
             if self.is_stop():
                 self.conn_tbm.shutdown()
+                self._wake()
 
         self.logger.debug('stopping listen tbm')
 
+    def _wake(self):
+        # Interrupt the sleep until the next bar
+        if self.scheduler is not None:
+            self.scheduler.wake()
+
     def _handler_tbm(self, k, a):
         if k is None:
             pass
@@ -677,6 +839,10 @@ class StrategyBot(_ClientStrategyBot):
                     'real': not self.ord_kwrds.get('validate', False),
                 })
 
+        elif k == 'market_data':
+            # Data published by the market data hub of TBM
+            self.DM.put(a)
+
         elif k == 'get_pos':
             self.conn_tbm.send(('cpos', (self.id, self.current_pos)),)
 
@@ -696,6 +862,7 @@ class StrategyBot(_ClientStrategyBot):
             # enforce stop time
             self.logger.info('TradingBotManager sent a STOP command')
             self.t = self.STOP
+            self._wake()
 
         else:
             self.logger.error('received unknown message {}: {}'.format(k, a))
@@ -722,9 +889,9 @@ if __name__ == '__main__':
         for s, kw in sm:
             sm.process_signal(s, kw)
             txt = time.strftime('%y-%m-%d %H:%M:%S')
-            txt += ' | Next signal in {:}'.format(str_time(sm.next - sm.TS))
+            t = int(sm.next + sm.delay - sm.scheduler.time())
+            txt += ' | Next signal in {:}'.format(str_time(max(t, 0)))
             print(txt, end='\r')
-            time.sleep(0.01)
 
         sm.logger.info('StrategyBot stopped.')
 
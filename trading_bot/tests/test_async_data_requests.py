@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+# External packages
+import numpy as np
+import pytest
+from requests.exceptions import Timeout
+
+# Internal packages
+from trading_bot.async_data_requests import (AsyncDataExchangeManager,
+                                             AsyncDataRequests)
+from trading_bot.data_requests import DataExchangeManager
+import trading_bot.data_requests as data_requests
+from trading_bot.tools.sessions import ThreadedAsyncSession
+
+T = 1600000020 // 60 * 60
+
+
+class OHLCStub(BaseHTTPRequestHandler):
+    """ Slow OHLC endpoint with keep-alive connections. """
+
+    protocol_version = 'HTTP/1.1'
+    delay = 0.2
+    clients = set()
+
+    def do_GET(self):
+        OHLCStub.clients.add(self.client_address)
+        query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query)
+                 .items()}
+        time.sleep(OHLCStub.delay)
+        rows = [[t, '1', '3', '0.5', str(t % 997), '1', str(t % 7), 1]
+                for t in range(T - 6000, T + 1, 60)]
+        result = {query['pair']: rows, 'last': T - 60}
+        body = json.dumps({'error': [], 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    request_queue_size = 256
+    daemon_threads = True
+
+
+@pytest.fixture()
+def set_variables(monkeypatch):
+    server = Server(('127.0.0.1', 0), OHLCStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(OHLCStub, 'clients', set())
+    monkeypatch.setattr(data_requests, 'now', lambda f=60: T // f * f)
+    url = 'http://127.0.0.1:{}/0/public'.format(server.server_address[1])
+
+    yield url, ThreadedAsyncSession(limit=200, pool_maxsize=200)
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_requests(set_variables):
+    url, session = set_variables
+    req = AsyncDataRequests(url, session=session)
+
+    async def run():
+        t = time.time()
+        res = await asyncio.gather(*[
+            req.get_data('OHLC', pair='P{}'.format(k)) for k in range(200)
+        ])
+        elapsed = time.time() - t
+        n_clients = len(OHLCStub.clients)
+        # Connections are kept alive
+        await req.get_data('OHLC', pair='P')
+        await session.close()
+
+        return res, elapsed, n_clients
+
+    res, elapsed, n_clients = asyncio.run(run())
+    assert elapsed < 2.
+    assert [list(r['result'])[0] for r in res] == [
+        'P{}'.format(k) for k in range(200)
+    ]
+    assert len(OHLCStub.clients) == n_clients <= 200
+    assert session.metrics('OHLC')['count'] == 201
+
+
+def test_deadline_and_cancel(set_variables, monkeypatch):
+    url, session = set_variables
+    monkeypatch.setattr(OHLCStub, 'delay', 1.)
+    dm = AsyncDataExchangeManager(['XXBTZUSD'], path=url, frequency=180,
+                                  timeout=0.2, session=session)
+
+    async def run():
+        # Test deadline
+        t = time.time()
+        with pytest.raises(Timeout):
+            await dm.get_data('OHLC', pair='XXBTZUSD', interval=1)
+
+        assert time.time() - t < 0.5
+
+        # Test cancellation
+        task = asyncio.ensure_future(dm.req.get_data('OHLC', pair='X'))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        OHLCStub.delay = 0.
+        data = await dm.req.get_data('OHLC', pair='X')
+        await session.close()
+
+        return data
+
+    assert asyncio.run(run())['error'] == []
+
+
+def test_exchange_manager(set_variables, monkeypatch):
+    url, session = set_variables
+    monkeypatch.setattr(OHLCStub, 'delay', 0.)
+    assets = ['XXBTZUSD', 'XETHZUSD']
+    kw = {'frequency': 180, 'n_min_obs': 10, 'ohlcv': 'cv', 'path': url}
+    dm = AsyncDataExchangeManager(assets, session=session, **kw)
+
+    async def run():
+        data = await dm.get_data('OHLC', pair='XXBTZUSD', interval=1)
+        await session.close()
+
+        return data
+
+    # Test same output than the blocking manager
+    expected = DataExchangeManager(assets, **kw).get_data(
+        'OHLC', pair='XXBTZUSD', interval=1
+    )
+    data = asyncio.run(run())
+    assert data.shape == (10, 2, 2)
+    np.testing.assert_equal(data, expected)
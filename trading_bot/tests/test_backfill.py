@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+from urllib.parse import parse_qs, urlparse
+
+# External packages
+import numpy as np
+import pytest
+
+# Internal packages
+from trading_bot.backfill import (CHECKPOINT, Backfill, ohlc_to_frame,
+                                  trades_to_frame)
+from trading_bot.database import Manifest, read_range, resample
+from trading_bot.tools.call_counters import RateLimiter
+from trading_bot.trades_tape import BarBuilder, TradesRecorder, read_tape
+
+T0 = 17963 * 86400
+N = 600
+PAGE = 50
+
+
+def _trades():
+    # Two trades per minute over 300 minutes
+    t = T0 + 30 * np.arange(N) + 0.5
+    price = 100. + np.arange(N) % 7
+    return [[str(p), '0.5', float(x), 'b', 'l', '', i]
+            for i, (p, x) in enumerate(zip(price, t))]
+
+
+def _ohlc():
+    t = T0 + 60 * np.arange(N // 2)
+    return [[int(x), '1.', '2.', '0.5', '1.5', '1.2', '3.', 2] for x in t]
+
+
+TRADES, OHLC = _trades(), _ohlc()
+
+
+class KrakenStub(BaseHTTPRequestHandler):
+    """ Canned responses of the Kraken public API. """
+
+    n_errors = 0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        since = int(query.get('since', 0))
+        if KrakenStub.n_errors > 0:
+            KrakenStub.n_errors -= 1
+            ans = {'error': ['EAPI:Rate limit exceeded'], 'result': {}}
+
+        elif url.path.endswith('/Trades'):
+            rows = [r for r in TRADES if r[2] * 1e9 > since][:PAGE]
+            last = int(rows[-1][2] * 1e9) if rows else since
+            ans = {'error': [], 'result': {query['pair']: rows,
+                                           'last': str(last)}}
+
+        else:
+            rows = [r for r in OHLC if r[0] > since][:PAGE]
+            last = rows[-1][0] if rows else since
+            ans = {'error': [], 'result': {query['pair']: rows, 'last': last}}
+
+        body = json.dumps(ans).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def set_variables(tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KrakenStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = 'http://127.0.0.1:{}/0/public'.format(server.server_address[1])
+
+    yield url, str(tmp_path) + '/'
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_trades(set_variables):
+    url, path = set_variables
+    until = T0 + 60 * N
+    backfill = Backfill(['XXBTZUSD', 'XETHZUSD'], path=path, url=url,
+                        endpoint='Trades', n_jobs=2,
+                        limiter=RateLimiter(1000., 10))
+    report = backfill.run(until=until)
+
+    # Test paged trades are aggregated in minutely bars
+    assert report['XXBTZUSD']['requests'] == N // PAGE + 1
+    assert report['total']['rows'] == N
+    expected = trades_to_frame(TRADES)
+    for pair in ('XXBTZUSD', 'XETHZUSD'):
+        index, array = read_range(path, pair, T0, until)
+        np.testing.assert_equal(index, expected.index.values)
+        np.testing.assert_equal(array, expected.values)
+        assert backfill.load_checkpoint(pair) == int(TRADES[-1][2] * 1e9)
+
+    # Test resume from checkpoints
+    report = backfill.run(until=until)
+    assert report['total']['requests'] == 2
+    assert report['total']['rows'] == 0
+
+
+def test_ohlc(set_variables):
+    url, path = set_variables
+    KrakenStub.n_errors = 1
+    backfill = Backfill('XXBTZUSD', path=path, url=url, backoff=0.,
+                        limiter=RateLimiter(1000., 10))
+    report = backfill.run(since=T0 + 60 * 99)
+
+    # Test rate limit error is retried and pages are appended
+    assert report['XXBTZUSD']['rows'] == N // 2 - 100
+    manifest = Manifest.load(path, 'XXBTZUSD')
+    assert manifest.get()['first'] == T0 + 60 * 100
+    assert manifest.get()['last'] == OHLC[-1][0]
+    _, array = read_range(path, 'XXBTZUSD', T0, T0 + 86400)
+    np.testing.assert_equal(array, ohlc_to_frame(OHLC[100:]).values)
+
+    # Test history before the stored observations is written
+    os.remove(os.path.join(path, 'XXBTZUSD', CHECKPOINT))
+    report = backfill.run(since=0, until=T0 + 60 * 100)
+    assert report['XXBTZUSD']['first'] == T0
+    manifest = Manifest.load(path, 'XXBTZUSD')
+    assert manifest.get()['first'] == T0
+    assert manifest.get()['last'] == OHLC[-1][0]
+    _, array = read_range(path, 'XXBTZUSD', T0, T0 + 86400)
+    np.testing.assert_equal(array, ohlc_to_frame(OHLC).values)
+
+
+def test_tape(set_variables):
+    url, path = set_variables
+    until = TRADES[420][2]
+    recorder = TradesRecorder('XXBTZUSD', path=path, url=url,
+                              limiter=RateLimiter(1000., 10))
+    bars = BarBuilder('XXBTZUSD', timestep=10, path=path, chunksize=64)
+
+    # Test trades are appended to the tape
+    assert recorder.run(until=until)['total']['rows'] == 420
+    assert bars.update() == (T0, T0 + 30 * 419)
+    tape = read_tape(path, 'XXBTZUSD')
+    np.testing.assert_equal(tape['time'], [r[2] for r in TRADES[:420]])
+    assert recorder.load_checkpoint('XXBTZUSD') == int(TRADES[399][2] * 1e9)
+
+    # Test restart after a crash between a write and its checkpoint
+    with open(path + 'XXBTZUSD/trades.bin', 'ab') as f:
+        f.write(tape[:10].tobytes())
+
+    assert recorder.run()['total']['rows'] == N - 420
+    tape = read_tape(path, 'XXBTZUSD')
+    np.testing.assert_equal(tape['time'], [r[2] for r in TRADES])
+
+    # Test bars are built incrementally at any timestep
+    bars.update()
+    BarBuilder('XXBTZUSD', timestep=60, path=path).update()
+    price = tape['price']
+    data = np.stack([price, price, price, price, tape['volume']], axis=1)
+    end = T0 + 30 * N
+    for timestep in (10, 60):
+        index, array = resample(tape['time'].astype(np.int64), data,
+                                timestep)
+        result = read_range(path, 'XXBTZUSD', T0, end, timestep=timestep)
+        keep = ~np.isnan(result[1][:, 4])
+        np.testing.assert_equal(result[0][keep], index)
+        np.testing.assert_equal(result[1][keep], array)
+
+    assert Manifest.load(path, 'XXBTZUSD', 10).get()['last'] == end - 30
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+# External packages
+import numpy as np
+import pytest
+
+# Internal packages
+from trading_bot._client import _ClientStrategyBot
+from trading_bot.data_requests import TickerCache, get_bid, get_close
+from trading_bot.database import resample, write_bars
+from trading_bot.tools.decoders import decode_ohlc
+from trading_bot.tools.io import load_config_params
+from trading_bot.websocket_feed import KrakenFeed
+import trading_bot.data_requests as data_requests
+
+
+class KrakenStub(BaseHTTPRequestHandler):
+    """ Slow Ticker endpoint recording the requested pairs. """
+
+    requested = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        pairs = query['pair'][0].split(',')
+        KrakenStub.requested.append(pairs)
+        time.sleep(0.2)
+        result = {p: {'a': ['2.0', '1', '1.0'], 'b': ['1.0', '1', '1.0'],
+                      'c': ['1.5', '0.1']} for p in pairs}
+        body = json.dumps({'error': [], 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def set_variables(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KrakenStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    KrakenStub.requested = []
+    cache = TickerCache(ttl=60.)
+    monkeypatch.setattr(data_requests, 'ticker_cache', cache)
+    url = 'http://127.0.0.1:{}/0/public'.format(server.server_address[1])
+
+    yield url, cache
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_ticker_cache(set_variables):
+    url, cache = set_variables
+
+    # Test concurrent misses are merged and batched
+    calls = [(get_close, 'XXBTZUSD'), (get_bid, 'XXBTZUSD'),
+             (get_close, 'XETHZUSD'), (get_close, 'XLTCZUSD')]
+    res = {}
+    threads = [threading.Thread(target=lambda f=f, p=p, k=k: res.update({
+        k: f(p, path=url)
+    })) for k, (f, p) in enumerate(calls)]
+    threads[0].start()
+    time.sleep(0.05)
+    for thread in threads[1:]:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert res == {0: 1.5, 1: 1.0, 2: 1.5, 3: 1.5}
+    assert KrakenStub.requested == [['XXBTZUSD'], ['XETHZUSD', 'XLTCZUSD']]
+
+    # Test TTL
+    assert get_close('XETHZUSD,XXBTZUSD', path=url) == {
+        'XETHZUSD': 1.5, 'XXBTZUSD': 1.5
+    }
+    assert cache.info()['requests'] == 2
+    cache.ttl = 0.
+    get_close('XXBTZUSD', path=url)
+    assert cache.info()['requests'] == 3
+
+
+class OHLCStub(BaseHTTPRequestHandler):
+    """ OHLC endpoint answering the candles since the `since` cursor. """
+
+    candles = []
+    queries = []
+    missing = {}
+    delay = 0.
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        query = {k: v[0] for k, v in query.items()}
+        OHLCStub.queries.append(query)
+        time.sleep(OHLCStub.delay)
+        since = int(query.get('since', 0))
+        missing = OHLCStub.missing.get(query['pair'], ())
+        rows = [r for r in OHLCStub.candles
+                if r[0] >= since and r[0] not in missing][-720:]
+        result = {query['pair']: rows, 'last': rows[-2][0]}
+        body = json.dumps({'error': [], 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _candles(start, end):
+    return [[t, '1', '3', '0.5', str(t % 997), '1', str(t % 7), 1]
+            for t in range(start, end + 1, 60)]
+
+
+def test_incremental(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OHLCStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/0/public'.format(server.server_address[1])
+    t = 1600000020 // 60 * 60
+    monkeypatch.setattr(data_requests, 'now', lambda f=60: t // f * f)
+    OHLCStub.candles, OHLCStub.queries = _candles(t - 60000, t), []
+    kw = {'frequency': 180, 'n_min_obs': 10, 'ohlcv': 'ohlcv', 'path': url}
+    full = data_requests.DataExchangeManager(['XXBTZUSD'], **kw)
+    incr = data_requests.DataExchangeManager(
+        ['XXBTZUSD'], incremental=True, **kw
+    )
+
+    # Test same output than the full request
+    for k in range(5):
+        expected = full.get_data('OHLC', pair='XXBTZUSD', interval=1)
+        np.testing.assert_equal(
+            incr.get_data('OHLC', pair='XXBTZUSD', interval=1), expected
+        )
+        assert expected.shape == (10, 5)
+        # New candles and update of the current one
+        t += 60
+        OHLCStub.candles[-1][4] = '5'
+        OHLCStub.candles += _candles(t, t)
+
+    # Test only the new candles are requested
+    assert 'since' not in OHLCStub.queries[1]
+    assert [int(q['since']) for q in OHLCStub.queries[3::2]] == [
+        t - 60 * k for k in range(6, 2, -1)
+    ]
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_multi_asset(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OHLCStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/0/public'.format(server.server_address[1])
+    t = 1600000020 // 60 * 60
+    monkeypatch.setattr(data_requests, 'now', lambda f=60: t // f * f)
+    monkeypatch.setattr(OHLCStub, 'delay', 0.2)
+    monkeypatch.setattr(OHLCStub, 'missing', {'XETHZUSD': {t - 120}})
+    OHLCStub.candles, OHLCStub.queries = _candles(t - 6000, t), []
+    assets = ['XXBTZUSD', 'XETHZUSD', 'XLTCZUSD']
+    kw = {'frequency': 180, 'n_min_obs': 10, 'ohlcv': 'cv', 'path': url}
+    dm = data_requests.DataExchangeManager(assets, **kw)
+
+    # Test concurrent requests, about one round trip
+    t0 = time.time()
+    data = dm.get_data('OHLC', pair='XXBTZUSD', interval=1)
+    assert time.time() - t0 < 0.4
+    assert sorted(q['pair'] for q in OHLCStub.queries) == sorted(assets)
+
+    # Test alignment on a common index
+    assert data.shape == (10, 3, 2)
+    expected = data_requests.DataExchangeManager(['XXBTZUSD'], **kw).get_data(
+        'OHLC', pair='XXBTZUSD', interval=1
+    )
+    np.testing.assert_equal(data[:, 0], expected)
+    np.testing.assert_equal(data[:, 2], expected)
+    assert np.isnan(data[-1, 1]).all()
+    np.testing.assert_equal(data[:-1, 1], expected[:-1])
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_hybrid(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OHLCStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/0/public'.format(server.server_address[1])
+    t = 1600000020 // 300 * 300
+    monkeypatch.setattr(data_requests, 'now', lambda f=60: t // f * f)
+    OHLCStub.candles, OHLCStub.queries = _candles(t - 180000, t), []
+    path = str(tmp_path) + '/'
+    # Data base until 600 minutes ago, with partial bars on the seam
+    index, array = decode_ohlc(OHLCStub.candles[:-600])
+    array[-100:, 3] = -1.
+    write_bars(index, array, path, 'XXBTZUSD')
+    dm = data_requests.HybridDataManager(
+        ['XXBTZUSD'], path=url, db_path=path, frequency=300, n_min_obs=500,
+    )
+
+    for k in range(3):
+        # Test stitched window is the same as aggregated bars
+        data = dm.get_data('OHLC', pair='XXBTZUSD', interval=1)
+        index, array = decode_ohlc(OHLCStub.candles)
+        index, array = resample(index[index < t], array[index < t], 300)
+        np.testing.assert_equal(data, array[-500:])
+        assert dm.index[-1] == t - 300
+        t += 300
+        OHLCStub.candles += _candles(t - 240, t)
+
+    # Test the data base is read once and only new candles are requested
+    assert dm.n_db_reads == 1
+    assert [int(q.get('since', 0)) for q in OHLCStub.queries] == [
+        0, t - 960, t - 660
+    ]
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_unavailable(monkeypatch):
+    sleeps, answers = [], []
+    monkeypatch.setattr(data_requests.time, 'sleep', sleeps.append)
+    dm = data_requests.DataExchangeManager(['XXBTZUSD'])
+
+    def get_data(*args, **kwargs):
+        answers.append(kwargs)
+
+        return {'error': ['EService:Unavailable']}
+
+    monkeypatch.setattr(dm.req, 'get_data', get_data)
+
+    # Test no wait after the last attempt and the error of Kraken is raised
+    with pytest.raises(data_requests.ExchangeError, match='Unavailable'):
+        dm.get_data('OHLC', pair='XXBTZUSD', interval=1)
+
+    n = dm.req.session.max_retries + 1
+    assert len(answers) == n and sleeps == [2 ** k for k in range(n - 1)]
+
+
+def test_websocket_frequency(monkeypatch):
+    t = 1600000020 // 7200 * 7200
+    monkeypatch.setattr(data_requests, 'now', lambda f=60: t // f * f)
+    candles, requests = _candles(t - 50 * 7200, t), []
+    feed = KrakenFeed(['XXBTZUSD'], size=720)
+    feed._ready.set()
+    dm = data_requests.DataExchangeManager(
+        ['XXBTZUSD'], frequency=7200, n_min_obs=50, ohlcv='c'
+    )
+    dm.feed = feed
+    monkeypatch.setattr(dm, '_request_data', lambda *a, **kw: (
+        requests.append(kw) or {'XXBTZUSD': candles}
+    ))
+
+    # Test the feed keeps the candles of `n_min_obs` bars of 2 hours
+    for k in range(2):
+        data = dm.get_data('OHLC', pair='XXBTZUSD', interval=1)
+        assert data.shape == (50, 1)
+        np.testing.assert_equal(data[:, 0], [
+            float(r[4]) for r in candles if r[0] % 7200 == 60
+        ])
+
+    assert len(requests) == 1
+    assert len(feed.candles[('XBT/USD', 1)]) == 50 * 120 + 1
+
+
+@pytest.mark.parametrize('source', ['exchange', 'hub', 'hybrid'])
+def test_example_configuration(source):
+    cfg = load_config_params(os.path.join(
+        os.path.dirname(__file__), '../../strategies/another_example/'
+        'configuration.yaml'
+    ))
+    kwargs = dict(cfg['get_data_instance'])
+    kwargs.pop('args'), kwargs.pop('kwargs'), kwargs.pop('source_data')
+
+    # Test the data managers accept the keys of the example configuration
+    dm = _ClientStrategyBot._handler[source](**kwargs)
+    assert dm.assets == ['XXBTZUSD'] and dm.n_min_obs == 50
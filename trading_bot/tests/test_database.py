@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+import os
+import time
+
+# External packages
+import numpy as np
+import pandas as pd
+import pytest
+
+# Internal packages
+from trading_bot.database import (Manifest, build_rollups, get_array,
+                                  get_frame, iter_range, list_tiers,
+                                  load_partition, partition_cache,
+                                  partition_size, read_panel, read_range,
+                                  resample, save_partition, set_partition,
+                                  update_rollups)
+from trading_bot.data_requests import (append_data, data_base_requests,
+                                       save_data)
+
+DAY = 17963
+T0 = DAY * 86400
+
+
+@pytest.fixture()
+def set_variables(tmp_path):
+    index = T0 + 60 * np.arange(0, 2880, dtype=np.int64)
+    df = pd.DataFrame(
+        {f: np.arange(2880, dtype=np.float64) + k
+         for k, f in enumerate('ohlcv')},
+        index=index,
+    )
+    path = str(tmp_path) + '/'
+    save_data(df, 'asset', path=path)
+
+    return df, path
+
+
+def test_partition(set_variables):
+    df, path = set_variables
+    array = load_partition(path, 'asset', DAY)
+
+    # Test memory-mapped partition
+    assert isinstance(array, np.memmap)
+    assert array.shape == (5, 1440)
+    assert partition_size(array) == 1440
+
+    # Test zero-copy slices
+    sub = get_array(array, slice(10, 20), 'hlc')
+    assert np.shares_memory(sub, array)
+    np.testing.assert_equal(sub[:, 2], df.loc[:, 'c'].values[10:20])
+    sub = get_frame(array, DAY, slice(10, 20), 'c')
+    assert sub.index[0] == T0 + 600
+
+    # Test missing observations
+    save_partition(set_partition(df.iloc[:100], DAY), path, 'asset', DAY)
+    array = load_partition(path, 'asset', DAY)
+    assert partition_size(array) == 100
+    assert np.isnan(array[:, 100:]).all()
+
+
+def test_manifest(set_variables):
+    df, path = set_variables
+    manifest = Manifest.load(path, 'asset')
+
+    # Test records updated by save_data
+    assert len(manifest) == 2
+    assert manifest.get()['day'] == DAY + 1
+    assert manifest.get(DAY)['first'] == T0
+    assert manifest.get(DAY)['last'] == T0 + 86340
+    assert manifest.get(DAY)['n_rows'] == 1440
+    assert manifest.get(DAY)['offset'] > 0
+    with pytest.raises(FileNotFoundError):
+        manifest.get(DAY + 2)
+
+    # Test binary search of partitions
+    assert manifest.find(T0 + 600, T0 + 1200)['day'].tolist() == [DAY]
+    assert manifest.find(T0, T0 + 86400)['day'].tolist() == [DAY, DAY + 1]
+    assert manifest.find(T0 + 2 * 86400, T0 + 3 * 86400).size == 0
+
+    # Test manifest rebuilt from partitions
+    loaded = Manifest(path, 'asset')
+    for day in (DAY, DAY + 1):
+        loaded.update(day, load_partition(path, 'asset', day))
+
+    np.testing.assert_equal(loaded.index['n_rows'], manifest.index['n_rows'])
+
+    # Test manifest rebuilt lazily if it is missing or stale
+    os.remove(path + 'asset/manifest.npy')
+    assert len(Manifest.load(path, 'asset')) == 2
+    assert os.path.exists(path + 'asset/manifest.npy')
+    time.sleep(0.02)
+    new = df.iloc[:10].set_index(df.index[:10] + 2 * 86400)
+    save_partition(set_partition(new, DAY + 2), path, 'asset', DAY + 2)
+    manifest = Manifest.load(path, 'asset')
+    assert manifest.get()['day'] == DAY + 2 and manifest.get()['n_rows'] == 10
+    loaded = Manifest.load(path, 'asset')
+    np.testing.assert_equal(loaded.index, manifest.index)
+    assert Manifest.load(path, 'asset').index is loaded.index
+
+
+def test_partition_cache(set_variables):
+    df, path = set_variables
+    partition_cache.clear()
+
+    # Test hits and misses
+    array = load_partition(path, 'asset', DAY)
+    assert load_partition(path, 'asset', DAY) is array
+    assert partition_cache.info()['hits'] == 1
+    assert partition_cache.info()['misses'] == 1
+
+    # Test invalidation when the partition is replaced
+    save_partition(set_partition(df.iloc[:100], DAY), path, 'asset', DAY)
+    array = load_partition(path, 'asset', DAY)
+    assert partition_size(array) == 100
+    assert partition_cache.info()['misses'] == 2
+
+    # Test size bound
+    maxsize, partition_cache.maxsize = partition_cache.maxsize, 1
+    load_partition(path, 'asset', DAY + 1)
+    assert len(partition_cache) == 1
+    partition_cache.maxsize = maxsize
+
+
+def test_read_range(set_variables):
+    df, path = set_variables
+
+    # Test multi-day range stitched in one array
+    start, end = T0 + 86400 - 600, T0 + 86400 + 600
+    index, array = read_range(path, 'asset', start, end, fields='oc')
+    assert index[0] == start and index[-1] == end
+    np.testing.assert_equal(array, df.loc[start: end, ['o', 'c']].values)
+
+    # Test zero-copy single partition range
+    index, array = read_range(path, 'asset', T0 + 60, T0 + 600, n_jobs=1)
+    assert np.shares_memory(array, load_partition(path, 'asset', DAY))
+
+    # Test preallocated array and chunks aligned on the minutely grid
+    out = np.zeros((2880, 5))
+    index, array = read_range(path, 'asset', T0 - 86400, T0 + 2 * 86400,
+                              out=out)
+    assert np.shares_memory(array, out)
+    assert index[0] == T0 and array.shape == (2880, 5)
+    np.testing.assert_equal(array, df.values)
+    chunks = list(iter_range(path, 'asset', T0 + 30, T0 + 86400 + 30))
+    assert [t for t, _ in chunks] == [T0 + 60, T0 + 86400]
+    assert [c.shape[0] for _, c in chunks] == [1439, 1]
+
+
+def test_data_base_requests(set_variables):
+    df, path = set_variables
+    start, end = T0 + 86400 - 600, T0 + 86400 + 600
+    data = data_base_requests('asset', 'oc', start=start, end=end, path=path)
+    assert data.index[0] == start
+    assert data.index[-1] == end
+    assert data.shape == (21, 2)
+
+
+def test_panel(set_variables):
+    df, path = set_variables
+    save_data(df.iloc[1000:2000] * 2, 'other', path=path)
+
+    # Test common timestamp grid
+    start, end = T0 + 60 * 990, T0 + 60 * 2010
+    index, array = read_panel(path, ['asset', 'other'], start, end, 'cv')
+    assert array.shape == (1021, 2, 2)
+    assert index[0] == start and index[-1] == end
+    np.testing.assert_equal(array[:, 0], df.loc[start: end, ['c', 'v']])
+    assert np.isnan(array[:10, 1]).all() and np.isnan(array[-11:, 1]).all()
+    np.testing.assert_equal(array[10: -11, 1], 2 * array[10: -11, 0])
+
+    # Test labelled view
+    data = data_base_requests(['asset', 'other'], 'cv', start=start, end=end,
+                              path=path, panel=True)
+    assert data.shape == (1021, 4)
+    assert data.loc[:, ('other', 'c')].notna().sum() == 1000
+
+
+def test_resample(set_variables):
+    df, path = set_variables
+    index, array = resample(df.index.values, df.values, 900)
+
+    # Test bars aligned on boundaries
+    assert index.size == 192
+    np.testing.assert_equal(index % 900, 0)
+    np.testing.assert_equal(array[:, 0], df.iloc[::15, 0].values)
+    np.testing.assert_equal(array[:, 1], df.iloc[14::15, 1].values)
+    np.testing.assert_equal(array[:, 2], df.iloc[::15, 2].values)
+    np.testing.assert_equal(array[:, 3], df.iloc[14::15, 3].values)
+    np.testing.assert_equal(
+        array[:, 4], df.iloc[:, 4].values.reshape([-1, 15]).sum(axis=1)
+    )
+
+    # Test missing observations are ignored
+    values = df.values.copy()
+    values[14::15] = np.nan
+    _, array = resample(df.index.values, values, 900)
+    np.testing.assert_equal(array[:, 3], df.iloc[13::15, 3].values)
+
+    # Test panel
+    _, panel = resample(df.index.values, np.stack([df.values] * 2, 1), 900)
+    assert panel.shape == (192, 2, 5)
+    np.testing.assert_equal(panel[:, 1], resample(df.index.values, df.values,
+                                                  900)[1])
+
+
+def test_rollups(set_variables):
+    df, path = set_variables
+    build_rollups('asset', path=path, tiers=(900, 86400))
+    assert list_tiers(path, 'asset') == [900, 86400]
+
+    # Test tiers are equal to aggregated minutely data
+    index, array = read_range(path, 'asset', T0, T0 + 86400, timestep=86400)
+    assert index.tolist() == [T0, T0 + 86400]
+    np.testing.assert_equal(array, resample(df.index.values, df.values,
+                                            86400)[1])
+    data = data_base_requests('asset', 'hc', 3600, start=T0, end=T0 + 86399,
+                              path=path)
+    assert data.shape == (24, 2)
+    np.testing.assert_equal(data.values[:, 1], df.iloc[59:1440:60, 3].values)
+
+    # Test tiers are updated
+    df.iloc[-10:] = 0.
+    save_data(df.iloc[1440:], 'asset', path=path)
+    update_rollups(path, 'asset', int(df.index[-10]), int(df.index[-1]))
+    _, array = read_range(path, 'asset', T0 + 86400, T0 + 86400,
+                          timestep=86400)
+    assert array[0, 1] == df.iloc[1440:-10, 1].max()
+    assert array[0, 3] == 0.
+
+
+def test_append_data(set_variables):
+    df, path = set_variables
+    save_data(df.iloc[:2000], 'asset', path=path)
+    name = path + 'asset/19-03-09.npy'
+    inode = os.stat(name).st_ino
+
+    # Test only new rows are appended in the tail of the partition
+    assert append_data(df.iloc[1500:2500], 'asset', path) == (
+        T0 + 60 * 2000, T0 + 60 * 2499
+    )
+    # Partition replaced atomically
+    assert os.stat(name).st_ino != inode
+    assert not os.path.exists(name + '.tmp')
+    manifest = Manifest.load(path, 'asset')
+    assert manifest.get()['last'] == T0 + 60 * 2499
+    assert manifest.get()['n_rows'] == 2500 - 1440
+    assert append_data(df.iloc[:2500], 'asset', path) is None
+
+    # Test new partition
+    new = df.iloc[-10:].copy()
+    new.index += 86400
+    append_data(new, 'asset', path)
+    manifest = Manifest.load(path, 'asset')
+    assert len(manifest) == 3
+    index, array = read_range(path, 'asset', T0, T0 + 3 * 86400)
+    assert index[-1] == new.index[-1]
+    np.testing.assert_equal(array[:2500], df.values[:2500])
+    assert np.isnan(array[2500: -10]).all()
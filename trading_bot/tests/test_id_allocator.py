@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+import os
+from pickle import Pickler
+
+# External packages
+
+# Internal packages
+from trading_bot.id_allocator import OrderIdAllocator
+
+
+def test_id_allocator(tmpdir):
+    path = str(tmpdir.join('id_order.bin'))
+    with open(str(tmpdir.join('id_order.dat')), 'wb') as f:
+        Pickler(f).dump(41)
+
+    # Migrated from the pickled counter, same layout of IDs
+    alloc = OrderIdAllocator(path, 7, block=10)
+    assert not os.path.exists(str(tmpdir.join('id_order.dat')))
+    ids = [next(alloc) for _ in range(25)]
+    assert ids[:2] == [42007, 43007] and ids[-1] == 66007
+    assert alloc.n_sync == 3
+
+    # A crash skips the rest of the reserved block, never reuses an ID
+    crashed = OrderIdAllocator(path, 7, block=10)
+    assert next(crashed) == 75007
+    crashed.close()
+
+    # A clean close persists the exact counter
+    alloc = OrderIdAllocator(path, 7, block=10)
+    assert next(alloc) == 76007
+    alloc.close()
+    alloc = OrderIdAllocator(path, 7, block=10)
+    assert next(alloc) == 77007
+
+    # Restart at 0 after the max of a signed 32-bit integer
+    alloc.counter = alloc.reserved = alloc.max_counter - 1
+    assert next(alloc) == 2147483007
+    assert next(alloc) == 7 and next(alloc) == 1007
+    assert alloc.reserved == 10
+    alloc.close()
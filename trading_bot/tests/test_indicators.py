@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+
+# External packages
+import numpy as np
+import pytest
+
+# Internal packages
+from trading_bot.indicators import (EWMA, EWMStd, IsoVol, RollingMax,
+                                    RollingMean, RollingMin, RollingStd,
+                                    ZScore, load_indicators,
+                                    save_indicators)
+
+
+def _stream(indicator, X):
+    return np.array([indicator.update(x) for x in X])
+
+
+def test_values():
+    # Values of the corresponding fynance functions, hard-coded
+    X = np.array([60., 100., 80., 120., 160., 80.])
+    sd = 16.32993162 * np.array([0., 1.22474487, 1., 1., 2., 2.])
+    r = 1.22474487
+
+    np.testing.assert_allclose(_stream(RollingMean(3), X),
+                               [60., 80., 80., 100., 120., 120.])
+    np.testing.assert_allclose(_stream(RollingStd(3), X), sd, rtol=1e-8)
+    np.testing.assert_allclose(_stream(RollingStd(3, ddof=1), X)[1:],
+                               [28.28427125, 20., 20., 40., 40.], rtol=1e-8)
+    np.testing.assert_allclose(_stream(ZScore(3), X)[1:],
+                               [1., 0., r, r, -r], rtol=1e-8)
+    np.testing.assert_equal(_stream(RollingMin(3), X),
+                            [60., 60., 60., 80., 80., 80.])
+    np.testing.assert_equal(_stream(RollingMax(3), X),
+                            [60., 100., 100., 120., 160., 160.])
+    np.testing.assert_allclose(_stream(EWMA(w=3), X),
+                               [60., 80., 80., 100., 130., 105.])
+    np.testing.assert_allclose(_stream(EWMA(alpha=0.5), X),
+                               [60., 80., 80., 100., 130., 105.])
+    np.testing.assert_allclose(
+        _stream(EWMStd(w=3), X),
+        [0., 14.14213562, 10., 15.8113883, 23.97915762, 24.49489743],
+        rtol=1e-8
+    )
+    iv = IsoVol(target_vol=0.5, leverage=2, period=12, half_life=3)
+    np.testing.assert_allclose(
+        _stream(iv, [95., 100., 85., 105., 110., 90.]),
+        [1., 1., 2., 1.28407693, 0.78278978, 1.07186485],
+        rtol=1e-8
+    )
+
+
+def test_indicators():
+    # Same values as the functions of fynance on the whole series
+    fy = pytest.importorskip('fynance')
+    X = 100. * np.exp(np.cumsum(np.random.RandomState(0).randn(200) / 50.))
+    w = 10
+
+    ma, sd = fy.sma(X, w=w), fy.smstd(X, w=w)
+    np.testing.assert_allclose(_stream(RollingMean(w), X), ma)
+    np.testing.assert_allclose(_stream(RollingStd(w), X), sd, rtol=1e-6)
+    np.testing.assert_allclose(_stream(RollingStd(w, ddof=1), X)[1:],
+                               fy.smstd(X, w=w, ddof=1)[1:], rtol=1e-6)
+    np.testing.assert_allclose(_stream(ZScore(w), X)[1:],
+                               (X - ma)[1:] / sd[1:], rtol=1e-5)
+    np.testing.assert_equal(_stream(RollingMin(w), X), fy.roll_min(X, w=w))
+    np.testing.assert_equal(_stream(RollingMax(w), X), fy.roll_max(X, w=w))
+    np.testing.assert_allclose(_stream(EWMA(w=w), X), fy.ema(X, w=w))
+    np.testing.assert_allclose(_stream(EWMA(alpha=0.9), X),
+                               fy.ema(X, alpha=0.9))
+    np.testing.assert_allclose(_stream(EWMStd(w=w), X), fy.emstd(X, w=w),
+                               atol=1e-10)
+
+    # Iso-volatility with the returns until the previous bar
+    np.testing.assert_allclose(_stream(IsoVol(), X), fy.iso_vol(X))
+    kwargs = {'target_vol': 0.5, 'leverage': 2, 'period': 12, 'half_life': 3}
+    np.testing.assert_allclose(_stream(IsoVol(**kwargs), X),
+                               fy.iso_vol(X, **kwargs))
+
+
+def test_save_load(tmpdir):
+    path = str(tmpdir.join('indicators.json'))
+    assert load_indicators(path) == (None, {})
+
+    X = np.random.RandomState(1).rand(50) + 1.
+    indicators = {'ma': RollingMean(5), 'iv': IsoVol(), 'min': RollingMin(5),
+                  'z': ZScore(7, ddof=1), 'sd': EWMStd()}
+    for v in indicators.values():
+        v.extend(X[:30])
+
+    save_indicators(indicators, path, TS=1600000000)
+    loaded, info = load_indicators(path)
+    assert info == {'TS': 1600000000}
+
+    # Restarted indicators continue identically
+    for k, v in indicators.items():
+        assert type(loaded[k]) is type(v) and loaded[k].n == 30
+        np.testing.assert_equal(_stream(loaded[k], X[30:]),
+                                _stream(v, X[30:]))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+# External packages
+import numpy as np
+import pytest
+
+# Internal packages
+from trading_bot.market_data import HubDataManager, MarketDataHub, _key
+import trading_bot.data_requests as data_requests
+
+
+class KrakenStub(BaseHTTPRequestHandler):
+    """ OHLC endpoint counting the requests. """
+
+    n_requests = 0
+
+    def do_GET(self):
+        KrakenStub.n_requests += 1
+        result = {'XXBTZUSD': [[0, '1', '1', '1', '1', '1', '1', 1]],
+                  'last': 0}
+        body = json.dumps({'error': [], 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Conn:
+    """ Connection to a strategy bot storing the sent messages. """
+
+    state = 'up'
+
+    def __init__(self):
+        self.msg = []
+
+    def send(self, msg):
+        self.msg.append(msg)
+
+
+@pytest.fixture()
+def set_variables():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KrakenStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    KrakenStub.n_requests = 0
+    url = 'http://127.0.0.1:{}/0/public'.format(server.server_address[1])
+
+    yield url
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_hub(set_variables):
+    url = set_variables
+    conns = {1: Conn(), 2: Conn(), 3: Conn()}
+    hub = MarketDataHub(conns, path=url, delay=0.)
+    kwargs = {'pair': 'XXBTZUSD', 'interval': 1}
+
+    # Test one request per bar fanned out to subscribed bots
+    hub.subscribe(1, ('OHLC',), kwargs)
+    hub.subscribe(2, ('OHLC',), kwargs)
+    t = time.time()
+    assert len(hub.poll(t)) == 1
+    assert hub.poll(t) == []
+    assert KrakenStub.n_requests == 1
+    assert len(conns[1].msg) == len(conns[2].msg) == 1
+    assert conns[3].msg == []
+    k, (key, ts, result) = conns[1].msg[0]
+    assert k == 'market_data' and ts == t // 60 * 60
+    assert 'XXBTZUSD' in result
+
+    # Test new subscriber receives the current bar
+    hub.subscribe(3, ('OHLC',), kwargs)
+    assert len(conns[3].msg) == 1
+    assert hub.poll(t) == []
+
+    # Test next bar and unsubscribe
+    hub.unsubscribe(1)
+    hub.poll(t + 60)
+    assert KrakenStub.n_requests == 2
+    assert len(conns[1].msg) == 1 and len(conns[2].msg) == 2
+
+    # Test requests follow the bars of the subscribers, not the interval
+    hub = MarketDataHub(conns, path=url, delay=0.)
+    hub.subscribe(1, ('OHLC',), kwargs, frequency=7200)
+    hub.subscribe(2, ('OHLC',), kwargs, frequency=3600)
+    t0 = t // 7200 * 7200
+    n = KrakenStub.n_requests
+    assert len(hub.poll(t0)) == 1 and hub.poll(t0 + 60) == []
+    assert len(hub.poll(t0 + 3600)) == 1
+    assert KrakenStub.n_requests == n + 2
+    assert hub.next_time() % 3600 == 0
+    hub.unsubscribe(2)
+    assert hub.poll(t0 + 5400) == [] and len(hub.poll(t0 + 7200)) == 1
+
+    # Test data manager of strategy bot waits the published answer
+    dm = HubDataManager(['XXBTZUSD'], path=url, frequency=60, timeout=0.1)
+    dm.put(conns[2].msg[-1][1])
+    assert dm._get_data('OHLC', **kwargs) == result
+    n = KrakenStub.n_requests
+    dm.data.clear()
+    dm._get_data('OHLC', **kwargs)
+    assert KrakenStub.n_requests == n + 1
+
+
+def test_hub_panel(set_variables, monkeypatch):
+    url = set_variables
+    t = 1600000020 // 60 * 60
+    monkeypatch.setattr(data_requests, 'now', lambda f=60: t // f * f)
+    assets = ['XXBTZUSD', 'XETHZUSD']
+    dm = HubDataManager(assets, path=url, frequency=120, n_min_obs=3,
+                        ohlcv='c', timeout=0.1)
+    conn = Conn()
+    dm.subscribe(conn, 'OHLC', pair='XBTUSD', interval=1)
+
+    # Test each asset is subscribed and read from the hub without request
+    assert [m[1]['kwargs']['pair'] for m in conn.msg] == assets
+    assert all(m[1]['frequency'] == 120 for m in conn.msg)
+    for k, asset in enumerate(assets):
+        rows = [[x, '1', '1', '1', str(x + k), '1', '1', 1]
+                for x in range(t - 600, t + 1, 60)]
+        dm.put((_key(('OHLC',), {'pair': asset, 'interval': 1}),
+                time.time() + 60, {asset: rows, 'last': t}))
+
+    data = dm.get_data('OHLC', pair='XBTUSD', interval=1)
+    assert KrakenStub.n_requests == 0
+    x = np.arange(t - 240, t + 1, 120, dtype=np.float64)
+    np.testing.assert_equal(data[:, :, 0], np.stack([x, x + 1], axis=1))
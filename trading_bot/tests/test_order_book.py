@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+from multiprocessing import Pool
+
+# External packages
+import numpy as np
+
+# Internal packages
+from trading_bot.order_book import (BookFeed, L2Book, SharedBook,
+                                    book_checksum, get_best_ask,
+                                    get_best_bid)
+import trading_bot.order_book as order_book
+
+
+def _read_best(pair):
+    return SharedBook(pair).best(max_age=60.)
+
+
+def test_l2_book():
+    book = L2Book(depth=3)
+    book.snapshot(
+        [['10.20', '1.000', '1.'], ['10.10', '0.500', '1.'],
+         ['10.30', '2.000', '1.']],
+        [['10.00', '1.500', '1.'], ['9.90', '3.000', '1.']],
+    )
+    book.update(
+        asks=[['10.10', '0.00000000', '2.'], ['10.15', '0.250', '2.'],
+              ['10.40', '1.000', '2.', 'r']],
+        bids=[['10.05', '0.100', '3.'], ['9.80', '1.000', '3.']],
+    )
+    # Levels are sorted and truncated to the depth
+    assert book.best() == (10.05, 10.15)
+    assert book.time == 3.
+    bids, asks = book.arrays()
+    np.testing.assert_equal(bids, [[10.05, .1], [10., 1.5], [9.9, 3.]])
+    np.testing.assert_equal(asks, [[10.15, .25], [10.2, 1.], [10.3, 2.]])
+    assert book.checksum() == book_checksum(
+        [('10.15', '0.250'), ('10.20', '1.000'), ('10.30', '2.000')],
+        [('10.05', '0.100'), ('10.00', '1.500'), ('9.90', '3.000')],
+    )
+
+
+def test_book_feed(monkeypatch):
+    rest = {'bid': 0., 'ask': 0.}
+    monkeypatch.setattr(order_book, 'get_bid', lambda p, path: rest['bid'])
+    monkeypatch.setattr(order_book, 'get_ask', lambda p, path: rest['ask'])
+    monkeypatch.setattr(order_book, '_books', {})
+    feed = BookFeed(['TSTUSD'], depth=10)
+    try:
+        # Not published yet
+        assert get_best_bid('TSTUSD') == 0.
+
+        feed._handle([1, {'as': [['2.0', '1', '1.']],
+                          'bs': [['1.0', '1', '1.']]}, 'book-10', 'TST/USD'],
+                     1.)
+        book = L2Book()
+        book.snapshot([['2.0', '1']], [['1.5', '2'], ['1.0', '1']])
+        feed._handle([1, {'b': [['1.5', '2', '2.']],
+                          'c': str(book.checksum())}, 'book-10', 'TST/USD'],
+                     2.)
+        # Read without network call, in this process and in another one
+        assert get_best_bid('TSTUSD', max_age=np.inf) == 1.5
+        assert get_best_ask('XTSTZUSD', max_age=np.inf) == 2.
+        with Pool(1) as pool:
+            assert pool.apply(_read_best, ('TST/USD',)) is None
+            feed.shared['TST/USD'].touch()
+            assert pool.apply(_read_best, ('TST/USD',)) == (1.5, 2.)
+
+        # A checksum mismatch invalidates the book until the next snapshot
+        feed._handle([1, {'a': [['1.9', '1', '3.']]}, {'c': '1'},
+                      'book-10', 'TST/USD'], 3.)
+        assert feed.n_checksum_errors == 1
+        assert get_best_ask('TSTUSD', max_age=np.inf) == 0.
+
+    finally:
+        feed.stop()
+
+    # Removed with its publisher
+    assert get_best_ask('TSTUSD', max_age=np.inf) == 0.
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+import time
+
+# External packages
+import pytest
+
+# Internal packages
+from trading_bot.prefetch import Prefetcher
+
+
+class DataManager:
+    """ Incremental data manager counting the candles it requests. """
+
+    incremental = True
+
+    def __init__(self):
+        self.calls = []
+        self.candles = []
+        self.n_bars = 0
+
+    def get_data(self, *args, **kwargs):
+        # Only the bars since the last request are requested
+        new = list(range(len(self.candles), self.n_bars))
+        self.calls.append((args, kwargs, new))
+        self.candles += new
+
+        return list(self.candles)
+
+
+def test_prefetcher():
+    DM = DataManager()
+    prefetcher = Prefetcher(DM, ('OHLC',), {'interval': 1}, lead=0.1)
+
+    # Candles until the previous bar are prefetched, the prefetched result
+    # is kept and only the final bar is requested at the boundary
+    DM.n_bars = 5
+    prefetcher.schedule(time.time())
+    prefetcher._thread.join()
+    assert prefetcher.data == [0, 1, 2, 3, 4]
+    DM.n_bars = 6
+    assert prefetcher.get_data() == [0, 1, 2, 3, 4, 5]
+    assert [call[2] for call in DM.calls] == [[0, 1, 2, 3, 4], [5]]
+    assert DM.calls[0][:2] == (('OHLC',), {'interval': 1})
+    assert prefetcher.metrics()['count'] == 1 and prefetcher.data is None
+
+    # A late prefetch is waited and a cancelled one is not done
+    DM.n_bars = 7
+    prefetcher.schedule(time.time())
+    assert prefetcher.get_data()[-1] == 6 and len(DM.calls) == 4
+    prefetcher.schedule(time.time() + 10.)
+    prefetcher.stop()
+    assert len(DM.calls) == 4
+
+
+def test_not_incremental():
+    DM = DataManager()
+    DM.incremental = False
+    with pytest.raises(ValueError):
+        Prefetcher(DM)
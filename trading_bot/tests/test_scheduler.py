@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+from threading import Timer
+import time
+
+# External packages
+
+# Internal packages
+from trading_bot.scheduler import BarScheduler
+
+
+def test_bar_scheduler():
+    scheduler = BarScheduler(1, offset=100.)
+    assert abs(scheduler.time() - time.time() - 100.) < 0.01
+    t = scheduler.next_boundary()
+    assert t % 1 == 0 and 0 < t - scheduler.time() <= 1
+
+    # Test the sleep until the boundary and the drift
+    assert scheduler.wait(t)
+    assert 0 <= scheduler.time() - t < 0.05
+    assert scheduler.metrics()['count'] == 1
+    assert 0 <= scheduler.metrics()['max'] < 0.05
+
+    # Test a control message wakes up the scheduler early
+    Timer(0.1, scheduler.wake).start()
+    t0 = time.monotonic()
+    assert not scheduler.wait(t + 10)
+    assert 0.09 < time.monotonic() - t0 < 0.5
+    assert scheduler.metrics()['count'] == 1
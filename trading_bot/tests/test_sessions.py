@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+# External packages
+import pytest
+from requests.exceptions import HTTPError
+
+# Internal packages
+from trading_bot.data_requests import DataRequests
+from trading_bot.tools.sessions import PooledSession, ThreadedAsyncSession
+
+
+class Stub(BaseHTTPRequestHandler):
+    """ Answer `n_errors` server errors and then a JSON answer. """
+
+    protocol_version = 'HTTP/1.1'
+    n_errors = 0
+    clients = set()
+
+    def do_GET(self):
+        Stub.clients.add(self.client_address)
+        if self.path.endswith('/Moved'):
+            self.send_response(301)
+            self.send_header('Location', self.path[:-5] + 'Time')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+            return
+
+        if Stub.n_errors > 0:
+            Stub.n_errors -= 1
+            status, body = 503, b'unavailable'
+
+        else:
+            status, body = 200, b'{"error": [], "result": {}}'
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def set_variables():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Stub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    Stub.clients.clear()
+    session = PooledSession(max_retries=2, backoff=0.)
+    url = 'http://127.0.0.1:{}/0/public'.format(server.server_address[1])
+
+    yield url, session
+
+    session.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_session(set_variables):
+    url, session = set_variables
+    req = DataRequests(url, session=session)
+
+    # Test connection kept alive
+    for _ in range(5):
+        assert req.get_data('Ticker', pair='XXBTZUSD')['error'] == []
+
+    assert len(Stub.clients) == 1
+    assert session.metrics('Ticker')['count'] == 5
+
+    # Test bounded retries
+    Stub.n_errors = 2
+    assert req.get_data('Time') == {'error': [], 'result': {}}
+    assert session.metrics('Time')['errors'] == 2
+    Stub.n_errors = 3
+    with pytest.raises(HTTPError):
+        req.get_data('Time')
+
+    assert session.metrics('Time')['errors'] == 5
+    assert session.metrics('Time')['count'] == 1
+
+
+def test_async_session(set_variables):
+    url, _ = set_variables
+    session = ThreadedAsyncSession(max_retries=2, backoff=0.)
+    # A connection per thread
+    assert session._session.get_adapter(url)._pool_maxsize == 100
+
+    async def run():
+        # Test redirect and bounded retries on the loop
+        Stub.n_errors = 2
+        data = await session.get(url + '/Moved')
+        Stub.n_errors = 3
+        with pytest.raises(HTTPError):
+            await session.get(url + '/Time')
+
+        await session.close()
+
+        return data
+
+    assert asyncio.run(run()) == {'error': [], 'result': {}}
+    moved = session.metrics('Moved')
+    assert moved['count'] == 1 and moved['errors'] == 2
+    assert session.metrics('Time')['errors'] == 3
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+from multiprocessing import Pipe
+from threading import Thread
+import time
+
+# External packages
+import numpy as np
+
+# Internal packages
+from trading_bot._connection import ConnTradingBotManager
+from trading_bot.scheduler import BarScheduler
+from trading_bot.strategy_host import SharedData, StrategyHost
+
+
+class DataManager:
+    """ Data manager counting its requests. """
+
+    def __init__(self):
+        self.n = 0
+
+    def get_data(self, *args, **kwargs):
+        self.n += 1
+
+        return np.arange(3.)
+
+
+class Bot:
+    """ Strategy bot running a bar every `frequency` seconds. """
+
+    def __init__(self, _id, DM, t, frequency, STOP, fail=False):
+        self.id = _id
+        self.name_strat = 'bot_{}'.format(_id)
+        self.DM = DM
+        self.frequency = frequency
+        self.STOP = STOP
+        self.fail = fail
+        self.delay = 0
+        self.t = 0
+        self.next = t + frequency
+        self.signals = []
+        self.closed = False
+
+    def fire(self):
+        self.next += self.frequency
+        self.t += 1
+        data = self.DM.get_data('OHLC', pair='XXBTZUSD')
+        data[0] = -1.
+        if self.fail:
+
+            raise ValueError('strategy error')
+
+        return data.sum(), {}
+
+    def process_signal(self, s, kw):
+        self.signals.append(s)
+
+    def __exit__(self, *args):
+        self.closed = True
+
+
+def test_strategy_host():
+    DM = DataManager()
+    shared = SharedData(DM)
+    host = StrategyHost([], max_errors=2)
+    host.scheduler = BarScheduler(1)
+    host.is_stop = lambda: False
+    host.data = {'cfg': shared}
+    t = time.time()
+    bots = [Bot(1, shared, t, 0.1, 4), Bot(2, shared, t, 0.1, 4),
+            Bot(3, shared, t, 0.1, 4, fail=True),
+            Bot(4, DataManager(), t, 0.15, 2)]
+    host.bots = {bot.id: bot for bot in bots}
+    host.errors = {bot.id: 0 for bot in bots}
+
+    host.run()
+    assert 0.35 < time.time() - t < 0.6
+    assert all(bot.closed for bot in bots) and host.bots == {}
+
+    # Signals are isolated and data are requested once per bar
+    assert bots[0].signals == bots[1].signals == [2., 2., 2., 2.]
+    assert bots[2].t == 2 and bots[2].signals == []
+    assert bots[3].t == 2 and bots[3].DM.n == 2
+    assert DM.n == 4 and shared.n_requests == 4
+
+    # Not cached out of a round of bars
+    shared.get_data('OHLC', pair='XXBTZUSD')
+    assert DM.n == 5
+    assert host.scheduler.metrics()['max'] < 0.05
+
+
+class BatchBot(Bot):
+    """ Strategy bot of a family with a batched function. """
+
+    calls = []
+
+    def __init__(self, _id, DM, t, leverage, fail=False):
+        super(BatchBot, self).__init__(_id, DM, t, 0.1, 1)
+        self.f_args = ()
+        self.f_kwrds = {'leverage': leverage, 'mode': 'x'}
+        self.batch_fail = fail
+        self.indicators = None
+        self.n_saved = 0
+
+    def next_data(self):
+        self.next += self.frequency
+        self.t += 1
+
+        return self.DM.get_data('OHLC')
+
+    def get_order_params(self, data, leverage, mode):
+        return data.sum() * leverage, {'price': leverage}
+
+    def signal(self, data):
+        return self.get_order_params(data, *self.f_args, **self.f_kwrds)
+
+    def save_indicators(self):
+        self.n_saved += 1
+
+    def get_batch_order_params(self, data, params, names, indicators=None):
+        BatchBot.calls.append((names, params, indicators))
+        if self.batch_fail:
+
+            raise ValueError('batch error')
+
+        return data.sum() * params[:, 0], {'price': params[:, 0]}
+
+
+def test_batch(monkeypatch):
+    monkeypatch.setattr(BatchBot, 'calls', [])
+    shared = SharedData(DataManager())
+    host = StrategyHost([])
+    host.scheduler = BarScheduler(1)
+    host.is_stop = lambda: False
+    host.data = {'cfg': shared}
+    t = time.time()
+    bots = [BatchBot(k, shared, t, float(k)) for k in range(1, 4)]
+    bots.append(BatchBot(4, shared, t + 0.1, 4., fail=True))
+    bots.append(BatchBot(5, shared, t + 0.1, 5., fail=True))
+    bots[1].indicators = {'iso_vol': 1.}
+    host.bots = {bot.id: bot for bot in bots}
+    host.errors = {bot.id: 0 for bot in bots}
+    host.families = {bot.id: bot.batch_fail for bot in bots}
+    host.run()
+
+    # A single pass for the family, fallback one by one if it fails
+    assert len(BatchBot.calls) == 2
+    assert BatchBot.calls[0][0] == ['leverage']
+    np.testing.assert_equal(BatchBot.calls[0][1], [[1.], [2.], [3.]])
+    assert BatchBot.calls[0][2] == [None, {'iso_vol': 1.}, None]
+    assert BatchBot.calls[1][2] is None
+    assert [bot.n_saved for bot in bots] == [1, 1, 1, 0, 0]
+    assert [bot.signals for bot in bots] == [[3.], [6.], [9.], [12.], [15.]]
+    assert shared.n_requests == 2
+
+
+class ListenBot(Bot):
+    """ Strategy bot recording the messages of the TradingBotManager. """
+
+    def __init__(self, _id):
+        super(ListenBot, self).__init__(_id, None, 0, 1, 10)
+        self.conn_tbm = ConnTradingBotManager(_id)
+        self.msgs = []
+
+    def _handler_tbm(self, k, a):
+        self.msgs.append((k, a))
+
+
+def test_listen_tbm():
+    host = StrategyHost([])
+    host.scheduler = BarScheduler(1)
+    checks = []
+    host.is_stop = lambda: checks.append(time.time()) or len(checks) > 1
+    bots = [ListenBot(1), ListenBot(2)]
+    writers = []
+    for bot in bots:
+        r, w = Pipe(duplex=False)
+        bot.conn_tbm.setup(r, Pipe(duplex=False)[1])
+        writers.append(w)
+
+    host.bots = {bot.id: bot for bot in bots}
+    thread = Thread(target=host.listen_tbm, daemon=True)
+    t = time.time()
+    thread.start()
+
+    # Messages are read as soon as they are sent
+    writers[1].send(('_status', 'up'))
+    writers[0].send(('stop', 'closed'))
+    time.sleep(0.05)
+    assert bots[1].msgs == [('_status', 'up')] and bots[0].t == bots[0].STOP
+    assert bots[0].conn_tbm.state == 'down'
+
+    # The server is checked once per tick of the scheduler
+    thread.join(3)
+    assert not thread.is_alive() and host._stop.is_set()
+    assert len(checks) == 2 and checks[1] - checks[0] > 0.9
+    assert time.time() - t < 2.1
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Built-in packages
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+
+# External packages
+import numpy as np
+import pytest
+
+# Internal packages
+from trading_bot import websocket_feed
+from trading_bot.data_requests import get_bid, get_close
+from trading_bot.websocket_feed import KrakenFeed
+
+T0 = 17963 * 86400
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+def _candle(t, close):
+    # Update time, end time, open, high, low, close, vwap, volume, count
+    return [str(t + 1.5), str(t + 60), '1.0', '3.0', '0.5', str(close),
+            '1.2', '2.0', 3]
+
+
+def _recv_frame(conn):
+    head = conn.recv(2)
+    if len(head) < 2:
+
+        return 8, b''
+
+    opcode, n = head[0] & 0x0f, head[1] & 0x7f
+    if n == 126:
+        n = struct.unpack('!H', conn.recv(2))[0]
+
+    elif n == 127:
+        n = struct.unpack('!Q', conn.recv(8))[0]
+
+    mask = conn.recv(4)
+    data = b''
+    while len(data) < n:
+        data += conn.recv(n - len(data))
+
+    return opcode, bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+
+
+def _send_frame(conn, msg):
+    data = json.dumps(msg).encode()
+    if len(data) < 126:
+        head = struct.pack('!BB', 0x81, len(data))
+
+    else:
+        head = struct.pack('!BBH', 0x81, 126, len(data))
+
+    conn.sendall(head + data)
+
+
+class KrakenWSStub:
+    """ WebSocket server playing a script of messages per connection.
+
+    The script of a connection is sent once the feed has sent `n_subs`
+    subscriptions, the connection is closed at the end of the script if
+    `close` is True.
+
+    """
+
+    def __init__(self, scripts, n_subs):
+        self.scripts = scripts
+        self.n_subs = n_subs
+        self.subscriptions = []
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen()
+        self.url = 'ws://127.0.0.1:{}'.format(self.sock.getsockname()[1])
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        for script, close in self.scripts:
+            try:
+                conn, _ = self.sock.accept()
+
+            except OSError:
+
+                return
+
+            self.handle(conn, script, close)
+
+    def handle(self, conn, script, close):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            request += conn.recv(1024)
+
+        key = [line.split(':')[1].strip()
+               for line in request.decode().split('\r\n')
+               if line.lower().startswith('sec-websocket-key')][0]
+        accept = base64.b64encode(
+            hashlib.sha1((key + GUID).encode()).digest()
+        ).decode()
+        conn.sendall((
+            'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+            'Connection: Upgrade\r\nSec-WebSocket-Accept: {}\r\n\r\n'
+        ).format(accept).encode())
+        _send_frame(conn, {'event': 'systemStatus', 'status': 'online'})
+        n = 0
+        while n < self.n_subs:
+            opcode, data = _recv_frame(conn)
+            if opcode == 8:
+
+                return
+
+            msg = json.loads(data)
+            self.subscriptions.append(msg)
+            n += 1
+            _send_frame(conn, {
+                'event': 'subscriptionStatus', 'status': 'subscribed',
+                'pair': msg['pair'][0], 'channelName': msg['subscription'][
+                    'name'
+                ],
+            })
+
+        for msg in script:
+            _send_frame(conn, msg)
+
+        if close:
+            conn.close()
+
+        else:
+            threading.Thread(target=self.keep, args=(conn,),
+                             daemon=True).start()
+
+    def keep(self, conn):
+        while _recv_frame(conn)[0] != 8:
+            pass
+
+        conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+def _wait(condition, timeout=5.):
+    t = time.time()
+    while not condition():
+        if time.time() - t > timeout:
+
+            raise TimeoutError
+
+        time.sleep(0.01)
+
+
+@pytest.fixture()
+def set_variables(monkeypatch):
+    ticker = {'a': ['2.0', 1, '1.0'], 'b': ['1.0', 1, '1.0'],
+              'c': ['1.5', '0.1'], 'o': ['1.1', '1.2']}
+    first = [
+        [1, ticker, 'ticker', 'XBT/USD'],
+        [2, _candle(T0, 1.), 'ohlc-1', 'XBT/USD'],
+        [2, _candle(T0, 2.), 'ohlc-1', 'XBT/USD'],
+        [2, _candle(T0 + 60, 3.), 'ohlc-1', 'XBT/USD'],
+        [2, _candle(T0 + 180, 4.), 'ohlc-1', 'XBT/USD'],
+        [3, ['1.1', '1.9', str(T0 + 200.5), '1.0', '2.0'], 'spread',
+         'XBT/USD'],
+    ]
+    second = [[1, dict(ticker, c=['1.6', '0.1']), 'ticker', 'XBT/USD'],
+              [2, _candle(T0 + 300, 5.), 'ohlc-1', 'XBT/USD'],
+              {'event': 'heartbeat'}]
+    stub = KrakenWSStub([(first, True), (second, False)], n_subs=3)
+    feed = KrakenFeed(['XXBTZUSD'], url=stub.url, timeout=5., max_wait=0.1)
+    monkeypatch.setattr(websocket_feed, '_feed', feed)
+    feed.start()
+
+    yield stub, feed
+
+    feed.stop()
+    stub.close()
+
+
+def test_feed(set_variables):
+    stub, feed = set_variables
+
+    # Test reconnection with the same subscriptions
+    _wait(lambda: feed.n_connections == 2 and feed.wait(0.01))
+    _wait(lambda: feed.ticker('XXBTZUSD')['c'][0] == '1.6')
+    assert len(stub.subscriptions) == 6
+    assert stub.subscriptions[:3] == stub.subscriptions[3:]
+
+    # Test ring buffers, intervals without trade and gap after reconnection
+    _wait(lambda: len(feed.gaps) > 0)
+    assert feed.gaps == [('XBT/USD', 1, T0 + 180, T0 + 300)]
+    ohlc = feed.ohlc('XXBTZUSD', 1)
+    assert ohlc.shape == (1, 8) and ohlc[0, 0] == T0 + 300
+    assert feed.ohlc('XXBTZUSD', 1, n=2) is None
+    candles = feed.candles[('XBT/USD', 1)].last()
+    np.testing.assert_equal(candles[:, 0], T0 + 60 * np.array([0, 1, 2, 3,
+                                                               5]))
+    assert candles[0, 4] == 2.
+    np.testing.assert_equal(candles[2, 1:], [3., 3., 3., 3., 3., 0., 0.])
+    np.testing.assert_equal(feed.spread('XBT/USD'),
+                            [[T0 + 200.5, 1.1, 1.9, 1., 2.]])
+
+    # Test seed of the buffer with REST candles
+    rows = [[T0 + 60 * k, '1', '1', '1', str(k), '1', '1', 1]
+            for k in range(5)]
+    assert not feed.seed('XXBTZUSD', 1, rows[:4])
+    assert feed.seed('XXBTZUSD', 1, rows)
+    ohlc = feed.ohlc('XXBTZUSD', 1, n=6)
+    np.testing.assert_equal(ohlc[:, 0], T0 + 60 * np.arange(6))
+
+    # Test ticker helpers read the feed without requesting the REST API
+    assert get_close('XXBTZUSD', path='http://127.0.0.1:9') == 1.6
+    assert get_bid('XXBTZUSD', path='http://127.0.0.1:9') == 1.1
@@ -14,9 +14,13 @@
 
 # Local packages
 from .call_counters import *
+from .decoders import *
 from .io import *
+from .sessions import *
 from .time_tools import *
 
 __all__ = call_counters.__all__
+__all__ += decoders.__all__
 __all__ += io.__all__
+__all__ += sessions.__all__
 __all__ += time_tools.__all__
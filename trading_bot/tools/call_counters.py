@@ -11,13 +11,14 @@
 # Built-in packages
 import time
 import logging
+from threading import Lock
 
 # Third party packages
 
 # Local packages
 
 
-__all__ = ['KrakenCallCounter']
+__all__ = ['KrakenCallCounter', 'RateLimiter']
 
 
 class _CallCounter(object):
@@ -175,3 +176,82 @@ class KrakenCallCounter(_CallCounter):
             raise ValueError('Unknown method {}'.format(method))
 
         super(KrakenCallCounter, self).__call__(pt)
+
+
+class RateLimiter(object):
+    """ Call counter shared between threads, dedicated for public APIs.
+
+    Token bucket: each call consumes one token, tokens are refilled at `rate`
+    per second up to `burst`. A call waits until a token is available, so
+    several workers sharing the same object never exceed the rate limit.
+
+    Attributes
+    ----------
+    rate : float
+        Number of calls allowed per second.
+    burst : int
+        Max number of consecutive calls without waiting.
+    tokens : float
+        Number of calls currently available.
+    n_calls : int
+        Total number of calls.
+    waited : float
+        Total time waited in seconds.
+
+    Methods
+    -------
+    __init__
+    __call__
+
+    """
+
+    def __init__(self, rate=1., burst=1):
+        """ Initialize the rate limiter.
+
+        Parameters
+        ----------
+        rate : float, optional
+            Number of calls allowed per second, default is 1.
+        burst : int, optional
+            Max number of consecutive calls without waiting, default is 1.
+
+        """
+        self.logger = logging.getLogger(__name__)
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.n_calls = 0
+        self.waited = 0.
+        self.t = time.monotonic()
+        self._lock = Lock()
+
+    def __call__(self, pt=1):
+        """ Consume `pt` tokens and wait if necessary.
+
+        Parameters
+        ----------
+        pt : int, optional
+            Number of tokens consumed by the call, default is 1.
+
+        Returns
+        -------
+        float
+            Time waited in seconds.
+
+        """
+        with self._lock:
+            t = time.monotonic()
+            self.tokens += (t - self.t) * self.rate
+            self.tokens = min(self.tokens, self.burst)
+            self.t = t
+            self.tokens -= pt
+            self.n_calls += 1
+            # Tokens are reserved, the wait can be done outside the lock
+            wait = max(-self.tokens / self.rate, 0.)
+            self.waited += wait
+
+        if wait > 0:
+            self.logger.debug('wait {:.3f}s'.format(wait))
+            time.sleep(wait)
+
+        return wait
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Decoders of the answers of exchange APIs.
+
+JSON answers are decoded with the fastest backend available (`orjson`, then
+`ujson`, then the standard `json` module). OHLC candles are decoded in one
+pass into an int64 array of timestamps and a float64 array of fields, a
+dataframe is built only if it is asked.
+
+"""
+
+# Built-in packages
+from itertools import chain
+import json
+from operator import itemgetter
+
+# Third party packages
+import numpy as np
+import pandas as pd
+
+# Local packages
+
+try:
+    import orjson as _json
+    JSON_BACKEND = 'orjson'
+
+except ImportError:
+    try:
+        import ujson as _json
+        JSON_BACKEND = 'ujson'
+
+    except ImportError:
+        _json = json
+        JSON_BACKEND = 'json'
+
+__all__ = ['loads', 'decode_ohlc', 'to_frame', 'JSON_BACKEND']
+
+# Columns of the OHLC endpoint of Kraken
+OHLC_COLUMNS = {'t': 0, 'o': 1, 'h': 2, 'l': 3, 'c': 4, 'w': 5, 'v': 6, 'n': 7}
+
+
+def loads(data):
+    """ Decode a JSON document with the fastest backend available.
+
+    Parameters
+    ----------
+    data : str or bytes
+        JSON document.
+
+    Returns
+    -------
+    dict or list
+        Decoded document.
+
+    Raises
+    ------
+    ValueError
+        If the document is not valid JSON.
+
+    """
+    return _json.loads(data)
+
+
+def decode_ohlc(rows, fields='ohlcv'):
+    """ Decode OHLC candles of Kraken into typed arrays.
+
+    Values are converted while the rows are read, without intermediate array
+    or dataframe.
+
+    Parameters
+    ----------
+    rows : list of list or np.ndarray
+        Candles `[time, open, high, low, close, vwap, volume, count]`, values
+        can be strings.
+    fields : str, optional
+        Fields to decode, among 'ohlcvwn' (`w` is vwap and `n` count),
+        default is 'ohlcv'.
+
+    Returns
+    -------
+    index : np.ndarray[dtype=np.int64, ndim=1]
+        Timestamps of the candles.
+    array : np.ndarray[dtype=np.float64, ndim=2]
+        Data of shape `(n_candles, n_fields)`.
+
+    Examples
+    --------
+    >>> decode_ohlc([[60, '1.', '3.', '0.5', '2.', '1.5', '10.', 3]], 'cv')
+    (array([60]), array([[ 2., 10.]]))
+
+    """
+    cols = [OHLC_COLUMNS[f] for f in fields]
+    n = len(rows)
+    if isinstance(rows, np.ndarray):
+
+        return rows[:, 0].astype(np.int64), rows[:, cols].astype(np.float64)
+
+    index = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+    get = itemgetter(*cols)
+    if len(cols) == 1:
+        values = map(get, rows)
+
+    else:
+        values = chain.from_iterable(map(get, rows))
+
+    array = np.fromiter(map(float, values), dtype=np.float64,
+                        count=n * len(cols))
+
+    return index, array.reshape([n, len(cols)])
+
+
+def to_frame(index, array, fields='ohlcv'):
+    """ Set decoded data as a dataframe, without copy.
+
+    Parameters
+    ----------
+    index : np.ndarray[dtype=np.int64, ndim=1]
+        Timestamps.
+    array : np.ndarray[dtype=np.float64, ndim=2]
+        Data of shape `(n_rows, n_fields)`.
+    fields : str, optional
+        Names of the columns, default is 'ohlcv'.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Data indexed by timestamp.
+
+    """
+    return pd.DataFrame(array, index=index, columns=list(fields), copy=False)
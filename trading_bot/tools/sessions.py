@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Pooled HTTP sessions shared to request public APIs.
+
+`PooledSession` is blocking (built on `requests`). `ThreadedAsyncSession`
+adapts it to `asyncio` event loops: its coroutines await the blocking
+requests run in a pool of threads, it is not an asynchronous HTTP client.
+
+"""
+
+# Built-in packages
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import logging
+import random
+from threading import Lock
+import time
+from urllib.parse import urlparse
+
+# Third party packages
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+# Local packages
+from trading_bot.tools.decoders import loads
+
+
+__all__ = ['PooledSession', 'ThreadedAsyncSession', 'session',
+           'async_session']
+
+
+class PooledSession(object):
+    """ HTTP session keeping connections alive between requests.
+
+    Connections are pooled per host, such that only the first request pays
+    the TCP and TLS handshakes. Each request has a connect and a read timeout,
+    connection errors, timeouts, server errors (5xx, 429) and invalid answers
+    are retried a bounded number of times with a jittered exponential backoff.
+    The latency of each endpoint is recorded.
+
+    Attributes
+    ----------
+    timeout : tuple of float
+        Connect and read timeouts in seconds.
+    max_retries : int
+        Max number of retries of a request.
+    backoff : float
+        Max seconds waited before the first retry, doubled at each retry.
+    max_backoff : float
+        Max seconds waited before a retry.
+
+    Methods
+    -------
+    get
+    metrics
+    reset_metrics
+    close
+
+    """
+
+    def __init__(self, timeout=(3.05, 10.), max_retries=3, backoff=0.5,
+                 max_backoff=10., pool_maxsize=10, n_latencies=1000):
+        """ Initialize the session.
+
+        Parameters
+        ----------
+        timeout : tuple of float, optional
+            Connect and read timeouts in seconds, default is (3.05, 10).
+        max_retries : int, optional
+            Max number of retries of a request, default is 3.
+        backoff : float, optional
+            Max seconds waited before the first retry, default is 0.5.
+        max_backoff : float, optional
+            Max seconds waited before a retry, default is 10.
+        pool_maxsize : int, optional
+            Number of connections kept alive per host, default is 10.
+        n_latencies : int, optional
+            Number of latencies kept per endpoint to compute the quantiles,
+            default is 1000.
+
+        """
+        self.logger = logging.getLogger(__name__)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.n_latencies = n_latencies
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=0)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._metrics = {}
+        self._lock = Lock()
+
+    def __repr__(self):
+        return 'PooledSession(timeout={}, max_retries={})'.format(
+            self.timeout, self.max_retries
+        )
+
+    def _record(self, endpoint, latency=None, error=False):
+        with self._lock:
+            m = self._metrics.setdefault(endpoint, {
+                'count': 0, 'errors': 0, 'total': 0.,
+                'latencies': deque(maxlen=self.n_latencies),
+            })
+            if error:
+                m['errors'] += 1
+
+            else:
+                m['count'] += 1
+                m['total'] += latency
+                m['latencies'].append(latency)
+
+    def _backoff(self, k):
+        return random.uniform(0, min(self.backoff * 2 ** k, self.max_backoff))
+
+    def _get_once(self, url, params, timeout):
+        # One attempt, server errors and invalid answers raise an error
+        ans = self._session.get(url, params=params, timeout=timeout)
+        if ans.status_code == 429 or ans.status_code >= 500:
+            ans.raise_for_status()
+
+        return loads(ans.content)
+
+    def _failed(self, endpoint, k, e, last=False):
+        # Record a failed attempt, raise the error after the last one
+        self._record(endpoint, error=True)
+        if last or k == self.max_retries:
+            self.logger.error('{}: failed after {} retries: {}'.format(
+                endpoint, k, e
+            ))
+
+            raise e
+
+        self.logger.warning('{}: {}, retry'.format(endpoint, e))
+
+    def get(self, url, params=None, timeout=None):
+        """ Request an url and return the decoded JSON answer.
+
+        Parameters
+        ----------
+        url : str
+            Url to request, the last part of its path is the endpoint used to
+            record the latency.
+        params : dict, optional
+            Parameters of the request.
+        timeout : tuple of float, optional
+            Connect and read timeouts, default is `timeout` attribute.
+
+        Returns
+        -------
+        dict or list
+            Decoded JSON answer.
+
+        Raises
+        ------
+        requests.exceptions.RequestException or ValueError
+            Last error if the request failed after `max_retries` retries.
+
+        """
+        endpoint = urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]
+        timeout = self.timeout if timeout is None else timeout
+        for k in range(self.max_retries + 1):
+            t = time.perf_counter()
+            try:
+                data = self._get_once(url, params, timeout)
+
+            except (ConnectionError, HTTPError, Timeout, ValueError) as e:
+                self._failed(endpoint, k, e)
+                time.sleep(self._backoff(k))
+
+                continue
+
+            self._record(endpoint, latency=time.perf_counter() - t)
+
+            return data
+
+    def metrics(self, endpoint=None):
+        """ Return the latency metrics of the endpoints.
+
+        Parameters
+        ----------
+        endpoint : str, optional
+            Name of an endpoint, default returns the metrics of all endpoints.
+
+        Returns
+        -------
+        dict
+            Number of successful requests, number of errors, mean, median,
+            99th percentile and max latencies in seconds (of the last
+            `n_latencies` requests for the quantiles and max).
+
+        """
+        with self._lock:
+            metrics = {}
+            for key, m in self._metrics.items():
+                x = np.array(m['latencies'])
+                metrics[key] = {
+                    'count': m['count'],
+                    'errors': m['errors'],
+                    'mean': m['total'] / m['count'] if m['count'] else np.nan,
+                    'p50': np.quantile(x, 0.5) if x.size else np.nan,
+                    'p99': np.quantile(x, 0.99) if x.size else np.nan,
+                    'max': x.max() if x.size else np.nan,
+                }
+
+        if endpoint is not None:
+
+            return metrics[endpoint]
+
+        return metrics
+
+    def reset_metrics(self):
+        """ Clear the latency metrics. """
+        with self._lock:
+            self._metrics = {}
+
+    def close(self):
+        """ Close the pooled connections. """
+        self._session.close()
+
+
+class ThreadedAsyncSession(PooledSession):
+    """ Thread pool adapter of `PooledSession` for `asyncio` event loops.
+
+    Same as `PooledSession` (pooled connections, timeouts, bounded retries
+    and latency metrics), but `get` is a coroutine: each attempt of a request
+    is a blocking request of `requests` run in a pool of at most `limit`
+    threads, such that up to `limit` requests are in flight without blocking
+    the event loop, and the backoff between retries doesn't block the loop.
+    The pool keeps at least `limit` connections per host, such that the
+    threads don't wait for a connection.
+
+    A request can be cancelled or have a deadline, but the attempt in flight
+    can't be interrupted: the coroutine returns at once, the thread keeps
+    running the request until its answer (dropped) or its read timeout.
+
+    Methods
+    -------
+    get
+    metrics
+    reset_metrics
+    close
+
+    """
+
+    def __init__(self, timeout=(3.05, 10.), max_retries=3, backoff=0.5,
+                 max_backoff=10., pool_maxsize=10, n_latencies=1000,
+                 limit=100):
+        """ Initialize the session.
+
+        Parameters
+        ----------
+        timeout : tuple of float, optional
+            Connect and read timeouts in seconds, default is (3.05, 10).
+        max_retries : int, optional
+            Max number of retries of a request, default is 3.
+        backoff : float, optional
+            Max seconds waited before the first retry, default is 0.5.
+        max_backoff : float, optional
+            Max seconds waited before a retry, default is 10.
+        pool_maxsize : int, optional
+            Number of connections kept alive per host, default is 10, raised
+            to `limit` if it is lower.
+        n_latencies : int, optional
+            Number of latencies kept per endpoint to compute the quantiles,
+            default is 1000.
+        limit : int, optional
+            Max number of requests in flight at the same time, i.e. number of
+            threads, default is 100.
+
+        """
+        super(ThreadedAsyncSession, self).__init__(
+            timeout=timeout, max_retries=max_retries, backoff=backoff,
+            max_backoff=max_backoff, pool_maxsize=max(pool_maxsize, limit),
+            n_latencies=n_latencies,
+        )
+        self.limit = limit
+        self._executor = None
+
+    def __repr__(self):
+        return '{}(timeout={}, max_retries={}, limit={})'.format(
+            type(self).__name__, self.timeout, self.max_retries, self.limit
+        )
+
+    def _get_executor(self):
+        # Threads are started at the first request
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.limit,
+                    thread_name_prefix=type(self).__name__,
+                )
+
+            return self._executor
+
+    async def get(self, url, params=None, timeout=None, deadline=None):
+        """ Request an url and return the decoded JSON answer.
+
+        Parameters
+        ----------
+        url : str
+            Url to request, the last part of its path is the endpoint used to
+            record the latency.
+        params : dict, optional
+            Parameters of the request.
+        timeout : tuple of float, optional
+            Connect and read timeouts, default is `timeout` attribute.
+        deadline : float, optional
+            Time (`time.monotonic`) after which the request and its retries
+            are aborted, default is no deadline.
+
+        Returns
+        -------
+        dict or list
+            Decoded JSON answer.
+
+        Raises
+        ------
+        requests.exceptions.RequestException or ValueError
+            Last error if the request failed after `max_retries` retries,
+            `requests.exceptions.Timeout` if the deadline is exceeded.
+
+        """
+        loop = asyncio.get_running_loop()
+        endpoint = urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]
+        timeout = self.timeout if timeout is None else timeout
+        for k in range(self.max_retries + 1):
+            t = time.perf_counter()
+            left = None if deadline is None else deadline - time.monotonic()
+            try:
+                if left is not None and left <= 0:
+
+                    raise Timeout('Deadline of {} exceeded'.format(url))
+
+                data = await asyncio.wait_for(loop.run_in_executor(
+                    self._get_executor(),
+                    partial(self._get_once, url, params, timeout),
+                ), left)
+
+            except asyncio.TimeoutError:
+                self._record(endpoint, error=True)
+
+                raise Timeout('Deadline of {} exceeded'.format(url))
+
+            except (ConnectionError, HTTPError, Timeout, ValueError) as e:
+                self._failed(endpoint, k, e, last=left is not None and (
+                    time.monotonic() > deadline
+                ))
+                await asyncio.sleep(self._backoff(k))
+
+                continue
+
+            self._record(endpoint, latency=time.perf_counter() - t)
+
+            return data
+
+    async def close(self):
+        """ Close the pooled connections and the threads. """
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+        super(ThreadedAsyncSession, self).close()
+
+
+session = PooledSession()
+async_session = ThreadedAsyncSession()
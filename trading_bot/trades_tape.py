@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Tape of the trades of an exchange and bars built from it.
+
+The `TradesRecorder` pages the Trades endpoint of the Kraken public API with
+its `since` cursor and appends the raw trades of each pair to a binary log
+(`<path>/<pair>/trades.bin`). A record is a fixed size `TRADE_DTYPE` (26
+bytes: time, price, volume, side and type), such that the log can be read as
+a memory-mapped array. The cursor and the size of the log are saved in the
+checkpoint of the pair after each page (see `trading_bot.backfill`), a log is
+truncated to its checkpoint when the recorder restarts, so a trade is never
+recorded twice. When a page is cut at the end of a run, the checkpoint keeps
+the cursor of the page and the number of its trades already recorded.
+
+The `BarBuilder` turns incrementally the tape of a pair into OHLCV bars of any
+timestep (including sub-minute ones) in the data base format (see
+`trading_bot.database`), it resumes from the first trade of the last bar
+written.
+
+Run the recorder then the bar builders from the command line::
+
+    $ python -m trading_bot.trades_tape XXBTZUSD XETHZUSD --timesteps 10 60
+
+"""
+
+# Built-in packages
+from argparse import ArgumentParser
+import logging
+import os
+import time
+
+# Third party packages
+import numpy as np
+
+# Local packages
+from trading_bot.backfill import (KRAKEN_URL, Backfill, load_checkpoint,
+                                  save_checkpoint)
+from trading_bot.data_requests import DataRequests
+from trading_bot.database import (TIMESTEP, resample, update_rollups,
+                                  write_bars)
+from trading_bot.tools.call_counters import RateLimiter
+from trading_bot.tools.time_tools import now
+
+__all__ = ['TradesRecorder', 'BarBuilder', 'decode_trades', 'read_tape']
+
+TAPE = 'trades.bin'
+TRADE_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('price', '<f8'),
+    ('volume', '<f8'),
+    ('side', 'S1'),
+    ('type', 'S1'),
+])
+
+
+def _tape_path(path, pair):
+    return os.path.join(path, pair, TAPE)
+
+
+def decode_trades(rows):
+    """ Decode trades of Kraken into records of the tape.
+
+    Parameters
+    ----------
+    rows : list of list
+        Trades `[price, volume, time, side, type, misc, ...]`.
+
+    Returns
+    -------
+    np.ndarray[dtype=TRADE_DTYPE, ndim=1]
+        Trades.
+
+    Examples
+    --------
+    >>> trades = decode_trades([['2.', '1.', 61.5, 'b', 'l', '']])
+    >>> trades['time'], trades['price'], trades['side']
+    (array([61.5]), array([2.]), array([b'b'], dtype='|S1'))
+
+    """
+    return np.fromiter(
+        ((r[2], r[0], r[1], r[3], r[4]) for r in rows),
+        dtype=TRADE_DTYPE, count=len(rows),
+    )
+
+
+def read_tape(path, pair, start=0, n=None):
+    """ Read the trades of a pair as a memory-mapped array.
+
+    Parameters
+    ----------
+    path : str
+        Path of the data base.
+    pair : str
+        Name of the pair.
+    start : int, optional
+        Number of the first trade to read, default is 0.
+    n : int, optional
+        Max number of trades to read, default reads until the end.
+
+    Returns
+    -------
+    np.ndarray[dtype=TRADE_DTYPE, ndim=1]
+        Trades (read-only), empty if there is no trade.
+
+    """
+    name = _tape_path(path, pair)
+    try:
+        size = os.path.getsize(name) // TRADE_DTYPE.itemsize
+
+    except FileNotFoundError:
+        size = 0
+
+    n = size - start if n is None else min(n, size - start)
+    if n <= 0:
+
+        return np.empty(0, dtype=TRADE_DTYPE)
+
+    return np.memmap(name, dtype=TRADE_DTYPE, mode='r', shape=(n,),
+                     offset=start * TRADE_DTYPE.itemsize)
+
+
+class TradesRecorder(Backfill):
+    """ Object to record the trades of several pairs from Kraken in tapes.
+
+    Methods
+    -------
+    run(since=0, until=None)
+        Record the trades of all pairs and return a throughput report.
+    load_checkpoint(pair)
+        Return the cursor saved for a pair, None if there is no checkpoint.
+    save_checkpoint(pair, cursor, size, skip=0)
+        Save the cursor and the size of the tape of a pair.
+
+    Attributes
+    ----------
+    pairs : list of str
+        Name of the pairs, also used as asset names in the data base.
+    path : str
+        Path of the data base.
+    url : str
+        Url of the public API.
+    n_jobs : int
+        Number of workers.
+    limiter : trading_bot.tools.call_counters.RateLimiter
+        Rate limiter shared between workers.
+    report : dict
+        Throughput of the last run for each pair.
+
+    """
+
+    def __init__(self, pairs, path='data_base/', url=KRAKEN_URL, n_jobs=4,
+                 limiter=None, max_retries=5, backoff=2.):
+        """ Initialize the recorder.
+
+        Parameters
+        ----------
+        pairs : str or list of str
+            Name of the pairs on Kraken, e.g. 'XXBTZUSD'.
+        path : str, optional
+            Path of the data base, default is 'data_base/'.
+        url : str, optional
+            Url of the public API, default is Kraken.
+        n_jobs : int, optional
+            Number of workers, default is 4.
+        limiter : RateLimiter, optional
+            Rate limiter shared between workers, default allows one request
+            per second.
+        max_retries : int, optional
+            Max number of retries when the rate limit of the exchange is
+            exceeded, default is 5.
+        backoff : float, optional
+            Seconds waited before the first retry, doubled at each retry.
+
+        """
+        super(TradesRecorder, self).__init__(
+            pairs, path=path, endpoint='Trades', url=url, n_jobs=n_jobs,
+            limiter=limiter, max_retries=max_retries, backoff=backoff,
+        )
+
+    def __repr__(self):
+        return 'TradesRecorder({} pairs from {})'.format(
+            len(self.pairs), self.url
+        )
+
+    def load_checkpoint(self, pair):
+        """ Return the cursor saved for a pair.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair.
+
+        Returns
+        -------
+        int or None
+            Cursor of the Trades endpoint (in nanoseconds), None if the tape
+            has no checkpoint.
+
+        """
+        return load_checkpoint(self.path, pair).get('Tape')
+
+    def save_checkpoint(self, pair, cursor, size, skip=0):
+        """ Save atomically the cursor and the size of the tape of a pair.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair.
+        cursor : int
+            Cursor of the Trades endpoint.
+        size : int
+            Size of the tape in bytes.
+        skip : int, optional
+            Number of trades of the page at `cursor` already in the tape,
+            default is 0.
+
+        """
+        save_checkpoint(self.path, pair, Tape=int(cursor), TapeSize=size,
+                        TapeSkip=skip)
+
+    def _backfill(self, pair, since, until):
+        stats = {'requests': 0, 'rows': 0, 'first': None, 'last': None}
+        t = time.time()
+        os.makedirs(os.path.join(self.path, pair), exist_ok=True)
+        req = DataRequests(self.url)
+        checkpoint = load_checkpoint(self.path, pair)
+        cursor = max(since, checkpoint.get('Tape', since))
+        size = checkpoint.get('TapeSize', 0)
+        skip = 0
+        if cursor == checkpoint.get('Tape'):
+            skip = checkpoint.get('TapeSkip', 0)
+
+        self.logger.info('{}: start from {}'.format(pair, cursor))
+
+        with open(_tape_path(self.path, pair), 'a+b') as f:
+            # Trades written after the last checkpoint are requested again
+            f.truncate(size)
+            while True:
+                result = self._request(req, pair, cursor)
+                stats['requests'] += 1
+                last = int(result['last'])
+                rows = next(v for k, v in result.items() if k != 'last')
+                trades = decode_trades(rows)[skip:]
+                n = trades.size
+                if n > 0 and trades['time'][-1] >= until:
+                    # Resume from the cursor of the page and skip its trades
+                    # kept, times in float seconds can't give an exact cursor
+                    trades = trades[trades['time'] < until]
+                    skip += trades.size
+                    last = cursor
+
+                else:
+                    skip = 0
+
+                if trades.size > 0:
+                    f.write(trades.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size += trades.nbytes
+                    stats['rows'] += trades.size
+                    stats['first'] = stats['first'] or float(trades['time'][0])
+                    stats['last'] = float(trades['time'][-1])
+
+                self.save_checkpoint(pair, last, size, skip)
+                if last <= cursor or trades.size < n:
+
+                    break
+
+                cursor = last
+
+        stats['elapsed'] = time.time() - t
+        stats['rows_per_sec'] = stats['rows'] / max(stats['elapsed'], 1e-9)
+        self.logger.info('{}: {} trades in {} requests, {:.1f}/s'.format(
+            pair, stats['rows'], stats['requests'], stats['rows_per_sec']
+        ))
+
+        return stats
+
+
+class BarBuilder:
+    """ Object to build incrementally the bars of a pair from its tape.
+
+    Bars are written in the data base at their timestep: minutely bars in
+    the partitions of the asset (rollup tiers are then updated), other bars
+    in the tier of their timestep (e.g. `10s/`). The position in the tape
+    (first trade of the last bar written, which can still be updated) is
+    saved in the checkpoint of the pair.
+
+    Methods
+    -------
+    update()
+        Write the bars of the trades recorded since the last update.
+
+    Attributes
+    ----------
+    pair : str
+        Name of the pair.
+    timestep : int
+        Number of seconds of a bar.
+    path : str
+        Path of the data base.
+    position : int
+        Number of the first trade read at the next update.
+
+    """
+
+    def __init__(self, pair, timestep=TIMESTEP, path='data_base/',
+                 chunksize=1 << 20):
+        """ Initialize the bar builder.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair.
+        timestep : int, optional
+            Number of seconds of a bar, must divide 86400 (a day), default
+            is 60.
+        path : str, optional
+            Path of the data base, default is 'data_base/'.
+        chunksize : int, optional
+            Max number of trades read at once, default is 1048576.
+
+        """
+        if 86400 % timestep:
+
+            raise ValueError('Timestep must divide a day: {}'.format(timestep))
+
+        self.logger = logging.getLogger(__name__)
+        self.pair = pair
+        self.timestep = timestep
+        self.path = path
+        self.chunksize = chunksize
+        self._key = 'Bars{}s'.format(timestep)
+        self.position = load_checkpoint(path, pair).get(self._key, 0)
+
+    def __repr__(self):
+        return 'BarBuilder({}, timestep={}, position={})'.format(
+            self.pair, self.timestep, self.position
+        )
+
+    def update(self):
+        """ Write the bars of the trades recorded since the last update.
+
+        Returns
+        -------
+        tuple of int or None
+            Timestamps of the first and last bars written, None if there is
+            no new trade.
+
+        """
+        first = last = None
+        n_max = self.chunksize
+        while True:
+            trades = read_tape(self.path, self.pair, self.position, n_max)
+            if trades.size == 0:
+
+                break
+
+            # Trades of the last bar are read again at the next update
+            t = int(trades['time'][-1]) // self.timestep * self.timestep
+            n = np.searchsorted(trades['time'], t, side='left')
+            if n == 0 and trades.size == n_max:
+                # A single bar in the chunk, read a larger one
+                n_max *= 2
+
+                continue
+
+            price, volume = trades['price'], trades['volume']
+            index, array = resample(
+                np.floor(trades['time']).astype(np.int64),
+                np.stack([price, price, price, price, volume], axis=1),
+                self.timestep,
+            )
+            write_bars(index, array, self.path, self.pair, self.timestep)
+            first = index[0] if first is None else first
+            last = index[-1]
+            self.position += int(n)
+            if trades.size < n_max:
+
+                break
+
+            n_max = self.chunksize
+
+        if first is None:
+
+            return None
+
+        if self.timestep == TIMESTEP:
+            update_rollups(self.path, self.pair, first, last)
+
+        save_checkpoint(self.path, self.pair, **{self._key: self.position})
+        self.logger.debug('{}: bars {} to {} of {}s'.format(
+            self.pair, first, last, self.timestep
+        ))
+
+        return int(first), int(last)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Record the trades and build bars.')
+    parser.add_argument('pairs', nargs='+', help='Name of the pairs.')
+    parser.add_argument('--path', default='data_base/')
+    parser.add_argument('--url', default=KRAKEN_URL)
+    parser.add_argument('--since', type=int, default=0)
+    parser.add_argument('--timesteps', type=int, nargs='*', default=[60])
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=1.)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    recorder = TradesRecorder(args.pairs, path=args.path, url=args.url,
+                              n_jobs=args.jobs,
+                              limiter=RateLimiter(args.rate))
+    report = recorder.run(since=args.since, until=now())
+    for pair in args.pairs:
+        for timestep in args.timesteps:
+            BarBuilder(pair, timestep, path=args.path).update()
+
+    for key, stats in report.items():
+        recorder.logger.info('{}: {}'.format(key, stats))
@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+""" Market data feed from the Kraken public WebSocket API.
+
+`KrakenFeed` subscribes to the ticker, OHLC and spread channels in a thread,
+keeps the last tickers and the last candles and spreads of each pair in
+fixed-size NumPy ring buffers, reconnects with the same subscriptions when
+the connection is lost or stale, and detects gaps in the candles.
+
+Kraken sends no candle for the intervals without trade: on the same
+connection, the missing candles are filled with the last close and a zero
+volume. A gap is only recorded when candles are missing after a reconnection
+(they may have been missed while disconnected), the candles before the gap
+are then not returned by `ohlc`.
+
+A feed enabled in a process (see `enable_feed`) is read by the ticker helpers
+and by `DataExchangeManager` of `trading_bot.data_requests`, which fall back
+to the REST API when the feed doesn't have the data.
+
+"""
+
+# Built-in packages
+import json
+import logging
+from threading import Event, Lock, Thread
+import time
+
+# Third party packages
+import numpy as np
+import websocket
+
+# Local packages
+
+__all__ = [
+    'RingBuffer', 'KrakenFeed', 'ws_name', 'enable_feed', 'disable_feed',
+    'get_feed',
+]
+
+WS_URL = 'wss://ws.kraken.com'
+# Columns of candles, same as the OHLC endpoint of the REST API
+OHLC_FIELDS = ('time', 'open', 'high', 'low', 'close', 'vwap', 'volume',
+               'count')
+SPREAD_FIELDS = ('time', 'bid', 'ask', 'bid_volume', 'ask_volume')
+
+
+def ws_name(pair):
+    """ Return the WebSocket name of a Kraken pair.
+
+    Parameters
+    ----------
+    pair : str
+        Name of the pair, e.g. 'XXBTZUSD', 'XBTUSD' or 'XBT/USD'.
+
+    Returns
+    -------
+    str
+        WebSocket name of the pair.
+
+    Examples
+    --------
+    >>> ws_name('XXBTZUSD'), ws_name('XBTUSD'), ws_name('DOT/EUR')
+    ('XBT/USD', 'XBT/USD', 'DOT/EUR')
+
+    """
+    if '/' in pair:
+
+        return pair
+
+    elif len(pair) == 8 and pair[0] in 'XZ' and pair[4] in 'XZ':
+
+        return pair[1:4] + '/' + pair[5:]
+
+    return pair[:-3] + '/' + pair[-3:]
+
+
+class RingBuffer:
+    """ Fixed-size buffer of the last rows of a float array.
+
+    Methods
+    -------
+    append
+    update
+    last
+    clear
+    resize
+
+    Attributes
+    ----------
+    array : np.ndarray[dtype=np.float64, ndim=2]
+        Data of the buffer, rows are stored circularly.
+    n : int
+        Total number of rows appended.
+
+    """
+
+    def __init__(self, size, n_fields):
+        """ Initialize the buffer.
+
+        Parameters
+        ----------
+        size : int
+            Max number of rows.
+        n_fields : int
+            Number of columns.
+
+        """
+        self.array = np.full((size, n_fields), np.nan)
+        self.n = 0
+
+    def __len__(self):
+        return min(self.n, self.array.shape[0])
+
+    def __repr__(self):
+        return 'RingBuffer({}/{} rows)'.format(len(self), self.array.shape[0])
+
+    def append(self, row):
+        """ Append a row, the oldest one is overwritten if the buffer is full.
+        """
+        self.array[self.n % self.array.shape[0]] = row
+        self.n += 1
+
+    def update(self, row):
+        """ Replace the last row. """
+        self.array[(self.n - 1) % self.array.shape[0]] = row
+
+    def last(self, n=None):
+        """ Return a copy of the last rows in chronological order.
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of rows, default is all rows of the buffer.
+
+        Returns
+        -------
+        np.ndarray[dtype=np.float64, ndim=2]
+            Last rows.
+
+        Examples
+        --------
+        >>> buf = RingBuffer(3, 1)
+        >>> for x in range(5):
+        ...     buf.append([x])
+        >>> buf.last(2).flatten()
+        array([3., 4.])
+
+        """
+        m = len(self) if n is None else min(n, len(self))
+
+        return self.array[np.arange(self.n - m, self.n) % self.array.shape[0]]
+
+    def clear(self):
+        """ Remove all rows. """
+        self.array[:] = np.nan
+        self.n = 0
+
+    def resize(self, size):
+        """ Change the max number of rows, the last rows are kept.
+
+        Examples
+        --------
+        >>> buf = RingBuffer(2, 1)
+        >>> for x in range(3):
+        ...     buf.append([x])
+        >>> buf.resize(4)
+        >>> buf.append([3])
+        >>> buf.last().flatten()
+        array([1., 2., 3.])
+
+        """
+        rows = self.last(size)
+        self.array = np.full((size, self.array.shape[1]), np.nan)
+        self.n = 0
+        for row in rows:
+            self.append(row)
+
+
+class KrakenFeed:
+    """ Client of the Kraken public WebSocket API.
+
+    Methods
+    -------
+    start
+    stop
+    subscribe
+    subscribe_channels
+    ticker
+    spread
+    ohlc
+    seed
+    reserve
+    wait
+
+    Attributes
+    ----------
+    subscriptions : list of dict
+        Subscriptions sent again at each connection.
+    tickers : dict
+        Last ticker and its reception time of each pair.
+    candles, spreads : dict of RingBuffer
+        Last candles of each pair and interval, last spreads of each pair.
+    gaps : list of tuple
+        Pair, interval and timestamps of the candles around each gap after a
+        reconnection.
+    n_connections, n_messages : int
+        Number of connections and of messages received.
+
+    """
+
+    def __init__(self, pairs=(), channels=('ticker', 'ohlc', 'spread'),
+                 intervals=(1,), url=WS_URL, size=720, timeout=10.,
+                 max_wait=60.):
+        """ Initialize the feed.
+
+        Parameters
+        ----------
+        pairs : list of str, optional
+            Names of the pairs to subscribe (see `ws_name`).
+        channels : list of str, optional
+            Channels to subscribe for each pair, default are ticker, ohlc and
+            spread.
+        intervals : list of int, optional
+            Intervals in minutes of the OHLC channel, default is 1 minute.
+        url : str, optional
+            Url of the WebSocket API, default is Kraken.
+        size : int, optional
+            Number of candles and spreads kept per pair, default is 720.
+        timeout : float, optional
+            Seconds without message after which the connection is considered
+            stale and reopened, default is 10 (Kraken sends heartbeats every
+            second).
+        max_wait : float, optional
+            Max seconds waited between two connection attempts.
+
+        """
+        self.logger = logging.getLogger(__name__)
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self.max_wait = max_wait
+        self.subscriptions = []
+        self.tickers = {}
+        self.candles = {}
+        self.spreads = {}
+        self.gaps = []
+        self.n_connections = 0
+        self.n_messages = 0
+        self._first = {}
+        self._conns = {}
+        self._sizes = {}
+        self._ws = None
+        self._lock = Lock()
+        self._stop = Event()
+        self._ready = Event()
+        self._thread = None
+        self.subscribe_channels(pairs, channels, intervals)
+
+    def __repr__(self):
+        return 'KrakenFeed({}, {} subscriptions)'.format(
+            self.url, len(self.subscriptions)
+        )
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+
+    def start(self):
+        """ Start the feed in a thread. """
+        self._stop.clear()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        """ Stop the feed and close the connection. """
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            ws.close()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def wait(self, timeout=None):
+        """ Wait until the feed is connected.
+
+        Returns
+        -------
+        bool
+            True if the feed is connected.
+
+        """
+        return self._ready.wait(timeout)
+
+    def subscribe(self, pairs, name, **kwargs):
+        """ Subscribe to a channel, and again at each connection.
+
+        Parameters
+        ----------
+        pairs : str or list of str
+            Names of the pairs (see `ws_name`).
+        name : {'ticker', 'ohlc', 'spread'}
+            Name of the channel.
+        kwargs : dict
+            Options of the subscription, e.g. `interval` for OHLC channel.
+
+        """
+        pairs = [pairs] if isinstance(pairs, str) else pairs
+        pairs = [ws_name(p) for p in pairs]
+        if not pairs:
+
+            return
+
+        msg = {'event': 'subscribe', 'pair': pairs,
+               'subscription': {'name': name, **kwargs}}
+        with self._lock:
+            if msg in self.subscriptions:
+
+                return
+
+            self.subscriptions.append(msg)
+            ws = self._ws
+
+        if ws is not None and self._ready.is_set():
+            ws.send(json.dumps(msg))
+
+    def subscribe_channels(self, pairs, channels=('ticker', 'ohlc', 'spread'),
+                           intervals=(1,)):
+        """ Subscribe to several channels and OHLC intervals.
+
+        Parameters
+        ----------
+        pairs : str or list of str
+            Names of the pairs (see `ws_name`).
+        channels : list of str, optional
+            Names of the channels, default are ticker, ohlc and spread.
+        intervals : list of int, optional
+            Intervals in minutes of the OHLC channel, default is 1 minute.
+
+        """
+        for channel in channels:
+            if channel == 'ohlc':
+                for interval in intervals:
+                    self.subscribe(pairs, 'ohlc', interval=interval)
+
+            else:
+                self.subscribe(pairs, channel)
+
+    def _connect(self):
+        ws = websocket.create_connection(self.url, timeout=self.timeout)
+        ws.settimeout(min(self.timeout, 1.))
+        with self._lock:
+            self._ws = ws
+            self.n_connections += 1
+            subscriptions = list(self.subscriptions)
+
+        for msg in subscriptions:
+            ws.send(json.dumps(msg))
+
+        self._ready.set()
+        self.logger.info('connected to {}'.format(self.url))
+
+        return ws
+
+    def _run(self):
+        wait = 1.
+        while not self._stop.is_set():
+            try:
+                ws = self._connect()
+                wait = 1.
+                t = time.time()
+                while not self._stop.is_set():
+                    try:
+                        msg = ws.recv()
+
+                    except websocket.WebSocketTimeoutException:
+                        if time.time() - t > self.timeout:
+                            self.logger.error('connection is stale')
+
+                            break
+
+                        continue
+
+                    t = time.time()
+                    if msg:
+                        self._handle(json.loads(msg), t)
+
+            except (websocket.WebSocketException, OSError, ValueError) as e:
+                if not self._stop.is_set():
+                    self.logger.error('connection error: {}'.format(e))
+
+            finally:
+                self._ready.clear()
+                with self._lock:
+                    ws, self._ws = self._ws, None
+
+                if ws is not None:
+                    ws.close()
+
+            # Wait before reconnecting
+            if self._stop.wait(wait):
+
+                break
+
+            wait = min(2 * wait, self.max_wait)
+
+    def _handle(self, msg, t):
+        self.n_messages += 1
+        if isinstance(msg, dict):
+            if msg.get('event') == 'subscriptionStatus':
+                self.logger.info('{} {} {}'.format(
+                    msg.get('status'), msg.get('channelName'),
+                    msg.get('pair')
+                ))
+                if msg.get('status') == 'error':
+                    self.logger.error(msg.get('errorMessage'))
+
+            return
+
+        channel, pair = msg[-2], msg[-1]
+        with self._lock:
+            if channel == 'ticker':
+                self.tickers[pair] = (t, msg[1])
+
+            elif channel == 'spread':
+                buf = self.spreads.setdefault(
+                    pair, RingBuffer(self.size, len(SPREAD_FIELDS))
+                )
+                row = np.array(msg[1][:5], dtype=np.float64)
+                buf.append(row[[2, 0, 1, 3, 4]])
+
+            elif channel.startswith('ohlc'):
+                self._update_candle(pair, int(channel[5:]), msg[1])
+
+    def _update_candle(self, pair, interval, row):
+        step = interval * 60
+        row = np.array(row, dtype=np.float64)
+        # Open time of the candle and same columns as the REST API
+        candle = np.r_[row[1] - step, row[2:]]
+        key = pair, interval
+        buf = self._candle_buffer(key)
+        # Candles missing on the same connection are intervals without trade
+        reconnected = self._conns.get(key) != self.n_connections
+        self._conns[key] = self.n_connections
+        if len(buf) == 0:
+            self._first[key] = candle[0]
+            buf.append(candle)
+
+            return
+
+        last = buf.last(1)[0]
+        if candle[0] == last[0]:
+            buf.update(candle)
+
+        elif candle[0] > last[0]:
+            if candle[0] > last[0] + step and reconnected:
+                self.logger.warning('gap {} {} from {} to {}'.format(
+                    pair, interval, last[0], candle[0]
+                ))
+                self.gaps.append((pair, interval, int(last[0]),
+                                  int(candle[0])))
+                self._first[key] = candle[0]
+
+            elif candle[0] > last[0] + step:
+                times = np.arange(last[0] + step, candle[0], step)
+                for t in times[-buf.array.shape[0]:]:
+                    buf.append(np.r_[t, [last[4]] * 5, 0., 0.])
+
+            buf.append(candle)
+
+    def ticker(self, pair, max_age=None):
+        """ Return the last ticker of a pair.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair (see `ws_name`).
+        max_age : float, optional
+            Max seconds since the reception of the ticker, default is
+            `timeout` attribute.
+
+        Returns
+        -------
+        dict or None
+            Ticker with the same fields as the Ticker endpoint of the REST
+            API, None if not available or too old.
+
+        """
+        max_age = self.timeout if max_age is None else max_age
+        with self._lock:
+            t, ticker = self.tickers.get(ws_name(pair), (0, None))
+
+        if not self._ready.is_set() or time.time() - t > max_age:
+
+            return None
+
+        return ticker
+
+    def spread(self, pair, n=1):
+        """ Return the last spreads of a pair.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair (see `ws_name`).
+        n : int, optional
+            Number of spreads, default is the last one.
+
+        Returns
+        -------
+        np.ndarray or None
+            Rows time, bid, ask, bid volume and ask volume, None if not
+            available or if the feed is disconnected.
+
+        """
+        with self._lock:
+            buf = self.spreads.get(ws_name(pair))
+            if buf is None or len(buf) == 0 or not self._ready.is_set():
+
+                return None
+
+            return buf.last(n)
+
+    def ohlc(self, pair, interval=1, n=None):
+        """ Return the last candles of a pair, without gap.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair (see `ws_name`).
+        interval : int, optional
+            Interval in minutes, default is 1.
+        n : int, optional
+            Number of candles, default are all candles since the last gap.
+
+        Returns
+        -------
+        np.ndarray or None
+            Candles with the columns of the OHLC endpoint of the REST API,
+            the last one is the current candle. None if less than `n` candles
+            are available since the last gap or if the feed is disconnected.
+
+        """
+        key = ws_name(pair), interval
+        with self._lock:
+            buf = self.candles.get(key)
+            if buf is None or not self._ready.is_set():
+
+                return None
+
+            array = buf.last()
+            array = array[array[:, 0] >= self._first[key]]
+
+        if n is not None and array.shape[0] < n:
+
+            return None
+
+        return array if n is None else array[-n:]
+
+    def seed(self, pair, interval, rows):
+        """ Fill the candles of a pair with older candles.
+
+        Candles of the feed are kept, older candles are inserted before them
+        if they are contiguous, e.g. to seed the buffer with the REST API.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair (see `ws_name`).
+        interval : int
+            Interval in minutes.
+        rows : array_like
+            Candles with the columns of the OHLC endpoint of the REST API.
+
+        Returns
+        -------
+        bool
+            True if the candles are inserted.
+
+        """
+        key = ws_name(pair), interval
+        step = interval * 60
+        rows = np.asarray(rows, dtype=np.float64)
+        with self._lock:
+            buf = self._candle_buffer(key)
+            array = buf.last()
+            if len(buf) > 0:
+                array = array[array[:, 0] >= self._first[key]]
+                rows = rows[rows[:, 0] < array[0, 0]]
+                if rows.shape[0] == 0 or rows[-1, 0] + step != array[0, 0]:
+
+                    return False
+
+            array = np.concatenate([rows, array])[-buf.array.shape[0]:]
+            buf.clear()
+            for row in array:
+                buf.append(row)
+
+            self._first[key] = array[0, 0]
+
+        return True
+
+    def reserve(self, pair, interval, n):
+        """ Keep at least `n` candles of a pair and interval.
+
+        Parameters
+        ----------
+        pair : str
+            Name of the pair (see `ws_name`).
+        interval : int
+            Interval in minutes.
+        n : int
+            Number of candles, the buffer is not shrunk below `size`.
+
+        """
+        key = ws_name(pair), interval
+        with self._lock:
+            self._sizes[key] = max(self._sizes.get(key, self.size), n)
+            buf = self.candles.get(key)
+            if buf is not None and buf.array.shape[0] < self._sizes[key]:
+                buf.resize(self._sizes[key])
+
+    def _candle_buffer(self, key):
+        # Buffer of the candles of a pair and interval, created if missing
+        if key not in self.candles:
+            self.candles[key] = RingBuffer(self._sizes.get(key, self.size),
+                                           len(OHLC_FIELDS))
+
+        return self.candles[key]
+
+
+_feed = None
+
+
+def enable_feed(pairs=(), **kwargs):
+    """ Start a feed read by the data requests of the process.
+
+    If a feed is already enabled, the pairs are subscribed to it.
+
+    Parameters
+    ----------
+    pairs : list of str, optional
+        Names of the pairs (see `ws_name`).
+    kwargs : dict
+        Cf `KrakenFeed` constructor.
+
+    Returns
+    -------
+    KrakenFeed
+        The feed of the process.
+
+    """
+    global _feed
+    if _feed is None:
+        _feed = KrakenFeed(pairs, **kwargs).start()
+
+    else:
+        channels = kwargs.get('channels', ('ticker', 'ohlc', 'spread'))
+        intervals = kwargs.get('intervals', (1,))
+        _feed.subscribe_channels(pairs, channels, intervals)
+
+    return _feed
+
+
+def disable_feed():
+    """ Stop the feed of the process. """
+    global _feed
+    if _feed is not None:
+        _feed.stop()
+        _feed = None
+
+
+def get_feed():
+    """ Return the feed of the process, None if it is not enabled. """
+    return _feed